@@ -1,4 +1,3 @@
-import time
 import traceback
 from typing import Optional
 
@@ -10,9 +9,13 @@ from utils.utils import (
     handle_clipboard_text,
     append_timestamp_to_last_user_message,
 )
-from completion_manager import CompletionManager
+from completion_router import get_completion_client
 import utils.utils as utils
 from utils.chat import Chat
+from utils.history_compactor import HistoryCompactor
+from utils.conversation_store import get_conversation_store
+from utils.response_cache import get_response_cache
+from utils.action_scheduler import CancellationToken
 
 
 class AlwaysReddyVoiceAssistant(BaseAction):
@@ -55,32 +58,61 @@ class AlwaysReddyVoiceAssistant(BaseAction):
             self.AR.add_action_hotkey(config.NEW_CHAT_HOTKEY, pressed=self.new_chat)
             print(f"'{config.NEW_CHAT_HOTKEY}': New chat for voice assistant")
 
+        # Setup resume chat hotkey if configured
+        if config.RESUME_CHAT_HOTKEY and config.SAVE_CONVERSATIONS:
+            self.AR.add_action_hotkey(config.RESUME_CHAT_HOTKEY, pressed=self.resume_chat)
+            print(f"'{config.RESUME_CHAT_HOTKEY}': Resume the last voice assistant chat")
+
         message_callbacks = None
         # Optionally add a timestamp to the message
         if config.TIMESTAMP_MESSAGES:
             message_callbacks = [append_timestamp_to_last_user_message]
             
+        completion_client = get_completion_client(verbose=config.VERBOSE)
+
+        # Summarise old messages with the same client and model, rather than dropping them
+        compactor = None
+        if config.COMPACT_HISTORY:
+            compactor = HistoryCompactor(
+                completion_client,
+                model=config.COMPLETION_MODEL,
+                max_prompt_tokens=config.MAX_PROMPT_TOKENS,
+                completion_params=config.COMPLETION_PARAMS,
+                verbose=config.VERBOSE,
+            )
+
         # Initialize Chat with the configured parameters and completion manager
         self.chat = Chat(
-            completions_api_client=CompletionManager(
-                verbose=config.VERBOSE, completions_api=config.COMPLETIONS_API
-            ),
+            completions_api_client=completion_client,
             completion_params=config.COMPLETION_PARAMS,
             model=config.COMPLETION_MODEL,
             max_prompt_tokens=config.MAX_PROMPT_TOKENS,
             tts_callback=self.AR.tts.run_tts,
             system_prompt_filename=config.ACTIVE_PROMPT,
-            message_callbacks=message_callbacks
+            message_callbacks=message_callbacks,
+            store=get_conversation_store(verbose=config.VERBOSE),
+            compactor=compactor,
+            response_cache=get_response_cache(verbose=config.VERBOSE)
         )
 
-    def handle_default_assistant_response(self) -> None:
+        # Start the embedding memory now so it sees every message saved from here on
+        if "memory" in config.ACTIVE_PROMPT_MODULES:
+            from utils.embedding_memory import get_embedding_memory
+            get_embedding_memory(verbose=config.VERBOSE)
+
+    def handle_default_assistant_response(self, cancel_token: Optional[CancellationToken] = None) -> None:
         """
         Handle the process of recording, transcribing, and generating a response from the voice assistant.
 
         This method toggles recording, transcribes the audio if available, processes any clipboard content
         (images or text), adds a timestamp if configured, and then generates a completion using the Chat instance.
         It also handles the situation where the assistant's last message was cut off.
+
+        Args:
+            cancel_token (CancellationToken, optional): Passed by the action scheduler, cancelled when the
+                user cancels or starts another action.
         """
+        cancel_token = cancel_token or CancellationToken()
         try:
             recording_filename = self.AR.toggle_recording(self.handle_default_assistant_response)
             if not recording_filename:
@@ -88,7 +120,7 @@ class AlwaysReddyVoiceAssistant(BaseAction):
 
             # Transcribe the recorded audio file
             message = self.AR.transcription_manager.transcribe_audio(recording_filename)
-            if not self.AR.stop_action and message:
+            if not cancel_token.cancelled and message:
                 print("\nTranscript:\n", message)
 
                 # Flag if the user cut off the assistant's previous message
@@ -106,28 +138,30 @@ class AlwaysReddyVoiceAssistant(BaseAction):
                 self.chat.add_message("user", message)
 
                 # If the action was stopped during processing, exit early
-                if self.AR.stop_action:
+                if cancel_token.cancelled:
                     return
 
+                # Only a sentence cut off from this response counts, not one left over from an earlier turn
+                self.AR.tts.interrupted_sentence = None
+
                 # Generate a completion response from the chat manager
                 response = self.chat.get_completion(marker_tuples=[(config.CLIPBOARD_TEXT_START_SEQ, config.CLIPBOARD_TEXT_END_SEQ, to_clipboard)],)
                 # Text found between the start and end markers is passed to the callback function
 
                 # Wait until any running text-to-speech (TTS) has finished
-                while self.AR.tts.running_tts:
-                    time.sleep(0.001)
+                self.AR.tts.wait()
 
                 # If no response was generated, remove the last user message to avoid consecutive user messages
                 if not response:
                     if self.AR.verbose:
                         print("No response generated.")
-                    self.chat.messages = self.chat.messages[:-1]
+                    self.chat.remove_last_message()
                     return
 
                 self.last_message_was_cut_off = False
 
-                # Check if the action was stopped and adjust the response accordingly
-                if self.AR.stop_action:
+                # Check if the action was stopped, or the user talked over the response, and adjust the response accordingly
+                if cancel_token.cancelled or self.AR.tts.interrupted_sentence is not None:
                     index = response.rfind(self.AR.tts.last_sentence_spoken)
                     if index != -1:
                         response = response[: index + len(self.AR.tts.last_sentence_spoken)]
@@ -147,3 +181,17 @@ class AlwaysReddyVoiceAssistant(BaseAction):
         self.last_message_was_cut_off = False
         self.AR.last_clipboard_text = None
         print("New chat session started.")
+
+    def resume_chat(self) -> None:
+        try:
+            if self.chat.resume_last_conversation():
+                self.last_message_was_cut_off = False
+                self.AR.last_clipboard_text = None
+                saved_messages = sum(1 for message in self.chat.messages if message.get("role") != "system")
+                print(f"Resumed the last chat session ({saved_messages} messages).")
+            else:
+                print("No saved chat session to resume.")
+        except Exception as e:
+            print(f"An error occurred while resuming the last chat: {e}")
+            if self.AR.verbose:
+                traceback.print_exc()
@@ -1,8 +1,7 @@
 from utils.utils import to_clipboard
 from actions.base_action import BaseAction
 from config_loader import config
-import pyautogui
-import time
+from utils.conversation_store import get_conversation_store
 
 class TranscribeAndPaste(BaseAction):
     """Action for transcribing audio to clipboard and pasting it."""
@@ -19,5 +18,10 @@ class TranscribeAndPaste(BaseAction):
         if recording_filename:
             transcript = self.AR.transcription_manager.transcribe_audio(recording_filename)
             to_clipboard(transcript)
+            # Saved so dictation can be found by the "recall" prompt module later
+            store = get_conversation_store(verbose=config.VERBOSE)
+            if store is not None and transcript:
+                store.add_transcript(transcript)
+            import pyautogui  # Deferred, importing pyautogui is slow
             pyautogui.hotkey('ctrl', 'v') 
             print("Transcription copied to clipboard.")
\ No newline at end of file
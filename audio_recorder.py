@@ -1,80 +1,114 @@
-import pyaudio
-import threading
 from config_loader import config
 import os
 import numpy as np
-from collections import deque
 import wave
 import time
-import sys
-from ctypes import *
+import threading
+from utils.audio_backend import get_audio_backend
+from utils.ring_buffer import RingBuffer
+from utils.session_trace import get_session_tracer
+from utils.audio_devices import AudioDeviceManager
+from utils.resampler import StreamingResampler
 
 class AudioRecorder:
-    """A class to handle the recording of audio using the PyAudio library."""
-    def __init__(self, verbose=False):
+    """A class to handle the recording of audio using a callback-mode stream from the audio backend."""
+    def __init__(self, backend=None, verbose=False):
         """
         Initialize the AudioRecorder.
 
+        :param backend: The audio backend to record from, see utils.audio_backend. The configured one by default.
         :param verbose: If True, print detailed information during recording and saving.
         """
         self.filename = "temp_recording.wav"
         self.recording = False
-        self.frames = deque()
-        self.record_thread = None
         self.start_time = None
         self.verbose = verbose
-        self.FS = 16000
-        
-        # Load ALSA library and set error handler for Linux
-        if sys.platform.startswith('linux'):
-            self.ERROR_HANDLER_FUNC = CFUNCTYPE(None, c_char_p, c_int, c_char_p, c_int, c_char_p)
-            self.asound = cdll.LoadLibrary('libasound.so')
-            self.c_error_handler = self.ERROR_HANDLER_FUNC(self.py_error_handler)
-            self.asound.snd_lib_error_set_handler(self.c_error_handler)
-        
-        self.audio = pyaudio.PyAudio()
+        self.FS = 16000  # The rate recordings are saved at, audio is captured at the device's native rate and resampled to this
+        self.resampler = None
+        self.block_size = config.RECORDING_BLOCK_SIZE
+        self.latency = config.RECORDING_LATENCY
+
+        # The audio callback writes straight into this buffer, it is sized to hold the longest allowed recording
+        self.buffer = RingBuffer(self.FS * (config.MAX_RECORDING_DURATION + 5), dtype=np.int16)
+        self.input_overflows = 0
+        self.input_underflows = 0
+
+        self.backend = backend or get_audio_backend(verbose=verbose)
+        self.device_manager = AudioDeviceManager(device_name=config.RECORDING_DEVICE, backend=self.backend, verbose=verbose)
         self.stream = None
-        
-    def py_error_handler(self, filename, line, function, err, fmt):
-        """A custom error handler to suppress ALSA error messages."""
-        pass
-
-    def get_default_mic_index(self):
-        """Get the index of the system default microphone."""
-        try:
-            device_info = self.audio.get_default_input_device_info()
-            return device_info['index']
-        except IOError:
-            return None
-        
+        self._stream_lock = threading.RLock()
+        self._closed_for_reinitialise = False
+        self.backend.add_stream_owner(self)
+        self.tracer = get_session_tracer(verbose)
+        self._trace_times = None  # When the recording started and stopping was asked for, on the tracer's clock
+
+    def _open_stream(self):
+        """
+        Open and start a callback-mode input stream on the chosen microphone.
+
+        If opening fails the device list is re-enumerated once and the stream is opened on whatever
+        device is chosen then.
+
+        Returns:
+            bool: True if the stream is running, False if there is no usable microphone.
+        """
+        for attempt in range(2):
+            device = self.device_manager.get_input_device()
+            if device is None:
+                if attempt == 0:
+                    self.device_manager.refresh()
+                    continue
+                print("No default microphone found.")
+                return False
+            capture_rate = self.device_manager.capture_rate()
+            if self.resampler is None or self.resampler.in_rate != capture_rate:
+                if self.resampler is not None:
+                    # Keep the tail of the audio captured on the previous device
+                    self.buffer.write(self.resampler.flush())
+                self.resampler = StreamingResampler(capture_rate, self.FS)
+            try:
+                self.stream = self.backend.input_stream(samplerate=capture_rate, channels=1, dtype='int16',
+                                                        blocksize=self.block_size, latency=self.latency,
+                                                        device=device['index'], callback=self._audio_callback,
+                                                        finished_callback=self._stream_finished)
+                self.stream.start()
+                return True
+            except Exception:
+                self.stream = None
+                if attempt == 0:
+                    self.device_manager.refresh()
+                    continue
+                raise
+        return False
+
     def start_recording(self):
         """
         Start a new recording session.
-        
-        This method starts the recording thread and the audio stream.
-        It uses the system default microphone as the input device.
+
+        This method opens a callback-mode input stream on the configured microphone (or the system default).
+        The audio backend delivers each block of samples to `_audio_callback`, so no polling thread is needed.
         """
-        if not self.recording:
-            self.frames.clear()
+        with self._stream_lock:
+            if self.recording:
+                return
+            self.buffer.clear()
+            if self.resampler is not None:
+                self.resampler.reset()
+            self.input_overflows = 0
+            self.input_underflows = 0
             self.start_time = time.time()
+            if self.tracer is not None:
+                self._trace_times = (self.tracer.now(), None)
             try:
-                mic_index = self.get_default_mic_index()
-                if mic_index is not None:
-                    self.stream = self.audio.open(format=pyaudio.paInt16, channels=1,
-                                                rate=self.FS, input=True,
-                                                frames_per_buffer=512, start=False,
-                                                input_device_index=mic_index)
-                    self.recording = True  # Set this before starting the thread
-                    self.record_thread = threading.Thread(target=self.record_audio, daemon=True)
-                    self.stream.start_stream()
-                    self.record_thread.start()
+                self.recording = True  # Set this before starting the stream
+                if self._open_stream():
                     if self.verbose:
-                        print("Recording started...")
+                        print(f"Recording started at {self.resampler.in_rate} Hz...")
                 else:
-                    print("No default microphone found.")
+                    self.recording = False
             except Exception as e:
                 self.recording = False
-                self.record_thread = None  # Ensure the thread is reset
+                self.stream = None
                 if self.verbose:
                     import traceback
                     traceback.print_exc()
@@ -88,32 +122,87 @@ class AudioRecorder:
             return 0
         return time.time() - self.start_time
 
-    def record_audio(self):
-        """Record audio from the stream into the frames buffer."""
-        try:
-            while self.recording:
-                data = self.stream.read(512)
-                self.frames.append(np.frombuffer(data, dtype=np.int16))
-        except Exception as e:
-            self.recording = False
-            if self.verbose:
-                import traceback
-                traceback.print_exc()
-            else:
-                print(f"Error during recording: {e}")
-            
-            self.stream.stop_stream()
-            self.stream.close()
-            
-            # Try to find a new default microphone
-            mic_index = self.get_default_mic_index()
-            if mic_index is not None:
+    @property
+    def stats(self):
+        """
+        Get the capture health counters for the current or last recording.
+
+        dropped_samples counts samples lost because the ring buffer was full, input_overflows
+        and input_underflows count the blocks PortAudio flagged as overrun or underrun.
+        """
+        return {
+            "dropped_samples": self.buffer.overruns,
+            "input_overflows": self.input_overflows,
+            "input_underflows": self.input_underflows,
+        }
+
+    def _audio_callback(self, indata, frames, time_info, status):
+        """Called by the audio backend from its own thread with each block of recorded samples."""
+        if status:
+            if status.input_overflow:
+                self.input_overflows += 1
+            if status.input_underflow:
+                self.input_underflows += 1
+        self.buffer.write(self.resampler.process(indata[:, 0]))
+
+    def close_streams(self):
+        """Close the input stream, called by the backend before it reinitialises."""
+        with self._stream_lock:
+            if self.stream is None:
+                return
+            self._closed_for_reinitialise = True
+            stream, self.stream = self.stream, None
+            try:
+                stream.close()
+            except Exception as e:
                 if self.verbose:
-                    print("Switching to a new default microphone...")
-                self.recording = True
-                self.start_recording()
-            else:
-                print("No default microphone found.")
+                    print(f"Error closing recording stream: {e}")
+
+    def reopen_streams(self):
+        """Reopen the input stream closed by close_streams, if still recording."""
+        with self._stream_lock:
+            if not self._closed_for_reinitialise:
+                return
+            self._closed_for_reinitialise = False
+            if self.recording and self.stream is None:
+                self._open_stream()
+
+    def _stream_finished(self):
+        """Called by the audio backend when the stream stops, either on request or because the device failed."""
+        if self.recording and not self._closed_for_reinitialise:
+            # This runs on the stream's thread, so the stream is reopened from a separate one
+            threading.Thread(target=self._recover_stream, daemon=True).start()
+
+    def _recover_stream(self, max_attempts=5, retry_delay=0.5):
+        """
+        Reopen the input stream after the microphone failed mid-recording.
+
+        The ring buffer is left untouched so the audio captured before the failure is kept,
+        and recording carries on from a freshly enumerated device.
+        """
+        print("Recording stream ended unexpectedly, switching microphone...")
+        for _ in range(max_attempts):
+            with self._stream_lock:
+                if not self.recording:
+                    return
+                if self.stream is not None:
+                    try:
+                        self.stream.close()
+                    except Exception:
+                        pass
+                    self.stream = None
+                self.device_manager.refresh()
+                try:
+                    if self._open_stream():
+                        if self.verbose:
+                            print("Recording resumed on the new microphone.")
+                        return
+                except Exception as e:
+                    if self.verbose:
+                        print(f"Failed to reopen recording stream: {e}")
+            time.sleep(retry_delay)
+
+        print("No working microphone found, the recording will be stopped when you next press the hotkey.")
 
     def stop_recording(self, cancel=False):
         """
@@ -121,23 +210,37 @@ class AudioRecorder:
         
         :param cancel: If True, discard the recording without saving.
         """
-        if self.recording:
+        with self._stream_lock:
+            if not self.recording:
+                return None
             self.recording = False
-            if self.record_thread is not None:
-                self.record_thread.join()
+            if self.tracer is not None and self._trace_times is not None:
+                self._trace_times = (self._trace_times[0], self.tracer.now())
             if self.stream is not None:
-                self.stream.stop_stream()
-                self.stream.close()
-            if not cancel:
-                filename = self.save_recording()
-                return filename
-            return None
+                # stop() waits for any pending callbacks, so every captured block is in the buffer afterwards
+                try:
+                    self.stream.stop()
+                    self.stream.close()
+                except self.backend.Error as e:
+                    if self.verbose:
+                        print(f"Error closing recording stream: {e}")
+                self.stream = None
+            if self.resampler is not None:
+                self.buffer.write(self.resampler.flush())
+        if self.verbose and any(self.stats.values()):
+            print(f"Recording capture stats: {self.stats}")
+        if not cancel:
+            filename = self.save_recording()
+            return filename
+        self.buffer.clear()
+        return None
 
     def save_recording(self):
         """Save the recorded audio to a WAV file."""
-        if self.frames:
-            recording = np.concatenate(self.frames)
-            recording = np.clip(recording, -32768, 32767).astype(np.int16)
+        if len(self.buffer):
+            recording = self.buffer.read()
+            if self.tracer is not None and self._trace_times is not None:
+                self.tracer.recording(recording, self.FS, *self._trace_times)
             directory = config.AUDIO_FILE_DIR
             try:
                 if not os.path.exists(directory):
@@ -145,7 +248,7 @@ class AudioRecorder:
                 filepath = os.path.join(directory, self.filename)
                 with wave.open(filepath, 'wb') as wf:
                     wf.setnchannels(1)
-                    wf.setsampwidth(self.audio.get_sample_size(pyaudio.paInt16))
+                    wf.setsampwidth(recording.dtype.itemsize)
                     wf.setframerate(self.FS)
                     wf.writeframes(recording.tobytes())
                 if self.verbose:
@@ -161,8 +264,5 @@ class AudioRecorder:
 
     def __del__(self):
         """Clean up resources when the AudioRecorder is deleted."""
-        if self.stream is not None:
+        if getattr(self, "stream", None) is not None:
             self.stream.close()
-        self.audio.terminate()
-        if sys.platform.startswith('linux'):
-            self.asound.snd_lib_error_set_handler(None)
\ No newline at end of file
@@ -0,0 +1,50 @@
+import statistics
+import threading
+import time
+from benchmarks.common import benchmark, measure
+from input_apis.input_handler import InputHandler
+from utils.action_scheduler import ActionScheduler
+
+@benchmark("input.process_key_event.press_release")
+def process_key_event(quick=False):
+    handler = InputHandler(verbose=False)
+    handler.add_hotkey("ctrl+alt+r", pressed=lambda: None, released=lambda: None,
+                       held_release=lambda: None, double_tap=lambda: None)
+    handler.double_tap_threshold = 0  # Every press is a plain press
+
+    def press_and_release():
+        handler.process_key_event("ctrl+alt+r", True)
+        handler.process_key_event("ctrl+alt+r", False)
+
+    return measure(press_and_release, repeat=3 if quick else 10, number=200)
+
+@benchmark("input.trigger_action.replace_running")
+def trigger_replacing_running_action(quick=False):
+    """How long the input thread is held up triggering an action while one that is slow to cancel runs."""
+    scheduler = ActionScheduler(workers=2)
+    started = threading.Event()
+
+    def slow_to_cancel():
+        started.set()
+        time.sleep(0.2)  # e.g. a transcription that cannot be interrupted
+
+    submit_times, start_latencies = [], []
+    for _ in range(5 if quick else 20):
+        started.clear()
+        scheduler.submit(slow_to_cancel)
+        started.wait()
+        replaced = threading.Event()
+        start_time = time.perf_counter()
+        scheduler.submit(lambda: replaced.set())
+        submit_times.append(time.perf_counter() - start_time)
+        replaced.wait()
+        start_latencies.append(time.perf_counter() - start_time)
+        time.sleep(0.2)  # Let the cancelled action finish
+    metrics = scheduler.metrics()
+    scheduler.shutdown()
+    return {
+        "median": statistics.median(submit_times),
+        "start_latency_median": statistics.median(start_latencies),
+        "queue_wait_p95": metrics["queue_wait_p95"],
+        "cancelled": metrics["cancelled"],
+    }
@@ -0,0 +1,204 @@
+import contextlib
+import io
+import os
+import statistics
+import tempfile
+import threading
+import time
+import numpy as np
+from benchmarks.common import benchmark, SkipBenchmark
+from benchmarks.fakes import FakeTTSClient
+from benchmarks.mock_server import MockProviderServer
+from config_loader import config
+
+def _percentile(times, fraction):
+    times = sorted(times)
+    return times[min(len(times) - 1, int(fraction * len(times)))]
+
+def _completion_manager(base_url):
+    """A CompletionManager set up from the config as AlwaysReddy would, but talking to the mock server."""
+    from completion_manager import CompletionManager
+    had_base_url = hasattr(config, "OLLAMA_API_BASE_URL")
+    old_base_url = getattr(config, "OLLAMA_API_BASE_URL", None)
+    config.OLLAMA_API_BASE_URL = base_url
+    try:
+        manager = CompletionManager(completions_api="ollama")
+        manager.client  # Wait for the client before restoring the config
+    finally:
+        if had_base_url:
+            config.OLLAMA_API_BASE_URL = old_base_url
+        else:
+            del config.OLLAMA_API_BASE_URL
+    return manager
+
+def _turn(manager, question):
+    """
+    Run one turn of a conversation, from the transcribed question to the last sentence handed to TTS.
+
+    The prompt is not trimmed to the token limit as Chat would, that needs the tokenizer and is
+    measured by text.maintain_token_limit.
+
+    Returns:
+        tuple: Seconds until the first sentence was ready to speak, and until the response was finished.
+    """
+    messages = [{"role": "system", "content": "You are a helpful voice assistant."},
+                {"role": "user", "content": question}]
+    first_sentence = []
+    start_time = time.perf_counter()
+
+    def tts_callback(sentence):
+        if not first_sentence:
+            first_sentence.append(time.perf_counter() - start_time)
+
+    response = manager.process_text_stream(manager.get_completion_stream(messages, "mock"), tts_callback=tts_callback)
+    if not response:
+        raise RuntimeError("The turn got no response")
+    total = time.perf_counter() - start_time
+    return (first_sentence[0] if first_sentence else total), total
+
+@benchmark("pipeline.turn.mock_ollama")
+def turn_against_mock_server(quick=False):
+    turns = 10 if quick else 40
+    # A local model: 150 ms to the first token, 80 tokens a second, split across reads
+    server = MockProviderServer(time_to_first_token=0.15, tokens_per_second=80, chunk_chars=(2, 6),
+                                split_frames=True, seed=4)
+    try:
+        manager = _completion_manager(server.base_url)
+        with contextlib.redirect_stdout(io.StringIO()):
+            results = [_turn(manager, "Why do fast language models matter?") for _ in range(turns)]
+    finally:
+        server.close()
+    first_sentence = [first for first, _ in results]
+    totals = [total for _, total in results]
+    return {
+        "median": statistics.median(first_sentence),
+        "p95": _percentile(first_sentence, 0.95),
+        "total_median": statistics.median(totals),
+        "turns": turns,
+    }
+
+@benchmark("pipeline.turn.concurrent_with_failures")
+def concurrent_turns_against_mock_server(quick=False):
+    concurrency = 4 if quick else 8
+    rounds = 2 if quick else 5
+    server = MockProviderServer(time_to_first_token=0.1, tokens_per_second=200, error_rate=0.2,
+                                retry_after=0.05, seed=5)
+    results = []
+    errors = []
+    lock = threading.Lock()
+    try:
+        manager = _completion_manager(server.base_url)
+
+        def worker():
+            for _ in range(rounds):
+                try:
+                    result = _turn(manager, "Why do fast language models matter?")
+                except Exception as e:
+                    with lock:
+                        errors.append(e)
+                    continue
+                with lock:
+                    results.append(result)
+
+        with contextlib.redirect_stdout(io.StringIO()):
+            start_time = time.perf_counter()
+            threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start_time
+    finally:
+        server.close()
+    first_sentence = [first for first, _ in results]
+    return {
+        "median": statistics.median(first_sentence),
+        "p95": _percentile(first_sentence, 0.95),
+        "turns_per_second": len(results) / elapsed,
+        "failed_turns": len(errors),
+        "injected_failures": server.failures,
+        "concurrency": concurrency,
+    }
+
+class _Parent:
+    stop_action = False
+
+def _transcribe(server, path):
+    """Send a recording to the mock server's transcription endpoint, as the OpenAI transcription client would."""
+    import requests
+    with open(path, "rb") as audio_file:
+        response = requests.post(f"{server.openai_base_url}/audio/transcriptions",
+                                 files={"file": (os.path.basename(path), audio_file, "audio/wav")},
+                                 data={"model": "whisper-1", "response_format": "text"})
+    response.raise_for_status()
+    return response.text
+
+@benchmark("pipeline.end_to_end.simulated_audio")
+def end_to_end_with_simulated_audio(quick=False):
+    """Seconds from the end of a spoken question to the first sound of the answer, on the simulated sound card."""
+    try:
+        import soundfile  # noqa: F401, used to play the speech
+        import tts_manager
+        from audio_recorder import AudioRecorder
+        from utils.audio_backend import SimulatedAudioBackend
+        from utils.audio_mixer import AudioMixer
+    except Exception as e:
+        raise SkipBenchmark(f"audio libraries unavailable: {e}")
+
+    turns = 3 if quick else 10
+    backend = SimulatedAudioBackend()
+    # A second long question, a tone stands in for the speech as the transcript comes from the server
+    question = (np.sin(np.arange(16000) * 2 * np.pi * 220 / 16000) * 8000).astype(np.int16)
+    server = MockProviderServer(time_to_first_token=0.15, tokens_per_second=80, chunk_chars=(2, 6), seed=6)
+    original_dir = config.AUDIO_FILE_DIR
+    audio_cache_enabled = config.TTS_AUDIO_CACHE
+    latencies, transcribe_times, first_sentence_times = [], [], []
+    with tempfile.TemporaryDirectory() as audio_dir:
+        config.AUDIO_FILE_DIR = audio_dir
+        config.TTS_AUDIO_CACHE = False
+        try:
+            manager = _completion_manager(server.base_url)
+            recorder = AudioRecorder(backend=backend)
+            tts = tts_manager.TTSManager(parent_client=_Parent(), verbose=False)
+            tts._tts_client_loader.wait()
+            tts._tts_client = FakeTTSClient(seconds_per_char=0.004, latency=0.03)
+            tts.mixer = AudioMixer(backend=backend)
+
+            with contextlib.redirect_stdout(io.StringIO()):
+                for _ in range(turns):
+                    backend.feed(question, samplerate=16000, label="question")
+                    recorder.start_recording()
+                    backend.wait_for_input()
+                    speech_end = time.monotonic()
+                    filename = recorder.stop_recording()
+
+                    transcript = _transcribe(server, os.path.join(audio_dir, filename))
+                    transcribe_times.append(time.monotonic() - speech_end)
+                    first_sentence = []
+
+                    def speak(sentence):
+                        if not first_sentence:
+                            first_sentence.append(time.monotonic() - speech_end)
+                        tts.run_tts(sentence)
+
+                    messages = [{"role": "user", "content": transcript}]
+                    manager.process_text_stream(manager.get_completion_stream(messages, "mock"), tts_callback=speak)
+                    tts.wait()
+                    first_sound = backend.first_sound_after(speech_end)
+                    if first_sound is None:
+                        raise RuntimeError("Nothing was played")
+                    latencies.append(first_sound - speech_end)
+                    first_sentence_times.append(first_sentence[0])
+                    backend.clear_playback()
+            tts.mixer.stop_all()
+        finally:
+            config.AUDIO_FILE_DIR = original_dir
+            config.TTS_AUDIO_CACHE = audio_cache_enabled
+            server.close()
+    return {
+        "median": statistics.median(latencies),
+        "p95": _percentile(latencies, 0.95),
+        "transcribed_median": statistics.median(transcribe_times),
+        "first_sentence_median": statistics.median(first_sentence_times),
+        "turns": turns,
+    }
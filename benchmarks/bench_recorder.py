@@ -0,0 +1,30 @@
+import tempfile
+import numpy as np
+from benchmarks.common import benchmark, measure, SkipBenchmark
+from config_loader import config
+
+@benchmark("recorder.save_recording.60s")
+def save_recording(quick=False):
+    try:
+        from audio_recorder import AudioRecorder
+        from utils.ring_buffer import RingBuffer
+    except Exception as e:
+        raise SkipBenchmark(f"audio libraries unavailable: {e}")
+
+    # Skip __init__ so no audio device or ALSA library is needed, save_recording only uses these fields
+    recorder = AudioRecorder.__new__(AudioRecorder)
+    recorder.filename = "benchmark_recording.wav"
+    recorder.verbose = False
+    recorder.FS = 16000
+    recorder.buffer = RingBuffer(recorder.FS * 61)
+    recorder.tracer = None
+    audio = (np.random.default_rng(0).standard_normal(recorder.FS * 60) * 3000).astype(np.int16)
+
+    original_dir = config.AUDIO_FILE_DIR
+    with tempfile.TemporaryDirectory() as audio_dir:
+        config.AUDIO_FILE_DIR = audio_dir
+        try:
+            return measure(recorder.save_recording, repeat=3 if quick else 10,
+                           setup=lambda: recorder.buffer.write(audio))
+        finally:
+            config.AUDIO_FILE_DIR = original_dir
@@ -0,0 +1,114 @@
+import contextlib
+import io
+import random
+import statistics
+import time
+from types import SimpleNamespace
+from benchmarks.common import benchmark
+from benchmarks.fakes import FakeCompletionClient
+from benchmarks.mock_server import MockProviderServer
+from completion_router import CompletionRouter, Route
+from llm_apis.resilience import ResilientClient
+
+class _TailLatencyClient(FakeCompletionClient):
+    """A fake provider that is usually quick but now and then stalls before the first token, like an overloaded API."""
+    def __init__(self, response, fast, slow, slow_fraction, seed=0):
+        super().__init__(response, chunk_size=16)
+        self.fast = fast
+        self.slow = slow
+        self.slow_fraction = slow_fraction
+        self.rng = random.Random(seed)
+
+    def stream_completion(self, messages, model, **kwargs):
+        self.time_to_first_token = self.slow if self.rng.random() < self.slow_fraction else self.fast
+        yield from super().stream_completion(messages, model, **kwargs)
+
+def _time_to_first_token(client, requests):
+    times = []
+    for _ in range(requests):
+        start_time = time.perf_counter()
+        stream = client.stream_completion([], "main")
+        next(stream)
+        times.append(time.perf_counter() - start_time)
+        stream.close()
+    times.sort()
+    return times
+
+@benchmark("completion.hedged.time_to_first_token")
+def hedged_time_to_first_token(quick=False):
+    requests = 40 if quick else 200
+    response = "Sure, here is the answer. " * 8
+    # Main provider: 20 ms, but 4% of requests take 600 ms. Backup: a steady 60 ms.
+    main = SimpleNamespace(client=_TailLatencyClient(response, 0.02, 0.6, 0.04, seed=1))
+    backup = SimpleNamespace(client=_TailLatencyClient(response, 0.06, 0.06, 0.0, seed=2))
+
+    direct = _time_to_first_token(SimpleNamespace(stream_completion=main.client.stream_completion), requests)
+    router = CompletionRouter([Route("main", main, "main"), Route("backup", backup, "backup")],
+                              hedge_delay_min=0.05, hedge_delay_max=1.0)
+    hedged = _time_to_first_token(router, requests)
+
+    def p(times, fraction):
+        return times[min(len(times) - 1, int(fraction * len(times)))]
+
+    return {
+        "median": statistics.median(hedged),
+        "p95": p(hedged, 0.95),
+        "p99": p(hedged, 0.99),
+        "direct_median": statistics.median(direct),
+        "direct_p95": p(direct, 0.95),
+        "direct_p99": p(direct, 0.99),
+        "requests": requests,
+    }
+
+def _run_requests(client, requests):
+    """Make requests, returning how many succeeded and how long each took."""
+    succeeded = 0
+    times = []
+    with contextlib.redirect_stdout(io.StringIO()):  # The client prints every failure
+        for _ in range(requests):
+            start_time = time.perf_counter()
+            try:
+                "".join(client.stream_completion([{"role": "user", "content": "hi"}], "stub"))
+                succeeded += 1
+            except Exception:
+                pass
+            times.append(time.perf_counter() - start_time)
+    return succeeded, sorted(times)
+
+@benchmark("completion.resilience.flaky_local_server")
+def flaky_local_server(quick=False):
+    from llm_apis.ollama_client import OllamaClient
+    requests = 30 if quick else 100
+    server = MockProviderServer(response="Sure, here is the answer.", error_rate=0.3, seed=3)
+    try:
+        direct_succeeded, _ = _run_requests(OllamaClient(base_url=server.base_url), requests)
+        # A high failure threshold so the breaker does not hide how well the retries do
+        client = ResilientClient(OllamaClient(base_url=server.base_url), "bench_flaky", latency_budget=2.0,
+                                 base_delay=0.05, max_delay=0.4, failure_threshold=1000, local=True)
+        succeeded, times = _run_requests(client, requests)
+    finally:
+        server.close()
+    return {
+        "median": statistics.median(times),
+        "p95": times[min(len(times) - 1, int(0.95 * len(times)))],
+        "success_rate": succeeded / requests,
+        "direct_success_rate": direct_succeeded / requests,
+        "requests": requests,
+    }
+
+@benchmark("completion.resilience.local_server_down")
+def local_server_down(quick=False):
+    from llm_apis.ollama_client import OllamaClient
+    # Find a port nothing is listening on
+    server = MockProviderServer()
+    base_url = server.base_url
+    server.close()
+
+    client = ResilientClient(OllamaClient(base_url=base_url), "bench_down", local=True)
+    _, first = _run_requests(client, 1)
+    _, later = _run_requests(client, 20)
+    return {
+        "median": statistics.median(later),
+        "first_request": first[0],
+        "breaker_open": client.breaker.is_open,
+    }
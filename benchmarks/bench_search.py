@@ -0,0 +1,108 @@
+import os
+import random
+import string
+import tempfile
+import time
+from benchmarks.common import benchmark, measure, SkipBenchmark
+from utils.conversation_store import ConversationStore, _message_text
+from utils.vector_index import VectorIndex
+
+QUERIES = [
+    "what did I say about the tomato plants",
+    "remind me how to configure the reverse proxy",
+    "that recipe with lentils and cumin",
+    "zzzz qqqq",  # Matches nothing
+]
+
+def _vocabulary(size, rng):
+    words = ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9))) for _ in range(size)]
+    return words + ["tomato", "plants", "reverse", "proxy", "configure", "recipe", "lentils", "cumin"]
+
+def _fill_store(path, message_count, seed=0):
+    """Create a store holding message_count messages, written in bulk rather than through the writer thread."""
+    rng = random.Random(seed)
+    vocabulary = _vocabulary(5000, rng)
+    # A skewed distribution, like real text, so some words are common and most are rare
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    store = ConversationStore(path)
+    if not store.search_available:
+        store.close()
+        raise SkipBenchmark("SQLite was built without FTS5")
+
+    connection = store._connect()
+    now = time.time()
+    with connection:
+        for start in range(0, message_count, 10_000):
+            rows = []
+            for i in range(start, min(start + 10_000, message_count)):
+                words = rng.choices(vocabulary, weights, k=rng.randint(8, 60))
+                rows.append((f"conversation{i // 20}", "user" if i % 2 == 0 else "assistant", " ".join(words),
+                             now - (message_count - i) * 60))
+            connection.executemany(
+                "INSERT INTO conversations (id, started_at, updated_at) VALUES (?, ?, ?) ON CONFLICT(id) DO NOTHING",
+                [(row[0], row[3], row[3]) for row in rows])
+            first_id = connection.execute("SELECT COALESCE(MAX(id), 0) FROM messages").fetchone()[0] + 1
+            connection.executemany(
+                "INSERT INTO messages (conversation_id, role, content, created_at) VALUES (?, ?, ?, ?)", rows)
+            connection.executemany(
+                "INSERT INTO search_index (rowid, text, role, conversation_id, created_at) VALUES (?, ?, ?, ?, ?)",
+                [(first_id + j, _message_text(row[2]), row[1], row[0], row[3]) for j, row in enumerate(rows)])
+    connection.close()
+    return store
+
+@benchmark("search.query.100k_messages")
+def query_latency(quick=False):
+    message_count = 20_000 if quick else 100_000
+    with tempfile.TemporaryDirectory() as directory:
+        store = _fill_store(os.path.join(directory, "conversations.db"), message_count)
+        try:
+            store.search(QUERIES[0])  # Open the read connection and warm the page cache
+            result = measure(lambda: [store.search(query, limit=10) for query in QUERIES], repeat=5 if quick else 20)
+            since = time.time() - 7 * 86400
+            recent = measure(lambda: [store.search(query, limit=10, since=since) for query in QUERIES],
+                             repeat=5 if quick else 20)
+        finally:
+            store.close()
+    result["messages"] = message_count
+    result["per_query"] = result["median"] / len(QUERIES)
+    result["per_query_last_week"] = recent["median"] / len(QUERIES)
+    return result
+
+@benchmark("search.append_and_index.1000_messages")
+def append_and_index(quick=False):
+    count = 200 if quick else 1000
+    with tempfile.TemporaryDirectory() as directory:
+        store = ConversationStore(os.path.join(directory, "conversations.db"))
+        try:
+            message = {"role": "user", "content": "Remind me how to configure the reverse proxy for the home server."}
+
+            def append_all():
+                for _ in range(count):
+                    store.append_message("benchmark", message)
+                store.flush()
+
+            result = measure(append_all, repeat=2 if quick else 5)
+        finally:
+            store.close()
+    result["per_message"] = result["median"] / count
+    return result
+
+@benchmark("memory.vector_search.100k_vectors")
+def vector_search(quick=False):
+    import numpy as np
+    count = 20_000 if quick else 100_000
+    dim = 384  # all-MiniLM-L6-v2
+    rng = np.random.default_rng(0)
+    with tempfile.TemporaryDirectory() as directory:
+        index = VectorIndex(os.path.join(directory, "vectors"), dim)
+        for start in range(0, count, 10_000):
+            vectors = rng.standard_normal((10_000, dim)).astype(np.float32)
+            vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+            index.add(range(start + 1, start + 10_001), vectors)
+        query = vectors[0]
+        result = measure(lambda: index.search(query, k=10), repeat=5 if quick else 20)
+        if index.search(query, k=1)[0][0] != count - 9_999:  # The first vector of the last batch
+            raise AssertionError("vector search did not find the query vector itself")
+        result["vectors"] = count
+        result["vector_megabytes"] = count * dim * 2 / 2**20
+    return result
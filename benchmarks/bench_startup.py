@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+import statistics
+from benchmarks.common import benchmark, SkipBenchmark
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter so every import is cold
+STARTUP_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+result = {"import_main": imported - start}
+try:
+    main.AlwaysReddy()
+    result["construct"] = time.perf_counter() - imported
+except Exception as e:
+    result["error"] = repr(e)
+print(json.dumps(result))
+"""
+
+@benchmark("startup.cold_start")
+def cold_start(quick=False):
+    runs = []
+    for _ in range(2 if quick else 5):
+        completed = subprocess.run([sys.executable, "-c", STARTUP_SCRIPT], cwd=REPO_DIR,
+                                   capture_output=True, text=True, timeout=120)
+        lines = completed.stdout.strip().splitlines()
+        if completed.returncode != 0 or not lines:
+            raise SkipBenchmark(f"could not import main: {completed.stderr.strip().splitlines()[-1:]}")
+        runs.append(json.loads(lines[-1]))
+
+    result = {"import_main_median": statistics.median(run["import_main"] for run in runs),
+              "import_main_min": min(run["import_main"] for run in runs),
+              "repeat": len(runs)}
+    constructed = [run["construct"] for run in runs if "construct" in run]
+    if constructed:
+        result["construct_median"] = statistics.median(constructed)
+        result["median"] = result["import_main_median"] + result["construct_median"]
+    else:
+        # AlwaysReddy() needs audio and input devices, on a headless machine only the imports are timed
+        result["construct_error"] = runs[0].get("error")
+        result["median"] = result["import_main_median"]
+    return result
@@ -0,0 +1,116 @@
+import copy
+from benchmarks.common import benchmark, measure, sample_response, sample_history, SkipBenchmark, SAMPLE_MARKDOWN
+from benchmarks.fakes import FakeCompletionClient
+from completion_manager import CompletionManager
+
+def _bare_completion_manager():
+    """A CompletionManager without a client, process_text_stream does not need one."""
+    manager = CompletionManager.__new__(CompletionManager)
+    manager.verbose = False
+    return manager
+
+@benchmark("text.process_text_stream.10k_chars_4_char_chunks")
+def process_text_stream(quick=False):
+    manager = _bare_completion_manager()
+    client = FakeCompletionClient(sample_response(10_000), chunk_size=4)
+    markers = [("[CLIPSTART]", "[CLIPEND]", lambda text: None)]
+    result = measure(lambda: manager.process_text_stream(client.stream_completion([], "fake"),
+                                                         tts_callback=lambda sentence: None,
+                                                         marker_tuples=markers),
+                     repeat=3 if quick else 10)
+    result["chars_per_second"] = 10_000 / result["median"]
+    return result
+
+@benchmark("text.process_text_stream.100k_chars_1_char_chunks")
+def process_text_stream_1_char_chunks(quick=False):
+    manager = _bare_completion_manager()
+    chunks = list(sample_response(100_000))
+    markers = [("[CLIPSTART]", "[CLIPEND]", lambda text: None)]
+    result = measure(lambda: manager.process_text_stream(iter(chunks),
+                                                         tts_callback=lambda sentence: None,
+                                                         marker_tuples=markers),
+                     repeat=2 if quick else 5)
+    result["chars_per_second"] = 100_000 / result["median"]
+    return result
+
+@benchmark("text.speech_units.markdown_response")
+def speech_units(quick=False):
+    manager = _bare_completion_manager()
+    text = SAMPLE_MARKDOWN * 10
+    chunks = [text[i:i + 4] for i in range(0, len(text), 4)]
+    units = []
+    result = measure(lambda: manager.process_text_stream(iter(chunks), tts_callback=units.append),
+                     repeat=3 if quick else 10,
+                     setup=units.clear)
+    # Every unit is a TTS call, so fewer is better
+    result["tts_calls"] = len(units)
+    return result
+
+def _legacy_sanitize_text(text):
+    """utils.sanitize_text before it was compiled, kept as the baseline for the benchmark below."""
+    disallowed_chars = '"<>[]{}|\\~`^*!#$()_;'
+    symbol_text_pairs = [(' & ', ' and '), (' % ', ' percent '), (' @ ', ' at '),
+                         (' = ', ' equals '), (' + ', ' plus '), (' / ', ' slash ')]
+    sanitized_text = ''.join(filter(lambda x: x not in disallowed_chars, text))
+    for symbol, text_equivalent in symbol_text_pairs:
+        sanitized_text = sanitized_text.replace(symbol, text_equivalent)
+    return sanitized_text
+
+@benchmark("text.sanitize_text.200_speech_units")
+def sanitize_text(quick=False):
+    from utils.utils import sanitize_text
+    from utils.speech_segmenter import segment_text
+    sentences = segment_text(sample_response(50_000), eager_first=False)[:200]
+
+    def run(sanitize):
+        for sentence in sentences:
+            sanitize(sentence)
+
+    result = measure(lambda: run(sanitize_text), repeat=3 if quick else 10)
+    legacy = measure(lambda: run(_legacy_sanitize_text), repeat=3 if quick else 10)
+    characters = sum(map(len, sentences))
+    result["chars_per_second"] = characters / result["median"]
+    result["legacy_chars_per_second"] = characters / legacy["median"]
+    result["speedup"] = legacy["median"] / result["median"]
+    return result
+
+@benchmark("text.maintain_token_limit.2000_messages")
+def maintain_token_limit(quick=False):
+    from utils.utils import maintain_token_limit
+    history = sample_history(2000)
+    try:
+        maintain_token_limit(copy.deepcopy(history[:3]), 4096)
+    except Exception as e:
+        raise SkipBenchmark(f"tokenizer unavailable: {e}")
+
+    copies = []
+    result = measure(lambda: maintain_token_limit(copies.pop(), 4096),
+                     repeat=2 if quick else 5,
+                     setup=lambda: copies.append(copy.deepcopy(history)))
+    return result
+
+@benchmark("text.response_cache.40_message_prompt")
+def response_cache(quick=False):
+    import os
+    import tempfile
+    from utils.response_cache import ResponseCache
+    history = sample_history(40)
+    history.append({"role": "user", "content": "Proofread the text on my clipboard please.\n\nMESSAGE TIMESTAMP: 09:15 AM 2024-05-01 (Wednesday)"})
+    # The same request asked again later, transcribed slightly differently
+    repeated = copy.deepcopy(history)
+    repeated[-1]["content"] = "proofread the text on my clipboard please\n\nMESSAGE TIMESTAMP: 04:40 PM 2024-05-03 (Friday)"
+    params = {"temperature": 0.7, "max_tokens": 4096}
+
+    with tempfile.TemporaryDirectory() as directory:
+        cache = ResponseCache(os.path.join(directory, "response_cache.db"))
+        try:
+            miss = measure(lambda: cache.get(cache.key("fake", params, sample_history(1) + [{"role": "user", "content": "unseen"}])),
+                           repeat=20 if quick else 200)
+            cache.put(cache.key("fake", params, history), "fake", sample_response(2000))
+            result = measure(lambda: cache.get(cache.key("fake", params, repeated)), repeat=20 if quick else 200)
+            hit = cache.get(cache.key("fake", params, repeated)) is not None
+        finally:
+            cache.close()
+    result["miss_median"] = miss["median"]
+    result["repeat_is_hit"] = hit
+    return result
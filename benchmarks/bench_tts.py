@@ -0,0 +1,215 @@
+import os
+import queue
+import statistics
+import tempfile
+import threading
+import time
+from benchmarks.common import benchmark, measure, sample_response, SkipBenchmark
+from benchmarks.fakes import FakeTTSClient
+from config_loader import config
+
+class _FakeParent:
+    stop_action = False
+
+def _make_tts_manager(audio_dir):
+    """A TTSManager using FakeTTSClient whose playback thread never plays, so only queueing is measured."""
+    import tts_manager
+    config.AUDIO_FILE_DIR = audio_dir
+    audio_cache_enabled = config.TTS_AUDIO_CACHE
+    config.TTS_AUDIO_CACHE = False  # Keep the benchmarks from creating the real cache folder
+    try:
+        manager = tts_manager.TTSManager(parent_client=_FakeParent(), verbose=False)
+    finally:
+        config.TTS_AUDIO_CACHE = audio_cache_enabled
+    manager._tts_client_loader.wait()
+    manager._tts_client = FakeTTSClient()
+
+    # An already running thread stands in for the playback thread, so run_tts just fills the queue
+    idle = threading.Event()
+    manager._play_audio_thread = threading.Thread(target=idle.wait, daemon=True)
+    manager._play_audio_thread.start()
+    return manager, idle
+
+def _drain(manager):
+    while True:
+        try:
+            file_path, _, future, _ = manager.audio_queue.get_nowait()
+        except queue.Empty:
+            break
+        if isinstance(file_path, str):
+            os.remove(file_path)
+        future.set_result(False)
+        manager._end()
+    manager.temp_files.clear()
+
+@benchmark("tts.split_sentences.10k_chars")
+def split_sentences(quick=False):
+    original_dir = config.AUDIO_FILE_DIR
+    with tempfile.TemporaryDirectory() as audio_dir:
+        manager, idle = _make_tts_manager(audio_dir)
+        text = sample_response(10_000)
+        try:
+            result = measure(lambda: manager.split_sentences(text), repeat=3 if quick else 10)
+            result["sentences"] = len(manager.split_sentences(text))
+        finally:
+            idle.set()
+            config.AUDIO_FILE_DIR = original_dir
+    return result
+
+@benchmark("tts.run_tts_queue_overhead.50_sentences")
+def run_tts_queue_overhead(quick=False):
+    original_dir = config.AUDIO_FILE_DIR
+    with tempfile.TemporaryDirectory() as audio_dir:
+        manager, idle = _make_tts_manager(audio_dir)
+        sentences = ["This is a short sentence number %d." % i for i in range(50)]
+        text = " ".join(sentences)
+        try:
+            result = measure(lambda: manager.run_tts(text, output_dir=audio_dir),
+                             repeat=3 if quick else 10,
+                             setup=lambda: _drain(manager))
+            _drain(manager)
+        finally:
+            idle.set()
+            config.AUDIO_FILE_DIR = original_dir
+    result["per_sentence"] = result["median"] / len(sentences)
+    return result
+
+@benchmark("tts.audio_cache.repeated_phrases")
+def audio_cache_repeated_phrases(quick=False):
+    from utils.audio_cache import AudioCache
+    original_dir = config.AUDIO_FILE_DIR
+    with tempfile.TemporaryDirectory() as audio_dir:
+        manager, idle = _make_tts_manager(audio_dir)
+        # Each call stands in for a Piper launch
+        manager._tts_client = FakeTTSClient(seconds_per_char=0.06, latency=0.05)
+        manager.audio_cache = AudioCache(os.path.join(audio_dir, "cache"))
+        phrase = "I have copied the text to your clipboard."
+        try:
+            manager.run_tts(phrase, output_dir=audio_dir)  # The first time it is synthesised
+            _drain(manager)
+            uncached_calls = manager.tts_client.calls
+            result = measure(lambda: manager.run_tts(phrase, output_dir=audio_dir),
+                             repeat=5 if quick else 20,
+                             setup=lambda: _drain(manager))
+            _drain(manager)
+            result["tts_calls_after_first"] = manager.tts_client.calls - uncached_calls
+
+            # Cached on disk only, as after a restart
+            manager.audio_cache = AudioCache(os.path.join(audio_dir, "cache"))
+            from_disk = measure(lambda: manager.run_tts(phrase, output_dir=audio_dir), repeat=1,
+                                setup=lambda: _drain(manager))
+            _drain(manager)
+            uncached = measure(lambda: manager.run_tts(f"{phrase} Again.", output_dir=audio_dir), repeat=1)
+            _drain(manager)
+        finally:
+            idle.set()
+            config.AUDIO_FILE_DIR = original_dir
+    result["from_disk"] = from_disk["median"]
+    result["uncached"] = uncached["median"]
+    return result
+
+def _waiter_cpu(manager, text, wait):
+    """Speak some text and return the CPU seconds the thread waiting for it to finish used, and the wall time."""
+    cpu = []
+
+    def waiter():
+        start = time.thread_time()
+        wait()
+        cpu.append(time.thread_time() - start)
+
+    start_time = time.perf_counter()
+    manager.run_tts(text, split_sentences=False)
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    thread.join()
+    return cpu[0], time.perf_counter() - start_time
+
+@benchmark("tts.wait_for_speech.cpu")
+def wait_for_speech_cpu(quick=False):
+    """CPU the action's thread uses while a long answer is spoken, waiting on the idle event against polling."""
+    try:
+        import soundfile  # noqa: F401, used to play the speech
+        import tts_manager
+        from utils.audio_backend import SimulatedAudioBackend
+        from utils.audio_mixer import AudioMixer
+    except Exception as e:
+        raise SkipBenchmark(f"audio libraries unavailable: {e}")
+
+    seconds = 1.0 if quick else 3.0
+    text = "A long spoken answer. " * 10
+    original_dir = config.AUDIO_FILE_DIR
+    audio_cache_enabled = config.TTS_AUDIO_CACHE
+    with tempfile.TemporaryDirectory() as audio_dir:
+        config.AUDIO_FILE_DIR = audio_dir
+        config.TTS_AUDIO_CACHE = False
+        try:
+            manager = tts_manager.TTSManager(parent_client=_FakeParent(), verbose=False)
+            manager._tts_client_loader.wait()
+            manager._tts_client = FakeTTSClient(seconds_per_char=seconds / len(text))
+            manager.mixer = AudioMixer(backend=SimulatedAudioBackend())
+
+            def poll():
+                # How the voice assistant used to wait
+                while manager.running_tts:
+                    time.sleep(0.001)
+
+            polled_cpu, polled_wall = _waiter_cpu(manager, text, poll)
+            event_cpu, event_wall = _waiter_cpu(manager, text, manager.wait)
+            manager.mixer.stop_all()
+        finally:
+            config.AUDIO_FILE_DIR = original_dir
+            config.TTS_AUDIO_CACHE = audio_cache_enabled
+    return {
+        "median": event_cpu,
+        "polling_cpu": polled_cpu,
+        "cpu_saved_per_second": (polled_cpu - event_cpu) / polled_wall,
+        "speech_seconds": event_wall,
+    }
+
+@benchmark("tts.barge_in.silence_after_stop")
+def barge_in(quick=False):
+    """Seconds from stop() to the speakers going quiet while a long answer is spoken, on the simulated sound card."""
+    try:
+        import soundfile  # noqa: F401, used to play the speech
+        import tts_manager
+        from utils.audio_backend import SimulatedAudioBackend
+        from utils.audio_mixer import AudioMixer
+    except Exception as e:
+        raise SkipBenchmark(f"audio libraries unavailable: {e}")
+
+    backend = SimulatedAudioBackend()
+    text = "This answer goes on for a while. It has a second sentence too. And a third one after that."
+    original_dir = config.AUDIO_FILE_DIR
+    audio_cache_enabled = config.TTS_AUDIO_CACHE
+    silences, stop_times = [], []
+    with tempfile.TemporaryDirectory() as audio_dir:
+        config.AUDIO_FILE_DIR = audio_dir
+        config.TTS_AUDIO_CACHE = False
+        try:
+            manager = tts_manager.TTSManager(parent_client=_FakeParent(), verbose=False)
+            manager._tts_client_loader.wait()
+            manager._tts_client = FakeTTSClient(seconds_per_char=0.02)
+            manager.mixer = AudioMixer(backend=backend)
+            for _ in range(3 if quick else 10):
+                manager.run_tts(text)
+                time.sleep(0.2)  # The user starts talking part way through the first sentence
+                start_time = time.monotonic()
+                manager.stop()
+                stop_times.append(time.monotonic() - start_time)
+                manager.wait()
+                time.sleep(0.05)
+                last_block = max(played_at for played_at, _ in backend.playback)
+                silences.append(max(0.0, last_block - start_time))
+                if manager.interrupted_sentence is None:
+                    raise RuntimeError("The interrupted sentence was not recorded")
+                backend.clear_playback()
+            manager.mixer.stop_all()
+        finally:
+            config.AUDIO_FILE_DIR = original_dir
+            config.TTS_AUDIO_CACHE = audio_cache_enabled
+    return {
+        "median": statistics.median(silences),
+        "max": max(silences),
+        "stop_call_median": statistics.median(stop_times),
+        "block_seconds": manager.mixer.block_size / manager.mixer.samplerate,
+    }
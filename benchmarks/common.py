@@ -0,0 +1,79 @@
+import statistics
+import time
+
+BENCHMARKS = {}
+
+def benchmark(name):
+    """
+    Register a benchmark function under a name.
+
+    The function takes a `quick` argument (fewer repetitions when True) and returns a dict of results,
+    normally built with `measure`. Raise SkipBenchmark if it cannot run in this environment.
+    """
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+class SkipBenchmark(Exception):
+    """Raised by a benchmark that cannot run here, e.g. because a model file or device is missing."""
+    pass
+
+def measure(func, repeat=5, number=1, setup=None):
+    """
+    Time a function.
+
+    Args:
+        func (callable): The code to time.
+        repeat (int): How many timed runs to make.
+        number (int): How many calls to make per run, the reported times are per call.
+        setup (callable, optional): Called before every run, not timed.
+
+    Returns:
+        dict: min, median and mean seconds per call, plus the repeat and number used.
+    """
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start_time = time.perf_counter()
+        for _ in range(number):
+            func()
+        times.append((time.perf_counter() - start_time) / number)
+    return {
+        "min": min(times),
+        "median": statistics.median(times),
+        "mean": statistics.mean(times),
+        "repeat": repeat,
+        "number": number,
+    }
+
+SAMPLE_PARAGRAPH = (
+    "Sure, here is a quick overview. The function reads the file, parses each line and returns a list! "
+    "Does that help? You can also pass a custom delimiter, e.g. a tab or a semicolon.\n"
+    "[CLIPSTART]import csv\nwith open('data.csv') as f:\n    rows = list(csv.reader(f))\n[CLIPEND]\n"
+    "I have copied the code to your clipboard. It costs about 3.5 ms per 1,000 rows on a laptop.\n"
+)
+
+SAMPLE_MARKDOWN = (
+    "Here are the steps, e.g. for Python 3.11 on Linux.\n\n"
+    "1. Install the package from https://pypi.org/project/requests/ first.\n"
+    "2. Run `pip install -r requirements.txt` in the project folder.\n"
+    "3. Check [the docs](https://requests.readthedocs.io/en/latest/) for more.\n\n"
+    "```python\nimport requests\nresponse = requests.get(url, timeout=5.0)\nprint(response.status_code)\n```\n\n"
+    "## Notes\n- It retries twice.\n- It times out after 5 s.\n- Dr. Smith wrote it.\n\n"
+    "That's all. Let me know if it works!\n"
+)
+
+def sample_response(length):
+    """Build a response of the given length mixing prose, punctuation, clipboard markers and code."""
+    repeats = length // len(SAMPLE_PARAGRAPH) + 1
+    return (SAMPLE_PARAGRAPH * repeats)[:length]
+
+def sample_history(message_count, words_per_message=60):
+    """Build a chat history of alternating user and assistant messages after a system prompt."""
+    messages = [{"role": "system", "content": "You are a helpful assistant. " * 20}]
+    for i in range(message_count):
+        role = "user" if i % 2 == 0 else "assistant"
+        messages.append({"role": role, "content": f"Message {i}: " + "lorem ipsum dolor sit amet " * (words_per_message // 5)})
+    return messages
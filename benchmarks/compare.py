@@ -0,0 +1,49 @@
+"""
+Compare two benchmark result files written by benchmarks.run.
+
+    python -m benchmarks.compare before.json after.json --threshold 0.1
+
+Exits with status 1 if any benchmark's median got slower by more than the threshold.
+"""
+import argparse
+import json
+import sys
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two AlwaysReddy benchmark result files.")
+    parser.add_argument("baseline", help="Results from the reference commit")
+    parser.add_argument("candidate", help="Results from the commit being checked")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative slowdown that counts as a regression (default 0.1 = 10%%)")
+    args = parser.parse_args()
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"Baseline:  {baseline.get('commit')} ({baseline.get('timestamp')})")
+    print(f"Candidate: {candidate.get('commit')} ({candidate.get('timestamp')})\n")
+    print(f"{'benchmark':<55} {'baseline ms':>12} {'candidate ms':>13} {'change':>8}")
+
+    regressions = []
+    names = sorted(set(baseline["results"]) | set(candidate["results"]))
+    for name in names:
+        before = baseline["results"].get(name, {}).get("median")
+        after = candidate["results"].get(name, {}).get("median")
+        if before is None or after is None:
+            print(f"{name:<55} {'-' if before is None else f'{before * 1000:.3f}':>12} "
+                  f"{'-' if after is None else f'{after * 1000:.3f}':>13} {'n/a':>8}")
+            continue
+        change = (after - before) / before if before else 0.0
+        flag = "  REGRESSION" if change > args.threshold else ""
+        print(f"{name:<55} {before * 1000:>12.3f} {after * 1000:>13.3f} {change:>+8.1%}{flag}")
+        if flag:
+            regressions.append(name)
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    print("\nNo regressions.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+import time
+import wave
+import numpy as np
+from llm_apis.base_client import BaseClient
+
+class FakeCompletionClient(BaseClient):
+    """A completions client that streams a fixed response, for running the pipeline without a network."""
+    def __init__(self, response, chunk_size=4, time_to_first_token=0.0, chunk_delay=0.0, verbose=False):
+        """
+        Initialize the FakeCompletionClient.
+
+        Args:
+            response (str): The text to stream back for every request.
+            chunk_size (int): Characters per streamed chunk.
+            time_to_first_token (float): Seconds to wait before the first chunk.
+            chunk_delay (float): Seconds to wait between chunks.
+            verbose (bool): Whether to print verbose output.
+        """
+        super().__init__(verbose)
+        self.response = response
+        self.chunk_size = chunk_size
+        self.time_to_first_token = time_to_first_token
+        self.chunk_delay = chunk_delay
+
+    def stream_completion(self, messages, model, **kwargs):
+        if self.time_to_first_token:
+            time.sleep(self.time_to_first_token)
+        for i in range(0, len(self.response), self.chunk_size):
+            if self.chunk_delay and i:
+                time.sleep(self.chunk_delay)
+            yield self.response[i:i + self.chunk_size]
+
+class FakeTTSClient:
+    """A TTS client that writes a short quiet tone to a WAV file instead of synthesising speech."""
+    def __init__(self, samplerate=22050, seconds_per_char=0.0, latency=0.0, verbose=False):
+        self.samplerate = samplerate
+        self.seconds_per_char = seconds_per_char
+        self.latency = latency  # Seconds each call takes, e.g. a Piper process launch
+        self.verbose = verbose
+        self.calls = 0
+
+    def tts(self, text_to_speak, output_file):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        frames = max(1, int(len(text_to_speak) * self.seconds_per_char * self.samplerate))
+        with wave.open(output_file, 'wb') as wf:
+            wf.setnchannels(1)
+            wf.setsampwidth(2)
+            wf.setframerate(self.samplerate)
+            wf.writeframes((np.sin(np.arange(frames) * 2 * np.pi * 440 / self.samplerate) * 3000).astype(np.int16).tobytes())
+        return "success"
@@ -0,0 +1,413 @@
+"""
+A local stand-in for the providers AlwaysReddy talks to, for load testing and benchmarking offline.
+
+It speaks the OpenAI chat completions API (server sent events), the Anthropic messages API (server sent
+events), the Ollama chat API (newline delimited JSON), and the OpenAI audio transcription and speech
+endpoints. How long the first token takes, how fast tokens stream, how the text is split into chunks and
+how often requests fail are all configurable, and every random choice is seeded, so a run can be repeated.
+
+Run it from the repository root:
+
+    python -m benchmarks.mock_server --port 8765 --ttft 0.3 --tokens-per-second 40 --error-rate 0.05
+
+then point AlwaysReddy at it, e.g. OPENAI_BASE_URL=http://127.0.0.1:8765/v1,
+ANTHROPIC_BASE_URL=http://127.0.0.1:8765 or OLLAMA_API_BASE_URL = "http://127.0.0.1:8765" in config.py.
+Benchmarks start one in process with MockProviderServer.
+"""
+import argparse
+import io
+import json
+import random
+import re
+import threading
+import time
+import uuid
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_RESPONSE = ("Sure, here is the answer. Fast language models matter because people notice any wait "
+                    "before a voice assistant starts talking, so every part of the turn has to start quickly.")
+DEFAULT_TRANSCRIPT = "What is the capital of France?"
+
+_RESPONSE_FORMAT_FIELD = re.compile(rb'name="response_format"\r\n\r\n([^\r\n]*)')
+
+
+class MockProviderServer:
+    """
+    A local HTTP server that answers like the OpenAI, Anthropic and Ollama APIs.
+
+    Counts of requests and injected failures are kept on the instance, so benchmarks can check what the
+    clients actually sent.
+    """
+    def __init__(self, response=DEFAULT_RESPONSE, transcript=DEFAULT_TRANSCRIPT, time_to_first_token=0.0,
+                 tokens_per_second=None, chunk_chars=(1, 8), split_frames=False, error_rate=0.0,
+                 error_status=503, retry_after=None, disconnect_rate=0.0, speech_seconds_per_char=0.06,
+                 samplerate=24000, host="127.0.0.1", port=0, seed=0):
+        """
+        Start the server.
+
+        Args:
+            response (str): The text every completion answers with.
+            transcript (str): The text every transcription answers with.
+            time_to_first_token (float): Seconds before the first chunk of a response, or before a
+                transcription or speech response.
+            tokens_per_second (float, optional): How fast chunks are streamed, each chunk counting as a
+                token. As fast as possible if None.
+            chunk_chars (tuple): The least and most characters of text in a chunk, each chunk's length is
+                picked at random between them.
+            split_frames (bool): Write every event or JSON line in two parts, as a slow network might
+                deliver them, to check that clients do not assume one read is one event.
+            error_rate (float): The share of requests answered with error_status instead.
+            error_status (int): The HTTP status of failed requests.
+            retry_after (float, optional): The retry-after header sent with failed requests.
+            disconnect_rate (float): The share of streamed responses that are cut off after the first chunk.
+            speech_seconds_per_char (float): Length of the silent speech returned per character of input.
+            samplerate (int): Sample rate of the speech returned.
+            host (str): The address to listen on.
+            port (int): The port to listen on, a free one if 0.
+            seed (int): Seed for chunk lengths and for which requests fail.
+        """
+        self.response = response
+        self.transcript = transcript
+        self.time_to_first_token = time_to_first_token
+        self.tokens_per_second = tokens_per_second
+        self.chunk_chars = chunk_chars
+        self.split_frames = split_frames
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.disconnect_rate = disconnect_rate
+        self.speech_seconds_per_char = speech_seconds_per_char
+        self.samplerate = samplerate
+        self.seed = seed
+        self.requests = 0
+        self.failures = 0
+        self.disconnects = 0
+        self.requests_by_path = {}
+        self._lock = threading.Lock()
+
+        self._server = ThreadingHTTPServer((host, port), _make_handler(self))
+        self._server.daemon_threads = True
+        self.base_url = f"http://{host}:{self._server.server_address[1]}"
+        self._thread = threading.Thread(target=self._server.serve_forever, name="mock_provider_server", daemon=True)
+        self._thread.start()
+
+    @property
+    def openai_base_url(self):
+        """The base URL to give an OpenAI client, which adds paths after /v1."""
+        return f"{self.base_url}/v1"
+
+    def _start_request(self, path):
+        """Count a request and return its random generator, seeded by its position so runs repeat."""
+        with self._lock:
+            index = self.requests
+            self.requests += 1
+            self.requests_by_path[path] = self.requests_by_path.get(path, 0) + 1
+        return random.Random(self.seed * 1_000_003 + index)
+
+    def _count(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def split_text(self, text, rng):
+        """Split text into chunks of chunk_chars characters."""
+        low, high = self.chunk_chars
+        chunks = []
+        i = 0
+        while i < len(text):
+            length = rng.randint(max(1, low), max(1, low, high))
+            chunks.append(text[i:i + length])
+            i += length
+        return chunks
+
+    def close(self):
+        """Stop the server and free its port."""
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _silent_wav(seconds, samplerate):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wf:
+        wf.setnchannels(1)
+        wf.setsampwidth(2)
+        wf.setframerate(samplerate)
+        wf.writeframes(b"\0\0" * max(1, int(seconds * samplerate)))
+    return buffer.getvalue()
+
+
+def _openai_chunk(completion_id, model, delta, finish_reason=None):
+    return {"id": completion_id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+
+
+def _make_handler(server):
+    """Build the request handler class for a MockProviderServer."""
+
+    class Handler(BaseHTTPRequestHandler):
+        # Streamed responses end by closing the connection, as HTTP/1.0 allows, so none need a length
+        protocol_version = "HTTP/1.0"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.rstrip("/") in ("/v1/models", "/models"):
+                self._send_json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+            elif self.path.rstrip("/") == "/api/tags":
+                self._send_json(200, {"models": [{"name": "mock", "model": "mock"}]})
+            else:
+                self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            path = self.path.split("?")[0].rstrip("/")
+            routes = {
+                "/v1/chat/completions": self._openai_chat,
+                "/chat/completions": self._openai_chat,
+                "/v1/messages": self._anthropic_messages,
+                "/api/chat": self._ollama_chat,
+                "/v1/audio/transcriptions": self._transcription,
+                "/v1/audio/speech": self._speech,
+            }
+            if path not in routes:
+                self._send_json(404, {"error": f"Unknown path {self.path}"})
+                return
+            rng = server._start_request(path)
+            if rng.random() < server.error_rate:
+                server._count("failures")
+                self._send_error(path)
+                return
+            try:
+                routes[path](body, rng)
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # The client stopped reading, e.g. a cancelled or hedged request
+
+        # Responses
+
+        def _send_json(self, status, payload, headers=None):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_error(self, path):
+            status = server.error_status
+            message = f"Injected failure ({status})"
+            if path == "/v1/messages":
+                error_type = "overloaded_error" if status == 529 else "rate_limit_error" if status == 429 else "api_error"
+                payload = {"type": "error", "error": {"type": error_type, "message": message}}
+            elif path == "/api/chat":
+                payload = {"error": message}
+            else:
+                payload = {"error": {"message": message, "type": "server_error", "code": status}}
+            headers = {}
+            if server.retry_after is not None:
+                headers["Retry-After"] = str(server.retry_after)
+            self._send_json(status, payload, headers)
+
+        def _start_stream(self, content_type):
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            self.wfile.flush()
+
+        def _write_frame(self, frame, rng):
+            data = frame.encode()
+            if server.split_frames and len(data) > 1:
+                cut = rng.randint(1, len(data) - 1)
+                self.wfile.write(data[:cut])
+                self.wfile.flush()
+                time.sleep(0.001)
+                data = data[cut:]
+            self.wfile.write(data)
+            self.wfile.flush()
+
+        def _stream_text(self, rng, write_chunk):
+            """
+            Stream the response text, pacing it as configured.
+
+            Returns:
+                bool: False if the response was cut off to simulate a dropped connection.
+            """
+            disconnect = rng.random() < server.disconnect_rate
+            if server.time_to_first_token:
+                time.sleep(server.time_to_first_token)
+            interval = 1.0 / server.tokens_per_second if server.tokens_per_second else 0.0
+            next_time = time.monotonic()
+            for i, chunk in enumerate(server.split_text(server.response, rng)):
+                if interval and i:
+                    next_time += interval
+                    delay = next_time - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                write_chunk(chunk)
+                if disconnect:
+                    server._count("disconnects")
+                    self.close_connection = True
+                    return False
+            return True
+
+        # Completions
+
+        def _openai_chat(self, body, rng):
+            request = json.loads(body or b"{}")
+            model = request.get("model", "mock")
+            completion_id = f"chatcmpl-{uuid.UUID(int=rng.getrandbits(128)).hex}"
+            if not request.get("stream"):
+                if server.time_to_first_token:
+                    time.sleep(server.time_to_first_token)
+                self._send_json(200, {
+                    "id": completion_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": server.response}}],
+                    "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}})
+                return
+
+            def send(payload):
+                self._write_frame(f"data: {json.dumps(payload)}\n\n", rng)
+
+            self._start_stream("text/event-stream")
+            send(_openai_chunk(completion_id, model, {"role": "assistant", "content": ""}))
+            if self._stream_text(rng, lambda chunk: send(_openai_chunk(completion_id, model, {"content": chunk}))):
+                send(_openai_chunk(completion_id, model, {}, "stop"))
+                self._write_frame("data: [DONE]\n\n", rng)
+
+        def _anthropic_messages(self, body, rng):
+            request = json.loads(body or b"{}")
+            model = request.get("model", "mock")
+            message_id = f"msg_{uuid.UUID(int=rng.getrandbits(128)).hex}"
+            usage = {"input_tokens": 0, "output_tokens": 0}
+            if not request.get("stream"):
+                if server.time_to_first_token:
+                    time.sleep(server.time_to_first_token)
+                self._send_json(200, {
+                    "id": message_id, "type": "message", "role": "assistant", "model": model,
+                    "content": [{"type": "text", "text": server.response}],
+                    "stop_reason": "end_turn", "stop_sequence": None, "usage": usage})
+                return
+
+            def send(event, payload):
+                self._write_frame(f"event: {event}\ndata: {json.dumps(payload)}\n\n", rng)
+
+            self._start_stream("text/event-stream")
+            send("message_start", {"type": "message_start", "message": {
+                "id": message_id, "type": "message", "role": "assistant", "model": model, "content": [],
+                "stop_reason": None, "stop_sequence": None, "usage": usage}})
+            send("content_block_start", {"type": "content_block_start", "index": 0,
+                                         "content_block": {"type": "text", "text": ""}})
+            finished = self._stream_text(rng, lambda chunk: send("content_block_delta", {
+                "type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": chunk}}))
+            if finished:
+                send("content_block_stop", {"type": "content_block_stop", "index": 0})
+                send("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                       "usage": {"output_tokens": 0}})
+                send("message_stop", {"type": "message_stop"})
+
+        def _ollama_chat(self, body, rng):
+            request = json.loads(body or b"{}")
+            model = request.get("model", "mock")
+
+            def message(content, done):
+                payload = {"model": model, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                           "message": {"role": "assistant", "content": content}, "done": done}
+                if done:
+                    payload["done_reason"] = "stop"
+                return payload
+
+            if request.get("stream") is False:
+                if server.time_to_first_token:
+                    time.sleep(server.time_to_first_token)
+                self._send_json(200, message(server.response, True))
+                return
+
+            self._start_stream("application/x-ndjson")
+            if self._stream_text(rng, lambda chunk: self._write_frame(json.dumps(message(chunk, False)) + "\n", rng)):
+                self._write_frame(json.dumps(message("", True)) + "\n", rng)
+
+        # Audio
+
+        def _transcription(self, body, rng):
+            if server.time_to_first_token:
+                time.sleep(server.time_to_first_token)
+            match = _RESPONSE_FORMAT_FIELD.search(body)
+            response_format = match.group(1).decode() if match else "json"
+            if response_format in ("text", "srt", "vtt"):
+                data = server.transcript.encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+            else:
+                self._send_json(200, {"text": server.transcript})
+
+        def _speech(self, body, rng):
+            request = json.loads(body or b"{}")
+            audio = _silent_wav(len(request.get("input", "")) * server.speech_seconds_per_char, server.samplerate)
+            if request.get("response_format") == "pcm":
+                audio = audio[44:]  # Headerless 16 bit mono
+            if server.time_to_first_token:
+                time.sleep(server.time_to_first_token)
+            self.send_response(200)
+            self.send_header("Content-Type", "audio/pcm" if request.get("response_format") == "pcm" else "audio/wav")
+            self.send_header("Content-Length", str(len(audio)))
+            self.end_headers()
+            for i in range(0, len(audio), 4096):
+                self.wfile.write(audio[i:i + 4096])
+
+    return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a local stand-in for the OpenAI, Anthropic and Ollama APIs.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--response", default=DEFAULT_RESPONSE, help="The text every completion answers with")
+    parser.add_argument("--transcript", default=DEFAULT_TRANSCRIPT, help="The text every transcription answers with")
+    parser.add_argument("--ttft", type=float, default=0.0, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=None, help="Streaming rate, unlimited by default")
+    parser.add_argument("--chunk-chars", type=int, nargs=2, default=(1, 8), metavar=("MIN", "MAX"),
+                        help="Range of characters per streamed chunk")
+    parser.add_argument("--split-frames", action="store_true", help="Write every event in two parts")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests that fail")
+    parser.add_argument("--error-status", type=int, default=503, help="HTTP status of failed requests")
+    parser.add_argument("--retry-after", type=float, default=None, help="retry-after header of failed requests")
+    parser.add_argument("--disconnect-rate", type=float, default=0.0,
+                        help="Share of streams cut off after the first chunk")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = MockProviderServer(response=args.response, transcript=args.transcript, time_to_first_token=args.ttft,
+                                tokens_per_second=args.tokens_per_second, chunk_chars=tuple(args.chunk_chars),
+                                split_frames=args.split_frames, error_rate=args.error_rate,
+                                error_status=args.error_status, retry_after=args.retry_after,
+                                disconnect_rate=args.disconnect_rate, host=args.host, port=args.port, seed=args.seed)
+    print(f"Mock provider server listening on {server.base_url}")
+    print(f"  OpenAI:    OPENAI_BASE_URL={server.openai_base_url}")
+    print(f"  Anthropic: ANTHROPIC_BASE_URL={server.base_url}")
+    print(f"  Ollama:    OLLAMA_API_BASE_URL = \"{server.base_url}\" in config.py")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(f"Served {server.requests} requests, {server.failures} failed and {server.disconnects} cut off")
+        server.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""
+Replay a session trace recorded with SESSION_TRACE_DIR against the current code, and report how long each
+stage of every turn took compared to when it was recorded. Run from the repository root:
+
+    python -m benchmarks.replay_session traces/session-20240501-091500.jsonl.gz
+    python -m benchmarks.replay_session trace.jsonl.gz --real --output replay.json
+
+The recorded audio is played into AudioRecorder through the simulated audio backend, and the recorded hotkey
+events are sent through InputHandler.process_key_event at the times they were pressed. By default the
+transcription, completion and TTS providers are stood in for by fakes that answer with what was recorded,
+taking as long as they did then, so any difference is down to AlwaysReddy's own code. With --real the
+configured providers are used instead, with the recorded prompts.
+
+Exits with status 1 if --threshold is given and any stage's median got slower by more than it.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+STAGES = [
+    ("hotkey_to_stop", "Hotkey to recording stopped"),
+    ("save_recording", "Saving the recording"),
+    ("transcription", "Transcription"),
+    ("time_to_first_token", "Time to first token"),
+    ("first_sentence", "Request to first sentence"),
+    ("synthesis", "First sentence synthesis"),
+    ("speech_end_to_first_sound", "End of speech to first sound"),
+]
+
+
+def split_turns(events):
+    """
+    Group the events of a trace into turns.
+
+    Returns:
+        list: A dict per turn holding its "recording" event, the "keys" pressed while recording, its
+        "transcription" and "completion" events (or None), and its "tts" and "playback" events.
+    """
+    turns = {}
+    for event in events:
+        if event["type"] == "recording":
+            turns[event["turn"]] = {"recording": event, "keys": [], "transcription": None, "completion": None,
+                                    "tts": [], "playback": []}
+    for event in events:
+        turn = turns.get(event["turn"])
+        if event["type"] == "key":
+            # Key events are recorded before the recording they stop, so they belong to the next turn
+            for candidate in turns.values():
+                if candidate["recording"]["started"] - 1.0 <= event["t"] <= candidate["recording"]["stopped"]:
+                    candidate["keys"].append(event)
+        elif turn is None:
+            continue
+        elif event["type"] in ("transcription", "completion") and turn[event["type"]] is None:
+            turn[event["type"]] = event
+        elif event["type"] in ("tts", "playback"):
+            turn[event["type"]].append(event)
+    return [turns[number] for number in sorted(turns)]
+
+def turn_stages(turn):
+    """Work out how long each stage of a turn took, in seconds. Stages that did not happen are left out."""
+    recording = turn["recording"]
+    stages = {"save_recording": recording["t"] - recording["stopped"]}
+    keys = [key for key in turn["keys"] if key["t"] <= recording["stopped"]]
+    if keys:
+        stages["hotkey_to_stop"] = recording["stopped"] - keys[-1]["t"]
+    if turn["transcription"]:
+        stages["transcription"] = turn["transcription"]["t"] - turn["transcription"]["started"]
+    completion = turn["completion"]
+    if completion and completion["chunks"]:
+        stages["time_to_first_token"] = completion["chunks"][0][0]
+    if completion and turn["tts"]:
+        stages["first_sentence"] = turn["tts"][0]["started"] - completion["started"]
+    if turn["tts"]:
+        stages["synthesis"] = turn["tts"][0]["t"] - turn["tts"][0]["started"]
+    if turn["playback"]:
+        stages["speech_end_to_first_sound"] = turn["playback"][0]["t"] - recording["stopped"]
+    return stages
+
+
+class _Parent:
+    stop_action = False
+
+
+def _replay_clients(turns):
+    """Fakes for the providers that answer with what was recorded, taking as long as they took then."""
+    from benchmarks.fakes import FakeTTSClient
+    from llm_apis.base_client import BaseClient
+
+    class ReplayTranscriber:
+        def __init__(self):
+            self.next_turn = None
+
+        def transcribe_audio_file(self, file_path):
+            event = self.next_turn["transcription"]
+            time.sleep(event["t"] - event["started"])
+            return event["text"]
+
+    class ReplayCompletionClient(BaseClient):
+        def __init__(self):
+            super().__init__(False)
+            self.next_turn = None
+
+        def stream_completion(self, messages, model, **kwargs):
+            start_time = time.monotonic()
+            for offset, chunk in self.next_turn["completion"]["chunks"]:
+                delay = start_time + offset - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                yield chunk
+
+    class ReplayTTSClient(FakeTTSClient):
+        def __init__(self):
+            super().__init__()
+            self.recorded = {}
+            for turn in turns:
+                for event in turn["tts"]:
+                    self.recorded[event["text"]] = (event["t"] - event["started"], event.get("audio_seconds"))
+            synthesis_times = [seconds for seconds, _ in self.recorded.values()] or [0.0]
+            self.default_latency = statistics.median(synthesis_times)
+
+        def tts(self, text_to_speak, output_file):
+            latency, audio_seconds = self.recorded.get(text_to_speak, (self.default_latency, None))
+            self.latency = latency
+            self.seconds_per_char = (audio_seconds or len(text_to_speak) * 0.06) / max(1, len(text_to_speak))
+            return super().tts(text_to_speak, output_file)
+
+    return ReplayTranscriber(), ReplayCompletionClient(), ReplayTTSClient()
+
+
+def replay(trace_path, real=False, verbose=False):
+    """
+    Replay every turn of a trace.
+
+    Args:
+        trace_path (str): The trace to replay.
+        real (bool): Use the configured providers rather than replaying the recorded responses.
+        verbose (bool): Whether to print verbose output.
+
+    Returns:
+        tuple: The recorded turns and the replayed turns, see split_turns.
+    """
+    from config_loader import config
+    import tts_manager
+    from audio_recorder import AudioRecorder
+    from completion_manager import CompletionManager
+    from input_apis.input_handler import InputHandler
+    from transcription_manager import TranscriptionManager
+    from utils.audio_backend import SimulatedAudioBackend
+    from utils.audio_mixer import AudioMixer
+    from utils.background_loader import BackgroundLoader
+    from utils.session_trace import SessionTracer, completion_prompts, load_trace, recording_audio
+
+    recorded_events = load_trace(trace_path)
+    recorded_turns = split_turns(recorded_events)
+    prompts = completion_prompts(recorded_events)
+    backend = SimulatedAudioBackend()
+    original_dir = config.AUDIO_FILE_DIR
+    audio_cache_enabled = config.TTS_AUDIO_CACHE
+    trace_dir = config.SESSION_TRACE_DIR
+    config.SESSION_TRACE_DIR = None  # The replay is traced separately below
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        config.AUDIO_FILE_DIR = os.path.join(work_dir, "audio_files")
+        os.makedirs(config.AUDIO_FILE_DIR)
+        config.TTS_AUDIO_CACHE = False  # The recorded synthesis times are what is being compared
+        tracer = SessionTracer(os.path.join(work_dir, "replay.jsonl.gz"), verbose=verbose)
+        try:
+            recorder = AudioRecorder(backend=backend, verbose=verbose)
+            tts = tts_manager.TTSManager(parent_client=_Parent(), verbose=verbose)
+            tts.mixer = AudioMixer(backend=backend, verbose=verbose)
+            if real:
+                transcription_manager = TranscriptionManager(verbose=verbose)
+                completion_manager = CompletionManager(verbose=verbose)
+            else:
+                transcriber, completion_client, tts_client = _replay_clients(recorded_turns)
+                transcription_manager = TranscriptionManager.__new__(TranscriptionManager)
+                transcription_manager.verbose = verbose
+                transcription_manager._client = transcriber
+                transcription_manager._client_loader = BackgroundLoader(lambda: None, "replayed transcription")
+                completion_manager = CompletionManager.__new__(CompletionManager)
+                completion_manager.verbose = verbose
+                completion_manager._client = completion_client
+                completion_manager._client_loader = BackgroundLoader(lambda: None, "replayed completions")
+                tts._tts_client_loader.wait()
+                tts._tts_client = tts_client
+            for component in (recorder, tts, transcription_manager, completion_manager):
+                component.tracer = tracer
+
+            input_handler = InputHandler(verbose=verbose)
+            input_handler.tracer = tracer
+            stop_requested = threading.Event()
+            stop_result = {}
+
+            def stop_recording():
+                stop_requested.set()
+                # Like AlwaysReddy.execute_action_in_thread, the action runs on its own thread
+                def run():
+                    stop_result["filename"] = recorder.stop_recording()
+                stop_result["thread"] = threading.Thread(target=run)
+                stop_result["thread"].start()
+
+            armed = [False]
+            def on_hotkey():
+                if armed[0]:
+                    armed[0] = False
+                    stop_recording()
+
+            for hotkey in {key["hotkey"] for turn in recorded_turns for key in turn["keys"]}:
+                input_handler.add_hotkey(hotkey, pressed=on_hotkey, released=on_hotkey, held_release=on_hotkey,
+                                         double_tap=on_hotkey)
+
+            for number, turn in enumerate(recorded_turns, 1):
+                print(f"Replaying turn {number} of {len(recorded_turns)}...", flush=True)
+                recording = turn["recording"]
+                keys = [key for key in turn["keys"] if key["t"] <= recording["stopped"]]
+                stop_requested.clear()
+                stop_result.clear()
+
+                backend.feed(recording_audio(recording), samplerate=recording["samplerate"], label=f"turn {number}")
+                recorder.start_recording()
+                start_time = time.monotonic()
+                for index, key in enumerate(keys):
+                    delay = start_time + key["t"] - recording["started"] - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                    armed[0] = index == len(keys) - 1
+                    input_handler.process_key_event(key["hotkey"], key["pressed"])
+                if not keys or not stop_requested.is_set():
+                    backend.wait_for_input()
+                    stop_recording()
+                stop_result["thread"].join()
+                filename = stop_result.get("filename")
+                if not filename:
+                    print(f"Turn {number}: nothing was recorded")
+                    continue
+
+                if not real:
+                    transcriber.next_turn = turn
+                    completion_client.next_turn = turn
+                if turn["transcription"] or real:
+                    transcription_manager.transcribe_audio(filename)
+                else:
+                    os.remove(os.path.join(config.AUDIO_FILE_DIR, filename))
+
+                completion = turn["completion"]
+                if completion is None:
+                    continue
+                stream = completion_manager.get_completion_stream(prompts[completion["prompt"]], completion["model"],
+                                                                  **(completion.get("params") or {}))
+                if stream is not None:
+                    completion_manager.process_text_stream(stream, tts_callback=tts.run_tts)
+                tts.wait()
+            tts.mixer.stop_all()
+        finally:
+            tracer.close()
+            config.AUDIO_FILE_DIR = original_dir
+            config.TTS_AUDIO_CACHE = audio_cache_enabled
+            config.SESSION_TRACE_DIR = trace_dir
+        replayed_turns = split_turns(load_trace(tracer.path))
+    return recorded_turns, replayed_turns
+
+
+def compare(recorded_turns, replayed_turns):
+    """
+    Compare the stage timings of the recorded and replayed turns.
+
+    Returns:
+        dict: For each stage, the recorded and replayed medians in seconds and how many turns had it.
+    """
+    results = {}
+    for stage, _ in STAGES:
+        recorded = [turn_stages(turn)[stage] for turn in recorded_turns if stage in turn_stages(turn)]
+        replayed = [turn_stages(turn)[stage] for turn in replayed_turns if stage in turn_stages(turn)]
+        if recorded and replayed:
+            results[stage] = {"recorded": statistics.median(recorded), "replayed": statistics.median(replayed),
+                              "turns": min(len(recorded), len(replayed))}
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay an AlwaysReddy session trace and compare its latency.")
+    parser.add_argument("trace", help="A trace written with SESSION_TRACE_DIR set")
+    parser.add_argument("--real", action="store_true",
+                        help="Use the configured transcription, completion and TTS providers")
+    parser.add_argument("--output", help="Write the comparison as JSON to this file")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="Relative slowdown of a stage that counts as a regression, e.g. 0.1")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    trace_path = os.path.abspath(args.trace)
+    os.chdir(REPO_DIR)
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+
+    recorded_turns, replayed_turns = replay(trace_path, real=args.real, verbose=args.verbose)
+    results = compare(recorded_turns, replayed_turns)
+
+    print(f"\n{'stage':<32} {'recorded ms':>12} {'replayed ms':>12} {'change ms':>10} {'change':>8}")
+    regressions = []
+    for stage, label in STAGES:
+        if stage not in results:
+            continue
+        recorded, replayed = results[stage]["recorded"], results[stage]["replayed"]
+        change = (replayed - recorded) / recorded if recorded else 0.0
+        results[stage]["change"] = change
+        print(f"{label:<32} {recorded * 1000:>12.1f} {replayed * 1000:>12.1f} {(replayed - recorded) * 1000:>+10.1f} {change:>+8.1%}")
+        if args.threshold is not None and change > args.threshold:
+            regressions.append(stage)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"trace": args.trace, "real": args.real, "stages": results}, f, indent=2)
+    if regressions:
+        print(f"\nSlower than the recording by more than {args.threshold:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Run the AlwaysReddy benchmark suite.
+
+Everything runs offline against fake clients. Run from the repository root:
+
+    python -m benchmarks.run --output before.json
+    python -m benchmarks.run --output after.json
+    python -m benchmarks.compare before.json after.json
+"""
+import argparse
+import datetime
+import importlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import traceback
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARK_MODULES = ["bench_startup", "bench_input", "bench_recorder", "bench_text", "bench_tts", "bench_search", "bench_routing", "bench_pipeline"]
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True).stdout.strip() or None
+    except Exception:
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the AlwaysReddy benchmark suite.")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    parser.add_argument("--filter", help="Only run benchmarks whose name contains this text")
+    parser.add_argument("--quick", action="store_true", help="Fewer repetitions, for a fast sanity check")
+    args = parser.parse_args()
+
+    if not os.path.exists(os.path.join(REPO_DIR, "config.py")):
+        print("config.py not found. Copy config_default.py to config.py (or run setup.py) first.")
+        sys.exit(1)
+
+    os.chdir(REPO_DIR)
+    if REPO_DIR not in sys.path:
+        sys.path.insert(0, REPO_DIR)
+
+    from benchmarks.common import BENCHMARKS, SkipBenchmark
+    for module_name in BENCHMARK_MODULES:
+        try:
+            importlib.import_module(f"benchmarks.{module_name}")
+        except Exception as e:
+            print(f"Could not load benchmarks.{module_name}: {e}")
+
+    results = {}
+    for name, func in BENCHMARKS.items():
+        if args.filter and args.filter not in name:
+            continue
+        print(f"Running {name}...", end=" ", flush=True)
+        try:
+            result = func(quick=args.quick)
+            results[name] = result
+            print(f"{result['median'] * 1000:.3f} ms (median)")
+        except SkipBenchmark as e:
+            results[name] = {"skipped": str(e)}
+            print(f"skipped ({e})")
+        except Exception as e:
+            results[name] = {"error": repr(e)}
+            print(f"failed ({e})")
+            traceback.print_exc()
+
+    report = {
+        "commit": _git_commit(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "quick": args.quick,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    else:
+        print(json.dumps(report, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+import queue
+import threading
+import time
+from collections import deque, namedtuple
+from config_loader import config
+from completion_manager import CompletionManager
+from utils.session_trace import get_session_tracer
+
+Route = namedtuple("Route", ["name", "manager", "model"])
+
+_DONE = object()
+
+
+class LatencyTracker:
+    """Rolling time to first token per route."""
+    MIN_SAMPLES = 5
+
+    def __init__(self, window=100):
+        """
+        Initialize the LatencyTracker.
+
+        Args:
+            window (int): How many of the most recent requests are kept per route.
+        """
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        """Record the time to first token of a request to the named route."""
+        with self._lock:
+            self._samples.setdefault(name, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, name, fraction):
+        """
+        Return a percentile of the recent times to first token of a route.
+
+        Args:
+            name (str): The route.
+            fraction (float): The percentile as a fraction, e.g. 0.95.
+
+        Returns:
+            float: The time in seconds, or None if too few requests have been timed.
+        """
+        with self._lock:
+            samples = sorted(self._samples.get(name, ()))
+        if len(samples) < self.MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(fraction * len(samples)))]
+
+
+class _Attempt:
+    """A streaming request running on its own thread, so several can race and the loser can be dropped."""
+    def __init__(self, route, messages, kwargs, events, tracker):
+        self.route = route
+        self.chunks = queue.Queue()
+        self._cancelled = threading.Event()
+        self._events = events
+        self._tracker = tracker
+        self._start_time = time.monotonic()
+        self._settled = False  # Answered or failed
+        threading.Thread(target=self._run, args=(messages, kwargs), name=f"completion {route.name}",
+                         daemon=True).start()
+
+    def _run(self, messages, kwargs):
+        first_token = True
+        stream = None
+        try:
+            stream = self.route.manager.client.stream_completion(messages, self.route.model, **kwargs)
+            for chunk in stream:
+                if not chunk:
+                    continue
+                if first_token:
+                    first_token = False
+                    self._settled = True
+                    if not self._cancelled.is_set():
+                        self._tracker.record(self.route.name, time.monotonic() - self._start_time)
+                    self._events.put((self, None))
+                if self._cancelled.is_set():
+                    break
+                self.chunks.put(chunk)
+        except Exception as e:
+            self._settled = True
+            self.chunks.put(e)
+            if first_token:
+                self._events.put((self, e))
+            return
+        finally:
+            if stream is not None and hasattr(stream, "close"):
+                stream.close()
+        self.chunks.put(_DONE)
+        if first_token:
+            self._events.put((self, None))  # An empty response, which still counts as an answer
+
+    def cancel(self):
+        """Stop the request once its next chunk arrives. A request still waiting on the API cannot be interrupted."""
+        if not self._cancelled.is_set() and not self._settled:
+            # All that is known is that the first token would have taken at least this long. Recording when it
+            # does arrive instead would let a few stalls push the p95 up until requests are never hedged.
+            self._tracker.record(self.route.name, time.monotonic() - self._start_time)
+        self._cancelled.set()
+
+    def stream(self):
+        """Yield the chunks of this attempt as they arrive."""
+        while True:
+            chunk = self.chunks.get()
+            if chunk is _DONE:
+                return
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+
+
+class CompletionRouter:
+    """
+    Sends completions to a main provider, with hedged backup requests to other configured providers.
+
+    The time to first token of every provider and model is tracked. If the main provider has not started
+    answering by its usual 95th percentile wait, the same request is also sent to the fastest backup, and
+    whichever starts answering first is streamed while the other is cancelled. Only the slowest few percent
+    of requests are sent twice, but a slow or overloaded provider no longer holds the user up. If the main
+    provider fails before answering, the backups are tried straight away.
+
+    Used in place of CompletionManager, which it wraps one of per provider.
+    """
+    def __init__(self, routes, hedge_delay_min=0.5, hedge_delay_max=4.0, verbose=False):
+        """
+        Initialize the CompletionRouter.
+
+        Args:
+            routes (list): Route tuples, the main provider first. The main route's model is replaced by
+                the model each request asks for.
+            hedge_delay_min (float): The soonest a backup request is sent, in seconds.
+            hedge_delay_max (float): The latest a backup request is sent, also used until enough requests
+                to the main provider have been timed.
+            verbose (bool): Whether to print verbose output.
+        """
+        self.routes = list(routes)
+        self.hedge_delay_min = hedge_delay_min
+        self.hedge_delay_max = hedge_delay_max
+        self.verbose = verbose
+        self.latency = LatencyTracker()
+        self.tracer = get_session_tracer(verbose)
+
+    def hedge_delay(self, route):
+        """Return how long to wait for the first token from a route before sending a backup request."""
+        p95 = self.latency.percentile(route.name, 0.95)
+        if p95 is None:
+            return self.hedge_delay_max
+        return min(max(p95, self.hedge_delay_min), self.hedge_delay_max)
+
+    def _backups(self):
+        """The backup routes, those with the lowest median time to first token first."""
+        def median_or_unknown(indexed_route):
+            index, route = indexed_route
+            median = self.latency.percentile(route.name, 0.5)
+            return (median is None, median or 0, index)
+        return [route for _, route in sorted(enumerate(self.routes[1:]), key=median_or_unknown)]
+
+    def stream_completion(self, messages, model, **kwargs):
+        """
+        Stream a completion from whichever route starts answering first.
+
+        Args:
+            messages (list): List of messages.
+            model (str): Model for the main route.
+            **kwargs: Additional keyword arguments, passed to every route.
+
+        Yields:
+            str: Generated text.
+        """
+        primary = self.routes[0]._replace(name=f"{self.routes[0].name}/{model}", model=model)
+        backups = self._backups()
+        events = queue.Queue()
+        attempts = [_Attempt(primary, messages, kwargs, events, self.latency)]
+        running = 1
+        deadline = time.monotonic() + self.hedge_delay(primary)
+        winner = None
+        last_error = None
+
+        try:
+            while winner is None:
+                timeout = None if deadline is None else max(0.0, deadline - time.monotonic())
+                try:
+                    attempt, error = events.get(timeout=timeout)
+                except queue.Empty:
+                    deadline = None  # Hedge once, more requests would add load without making the tail shorter
+                    if backups:
+                        backup = backups.pop(0)
+                        if self.verbose:
+                            print(f"No response from {primary.name} after {self.hedge_delay(primary):.1f}s, "
+                                  f"also asking {backup.name}")
+                        attempts.append(_Attempt(backup, messages, kwargs, events, self.latency))
+                        running += 1
+                    continue
+
+                if error is None:
+                    winner = attempt
+                    break
+                last_error = error
+                running -= 1
+                if self.verbose:
+                    print(f"{attempt.route.name} failed: {error}")
+                if running == 0:
+                    if not backups:
+                        raise last_error
+                    backup = backups.pop(0)
+                    deadline = None
+                    attempts.append(_Attempt(backup, messages, kwargs, events, self.latency))
+                    running += 1
+
+            for attempt in attempts:
+                if attempt is not winner:
+                    attempt.cancel()
+            if self.verbose and winner.route is not primary:
+                print(f"Answered by {winner.route.name}")
+            yield from winner.stream()
+        finally:
+            # Also covers the caller closing the stream early, e.g. when the user cancels
+            for attempt in attempts:
+                attempt.cancel()
+
+    def get_completion(self, messages, model, **kwargs):
+        """Get a completion and return the entire response, or None if an error occurs. See CompletionManager."""
+        try:
+            return "".join(self.stream_completion(messages, model, **kwargs))
+        except Exception as e:
+            if self.verbose:
+                import traceback
+                traceback.print_exc()
+            else:
+                print(f"An error occurred while getting completion: {e}")
+            return None
+
+    def get_completion_stream(self, messages, model, **kwargs):
+        """Get a completion stream from whichever route answers first. See CompletionManager."""
+        stream = self.stream_completion(messages, model, **kwargs)
+        if self.tracer is not None:
+            stream = self.tracer.trace_completion(stream, model, messages, **kwargs)
+        return stream
+
+    def process_text_stream(self, text_stream, tts_callback=None, marker_tuples=None):
+        """Process a stream of text, see CompletionManager.process_text_stream."""
+        return self.routes[0].manager.process_text_stream(text_stream, tts_callback=tts_callback,
+                                                          marker_tuples=marker_tuples)
+
+
+def get_completion_client(verbose=False):
+    """
+    Create the completions client set in the config.
+
+    Returns:
+        CompletionManager or CompletionRouter: A router if COMPLETION_FALLBACKS lists backup providers.
+    """
+    main_manager = CompletionManager(verbose=verbose, completions_api=config.COMPLETIONS_API)
+    if not config.COMPLETION_FALLBACKS:
+        return main_manager
+
+    routes = [Route(config.COMPLETIONS_API, main_manager, config.COMPLETION_MODEL)]
+    for completions_api, model in config.COMPLETION_FALLBACKS:
+        manager = CompletionManager(verbose=verbose, completions_api=completions_api)
+        routes.append(Route(f"{completions_api}/{model}", manager, model))
+    return CompletionRouter(routes, hedge_delay_min=config.HEDGE_DELAY_MIN,
+                            hedge_delay_max=config.HEDGE_DELAY_MAX, verbose=verbose)
@@ -8,6 +8,7 @@ USE_GPU = False  # Set to True to use GPU acceleration. Refer to the README for
 # On Mac/Linux, a hotkey cannot overlap another (e.g. cmd+e and cmd+shift+e)
 CANCEL_HOTKEY = 'alt+ctrl+e'
 NEW_CHAT_HOTKEY = 'alt+ctrl+w'
+RESUME_CHAT_HOTKEY = 'alt+ctrl+l' # Reloads the last saved chat, needs SAVE_CONVERSATIONS
 RECORD_HOTKEY = 'alt+ctrl+r' # Press to start, press again to stop, or hold and release. Double tap to include clipboard
 READ_FROM_CLIPBOARD = "ctrl+alt+c"
 TRANSCRIBE_RECORDING = "ctrl+alt+t"
@@ -70,6 +71,17 @@ COMPLETION_MODEL = "gpt-4o"
 # The available parameters depend on which completions API you are using, so should be looked up in the API documentation online
 COMPLETION_PARAMS = {'temperature': 0.7, 'max_tokens': 4096}
 
+### SLOW OR FAILING COMPLETIONS PROVIDERS ###
+# If the provider above is slow to start answering, the same request is also sent to a backup provider and
+# whichever answers first is used. Each entry is a (COMPLETIONS_API, COMPLETION_MODEL) pair, and its API key must be set too.
+# e.g. COMPLETION_FALLBACKS = [("openrouter", "anthropic/claude-3.5-sonnet"), ("groq", "llama3-70b-8192")]
+COMPLETION_FALLBACKS = []
+HEDGE_DELAY_MIN = 0.5 # Seconds. A backup request is sent once the wait for the first token is longer than usual for the main provider (its 95th percentile), but never sooner than this
+HEDGE_DELAY_MAX = 4.0 # Seconds. ...and never later than this, which is also the wait used until a few responses have been timed
+RETRY_LATENCY_BUDGET = 8.0 # Seconds. Failed completion requests (rate limits, overloading, dropped connections) are retried until the next wait would go past this
+CIRCUIT_BREAKER_THRESHOLD = 3 # After this many failed requests in a row a provider is not tried again until the cooldown has passed, so errors are reported straight away
+CIRCUIT_BREAKER_COOLDOWN = 30.0 # Seconds. Local servers (Ollama, LM Studio, TabbyAPI) use at most 5 seconds, and stop being tried as soon as they refuse a connection
+
 ### TRANSCRIPTION API SETTINGS ###
 
 ## Faster Whisper local transcription ###
@@ -95,6 +107,16 @@ PIPER_VOICE_SPEED = 1.0 # Speed of the TTS, 1.0 is normal speed, 2.0 is double s
 # TTS_ENGINE="openai" 
 # OPENAI_VOICE = "nova"
 
+### SPEECH SETTINGS ###
+TTS_MIN_CHUNK_CHARS = 80 # Short sentences are merged into chunks of at least this many characters before being spoken, fewer chunks means fewer TTS calls
+TTS_MAX_CHUNK_CHARS = 400 # Sentences are never merged into chunks longer than this
+TTS_CODE_BLOCK_SUMMARY = "There's a code block here." # Spoken in place of code blocks, set to "" to skip them silently
+TTS_AUDIO_CACHE = True # Keep synthesised speech so sentences that have been spoken before play straight away
+TTS_AUDIO_CACHE_DIR = "audio_cache" # Where cached speech is kept between runs
+TTS_AUDIO_CACHE_MEMORY_MB = 32 # The most cached speech kept in memory
+TTS_AUDIO_CACHE_DISK_MB = 256 # The most cached speech kept on disk, the least recently played is removed first
+TTS_STOCK_PHRASES = ["I have copied the text to your clipboard.", "I have copied it to your clipboard."] # Synthesised into the audio cache at startup, and always spoken on their own so they match it
+
 ### PROMPTS ###
 # Options:
 # - "default_prompt": Straight to the point assistant.
@@ -107,6 +129,8 @@ ACTIVE_PROMPT = "default_prompt"
 # - "clipboard": Allow the assistant to write to the clipboard when requested
 # - "time": Add the current time to the system prompt
 # - "window_title": Add the current window title to the system prompt
+# - "recall": Add snippets of past chats and transcripts related to your latest message (needs SAVE_CONVERSATIONS)
+# - "memory": Like "recall" but finds past messages by meaning rather than keywords, using a local embedding model (needs SAVE_CONVERSATIONS and requirements/embedding_memory_requirements.txt)
 # Or create your own module in the "system_prompts\modules" folder, then add the name of the file here.
 ACTIVE_PROMPT_MODULES = ["clipboard", "time", "window_title"]
 
@@ -117,6 +141,23 @@ CLIPBOARD_TEXT_END_SEQ = "[CLIPEND]" #the model is instructed to place any text
 TIMESTAMP_MESSAGES = True # If this is true a timestamp will be added to the end of each of your messages
 INPUT_HANDLER = "pynput" # Alternatively you can use "autohotkey" 
 MAX_PROMPT_TOKENS = 4096 # The message list will be cut down to fit within this number of tokens
+COMPACT_HISTORY = True # Summarise the oldest messages in the background once the chat nears MAX_PROMPT_TOKENS, rather than dropping them
+SAVE_CONVERSATIONS = False # Save voice assistant chats so they can be resumed after a restart. Off by default, as chats hold everything you said and any clipboard content you shared
+CONVERSATION_DB_PATH = "conversations.db" # SQLite database the chats are saved in
+RECALL_MAX_SNIPPETS = 5 # The most past snippets the "recall" prompt module adds
+RECALL_TOKEN_BUDGET = 400 # Roughly how many tokens the "recall" prompt module may add to the prompt
+MEMORY_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2" # Folder with model.onnx and tokenizer.json, or a Hugging Face repo to download them from
+MEMORY_INDEX_PATH = "memory/vectors" # Where the "memory" prompt module keeps its vector index
+MEMORY_MAX_SNIPPETS = 3 # The most past messages the "memory" prompt module adds
+MEMORY_MIN_SCORE = 0.35 # How similar (0 to 1) a past message must be to the latest one to be added
+MEMORY_TOKEN_BUDGET = 300 # Roughly how many tokens the "memory" prompt module may add to the prompt
+RESPONSE_CACHE = False # Replay the saved response when the exact same thing is asked again (ignoring case, punctuation and timestamps), instead of waiting on the API. Questions about the time or date are never cached
+RESPONSE_CACHE_PATH = "response_cache.db" # SQLite database the cached responses are saved in
+RESPONSE_CACHE_MAX_ENTRIES = 1000 # The least recently used responses are removed past this many
+RESPONSE_CACHE_TTL_HOURS = 168 # Cached responses older than this are not used
+SESSION_TRACE_DIR = None # Set to a folder (e.g. "traces") to record every session's timings, audio and responses there, for replaying with benchmarks/replay_session.py. Traces include what you said, so keep them private
+
+ACTION_WORKERS = 2 # Threads actions run on. A cancelled action is not waited for, it finishes on its own thread while the next one starts
 
 DOUBLE_TAP_THRESHOLD = 0.4 # The time window in which a second press must occur to be considered a double tap
 SUPPRESS_NATIVE_HOTKEYS = True # Suppress the native system functionality of the defined hotkeys above (Windows only)
@@ -129,4 +170,9 @@ START_SOUND_VOLUME = 0.05
 END_SOUND_VOLUME = 0.05
 CANCEL_SOUND_VOLUME = 0.09
 MAX_RECORDING_DURATION= 600 # If you record for more than 10 minutes, the recording will stop automatically
+RECORDING_BLOCK_SIZE = 512 # Number of samples the microphone delivers per callback, raise this if recordings drop audio under heavy CPU load
+RECORDING_DEVICE = None # Name, or part of the name, of the microphone to record from. None uses the system default
+RECORDING_LATENCY = "low" # Suggested microphone latency: "low", "high", or a number of seconds
+AUDIO_BACKEND = "sounddevice" # "sounddevice" uses your sound card, "simulated" runs without sound hardware (e.g. on a server), speech is captured instead of played
+SIMULATED_MICROPHONE_FILES = [] # Audio files the simulated microphone plays one after another, when AUDIO_BACKEND is "simulated"
 
@@ -1,4 +1,5 @@
 import os
+import sys
 import importlib.util
 import re
 
@@ -54,6 +55,9 @@ class ConfigLoader:
             if not key.startswith('__') and key not in default_config.__dict__:
                 setattr(self, key, value)
 
+        # Modules that `import config` directly get the already executed user config instead of running it again
+        sys.modules.setdefault('config', user_config)
+
     def _import_config(self, config_path):
         spec = importlib.util.spec_from_file_location("config", config_path)
         config = importlib.util.module_from_spec(spec)
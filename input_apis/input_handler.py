@@ -1,6 +1,7 @@
 import time
 import threading
 from config_loader import config
+from utils.session_trace import get_session_tracer
 from typing import Callable, Optional, Dict
 
 class HotkeyState:
@@ -25,6 +26,7 @@ class InputHandler:
         self.hold_threshold = 0.5      # seconds
         self.double_tap_threshold = 0.3  # seconds
         self.running = False
+        self.tracer = get_session_tracer(verbose)
 
     def add_hotkey(
         self,
@@ -92,6 +94,8 @@ class InputHandler:
         :param hotkey: The hotkey that triggered the event
         :param is_pressed: True if the key was pressed, False if released
         """
+        if self.tracer is not None:
+            self.tracer.key_event(hotkey, is_pressed)
         state = self.hotkey_states[hotkey]
         current_time = time.time()
 
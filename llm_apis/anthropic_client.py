@@ -6,9 +6,6 @@ import anthropic.types
 import os
 import base64
 import httpx
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
-
-MAX_RETRIES = 5
 
 class AnthropicRateLimitError(Exception):
     """Exception raised for rate limit errors."""
@@ -29,19 +26,14 @@ class AnthropicClient(BaseClient):
         super().__init__(verbose)
         self.client = Anthropic(api_key=os.getenv('ANTHROPIC_API_KEY'))
 
-    @retry(
-        stop=stop_after_attempt(MAX_RETRIES),
-        wait=wait_exponential(multiplier=1, min=4, max=10),
-        retry=(retry_if_exception_type(AnthropicRateLimitError) |
-               retry_if_exception_type(AnthropicOverloadError))
-    )
     def _make_api_call(self, api_args):
-        """Make an API call with retry mechanism."""
+        """Make an API call, raising rate limit and overload errors the retry layer can recognise."""
         try:
             return self.client.messages.create(**api_args)
         except httpx.HTTPStatusError as e:
             if e.response.status_code == 429:
-                retry_after = int(e.response.headers.get('retry-after', 60))
+                retry_after = e.response.headers.get('retry-after')
+                retry_after = int(retry_after) if retry_after else None
                 raise AnthropicRateLimitError(
                     f"Rate limit exceeded. {str(e)}", retry_after)
             elif e.response.status_code == 529:
@@ -56,7 +48,7 @@ class AnthropicClient(BaseClient):
             raise
 
     def stream_completion(self, messages, model, **kwargs):
-        """Stream completion from the Anthropic API with retry logic.
+        """Stream completion from the Anthropic API.
 
         Args:
             messages (list): List of messages.
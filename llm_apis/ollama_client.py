@@ -39,7 +39,7 @@ class OllamaClient(BaseClient):
             "model": model,
             "messages": messages,
             "stream": True,
-            "keep_alive": self.__fix_keep_alive(config.OLLAMA_KEEP_ALIVE),
+            "keep_alive": self.__fix_keep_alive(getattr(config, "OLLAMA_KEEP_ALIVE", "-1")),
             **kwargs
 
         }
@@ -48,15 +48,17 @@ class OllamaClient(BaseClient):
         try:
             with requests.post(url, data=json_data, stream=True, headers=headers) as response:
                 if response.status_code == 200:
-                    for chunk in response.iter_content(chunk_size=None):
-                        if chunk:
+                    # One JSON object per line, a read can hold part of a line or several of them
+                    for line in response.iter_lines():
+                        if line:
                             # Parse the JSON response and extract the content
-                            response_data = json.loads(chunk)
+                            response_data = json.loads(line)
                             yield response_data['message']['content']
                 else:
                     if self.verbose:
                         print(f"Request failed with status code {response.status_code}")
-                    raise RuntimeError(f"Request failed with status code {response.status_code}")
+                    # Carries the response, so the retry layer sees the status code and any retry-after header
+                    raise requests.HTTPError(f"Request failed with status code {response.status_code}", response=response)
         except Exception as e:
             if self.verbose:
                 import traceback
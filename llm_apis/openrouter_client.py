@@ -5,7 +5,6 @@ from openai import OpenAI, APIError
 import os
 import base64
 import httpx
-from tenacity import retry, stop_after_attempt, wait_exponential, retry_if_exception_type
 
 class OpenRouterRateLimitError(Exception):
     """Exception raised for rate limit errors."""
@@ -15,7 +14,7 @@ class OpenRouterRateLimitError(Exception):
 
         Args:
             message (str): The error message to display.
-            retry_after (int): The number of seconds to wait before retrying.
+            retry_after (int): The number of seconds to wait before retrying, or None if not given.
         """
         self.message = message
         self.retry_after = retry_after
@@ -42,13 +41,8 @@ class OpenRouterClient(BaseClient):
             }
         )
 
-    @retry(
-        stop=stop_after_attempt(3),
-        wait=wait_exponential(multiplier=1, min=4, max=10),
-        retry=retry_if_exception_type(OpenRouterRateLimitError)
-    )
     def _make_api_call(self, model, processed_messages, **kwargs):
-        """Make an API call with retry mechanism."""
+        """Make an API call, raising rate limit errors the retry layer can recognise."""
         try:
             return self.client.chat.completions.create(
                 model=model,
@@ -62,7 +56,7 @@ class OpenRouterClient(BaseClient):
             error_message = error_dict.get('error', {}).get('message', str(e))
             
             if error_type == 'model_rate_limit':
-                retry_after = error_dict.get('error', {}).get('retry_after', 60)
+                retry_after = error_dict.get('error', {}).get('retry_after')
                 raise OpenRouterRateLimitError(
                     f"Rate limit exceeded for model {model}. {error_message}", retry_after
                 )
@@ -0,0 +1,287 @@
+import random
+import re
+import threading
+import time
+from llm_apis.base_client import BaseClient
+
+# Servers running on this machine. When one refuses a connection it is not running, so there is no
+# point retrying until the user starts it.
+LOCAL_PROVIDERS = {"ollama", "lm_studio", "tabbyapi"}
+
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+_CONNECTION_ERROR_NAMES = {"ConnectError", "ConnectionError", "APIConnectionError", "ConnectTimeout",
+                           "RemoteProtocolError", "ServiceUnavailable"}
+_TIMEOUT_ERROR_NAMES = {"Timeout", "ReadTimeout", "APITimeoutError", "TimeoutException", "ReadTimeoutError"}
+_STATUS_IN_MESSAGE = re.compile(r"\b(?:status(?: code)?|Error code:?)\s*:?\s*(\d{3})\b", re.IGNORECASE)
+
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of making a request to a provider that has recently been failing."""
+    pass
+
+
+class Failure:
+    """What kind of failure an exception from a client is, see classify_error."""
+    def __init__(self, kind, status_code=None, retry_after=None):
+        """
+        Args:
+            kind (str): "connection", "timeout", "status" or "other".
+            status_code (int, optional): The HTTP status code, for "status" failures.
+            retry_after (float, optional): Seconds the provider asked us to wait before retrying.
+        """
+        self.kind = kind
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self):
+        """Whether the same request could succeed if it is sent again."""
+        if self.kind in ("connection", "timeout"):
+            return True
+        return self.kind == "status" and self.status_code in RETRYABLE_STATUS_CODES
+
+
+def _retry_after_header(response):
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+def classify_error(error):
+    """
+    Work out what kind of failure an exception from a client is.
+
+    The clients wrap provider SDK errors in RuntimeErrors, so the whole chain of causes is checked for
+    status codes, retry-after headers and connection errors, without importing any SDK.
+
+    Args:
+        error (Exception): The exception raised by a client.
+
+    Returns:
+        Failure: The kind of failure.
+    """
+    retry_after = None
+    status_code = None
+    chain = []
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        chain.append(error)
+        error = error.__cause__ or error.__context__
+
+    for error in chain:
+        if retry_after is None and getattr(error, "retry_after", None) is not None:
+            retry_after = float(error.retry_after)
+        response = getattr(error, "response", None)
+        if retry_after is None and response is not None:
+            retry_after = _retry_after_header(response)
+        if status_code is None:
+            status_code = getattr(error, "status_code", None) or getattr(response, "status_code", None)
+
+        names = {cls.__name__ for cls in type(error).__mro__}
+        if isinstance(error, TimeoutError) or names & _TIMEOUT_ERROR_NAMES:
+            return Failure("timeout", retry_after=retry_after)
+        if isinstance(error, ConnectionError) or names & _CONNECTION_ERROR_NAMES:
+            return Failure("connection", retry_after=retry_after)
+
+    if status_code is None:
+        for error in chain:
+            match = _STATUS_IN_MESSAGE.search(str(error))
+            if match:
+                status_code = int(match.group(1))
+                break
+    # The Anthropic and OpenRouter clients raise their own errors for rate limits and overloading
+    if status_code is None and any("RateLimit" in type(error).__name__ for error in chain):
+        status_code = 429
+    if status_code is None and any("Overload" in type(error).__name__ for error in chain):
+        status_code = 529
+    if isinstance(status_code, int):
+        return Failure("status", status_code=status_code, retry_after=retry_after)
+    return Failure("other", retry_after=retry_after)
+
+
+class CircuitBreaker:
+    """
+    Stops requests to a provider that keeps failing, so the user gets an error straight away rather
+    than after a round of retries, and lets one request through after a cooldown to see if it is back.
+    """
+    def __init__(self, name, failure_threshold=3, cooldown=30.0):
+        """
+        Initialize the CircuitBreaker.
+
+        Args:
+            name (str): The provider, used in error messages.
+            failure_threshold (int): How many failed requests in a row open the circuit.
+            cooldown (float): Seconds the circuit stays open before a trial request is let through.
+        """
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self.last_error = None
+
+    @property
+    def is_open(self):
+        with self._lock:
+            return self._opened_at is not None and time.monotonic() - self._opened_at < self.cooldown
+
+    def before_request(self):
+        """
+        Check a request may be made.
+
+        Raises:
+            CircuitOpenError: If the provider is failing and its cooldown has not passed, or a trial
+                request is already checking whether it is back.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return
+            remaining = self.cooldown - (time.monotonic() - self._opened_at)
+            if remaining > 0:
+                raise CircuitOpenError(f"{self.name} is unavailable ({self.last_error}), "
+                                       f"not trying again for {remaining:.0f}s")
+            if self._trial_running:
+                raise CircuitOpenError(f"{self.name} is unavailable ({self.last_error}), checking if it is back")
+            self._trial_running = True
+
+    def end_trial(self):
+        """Let another trial request through if this one finished without a result."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def record_failure(self, error, open_now=False):
+        """
+        Record a failed request.
+
+        Args:
+            error (Exception): The error, shown while the circuit is open.
+            open_now (bool): Open the circuit straight away, e.g. when a local server is not running.
+        """
+        with self._lock:
+            self._failures += 1
+            self.last_error = error
+            if open_now or self._trial_running or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+def get_circuit_breaker(name, failure_threshold=3, cooldown=30.0):
+    """Return the process wide CircuitBreaker for a provider, creating it if needed."""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name, failure_threshold, cooldown)
+        return _breakers[name]
+
+
+class ResilientClient(BaseClient):
+    """
+    Wraps a completions client with a circuit breaker and retries.
+
+    Transient failures (connection errors, timeouts, rate limits, overloading and 5xx responses) are
+    retried with jittered exponential backoff, waiting at least as long as any retry-after the provider
+    sends. Retries stop once the next wait would take the total past the latency budget, since past a
+    few seconds the user would rather hear about the error. Only failures before the first chunk are
+    retried, after that the text has already been spoken.
+    """
+    def __init__(self, client, name, latency_budget=8.0, base_delay=0.5, max_delay=4.0,
+                 failure_threshold=3, cooldown=30.0, local=None, verbose=False):
+        """
+        Initialize the ResilientClient.
+
+        Args:
+            client (BaseClient): The client to wrap.
+            name (str): The provider, e.g. "openai". Clients for the same provider share a circuit breaker.
+            latency_budget (float): The most seconds a request may spend waiting to retry.
+            base_delay (float): The backoff before the first retry, doubled for every retry after it.
+            max_delay (float): The longest backoff between retries, unless the provider asks for longer.
+            failure_threshold (int): Failed requests in a row that open the circuit.
+            cooldown (float): Seconds the circuit stays open. Local servers use a shorter one, so starting
+                the server is picked up quickly.
+            local (bool, optional): Whether the provider is a server on this machine, judged from the name by default.
+            verbose (bool): Whether to print verbose output.
+        """
+        super().__init__(verbose)
+        self.client = client
+        self.name = name
+        self.latency_budget = latency_budget
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.is_local = name in LOCAL_PROVIDERS if local is None else local
+        self.breaker = get_circuit_breaker(name, failure_threshold, min(cooldown, 5.0) if self.is_local else cooldown)
+
+    def next_delay(self, attempt, failure, elapsed):
+        """
+        Return how long to wait before retrying, or None to give up.
+
+        Args:
+            attempt (int): How many retries have been made already.
+            failure (Failure): Why the last attempt failed.
+            elapsed (float): Seconds since the request was first made.
+        """
+        if not failure.retryable:
+            return None
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))  # Full jitter
+        if failure.retry_after is not None:
+            delay = max(delay, failure.retry_after)
+        if elapsed + delay > self.latency_budget:
+            return None
+        return delay
+
+    def stream_completion(self, messages, model, **kwargs):
+        """
+        Stream a completion from the wrapped client, retrying transient failures before the first chunk.
+
+        Raises:
+            CircuitOpenError: If the provider has been failing and is not being tried.
+        """
+        self.breaker.before_request()
+        start_time = time.monotonic()
+        attempt = 0
+        try:
+            while True:
+                started = False
+                try:
+                    for chunk in self.client.stream_completion(messages, model, **kwargs):
+                        if not started:
+                            started = True
+                            self.breaker.record_success()
+                        yield chunk
+                    if not started:
+                        self.breaker.record_success()
+                    return
+                except Exception as e:
+                    failure = classify_error(e)
+                    # A local server refusing the connection is not running, it will not be back in a second
+                    local_down = self.is_local and failure.kind == "connection"
+                    delay = None
+                    if not started and not local_down:
+                        delay = self.next_delay(attempt, failure, time.monotonic() - start_time)
+                    if delay is None:
+                        # The breaker counts requests that failed, not each attempt at them
+                        if failure.retryable:
+                            self.breaker.record_failure(e, open_now=local_down)
+                        elif not started:
+                            self.breaker.record_success()  # The provider answered, the request itself was bad
+                        raise
+                    if self.verbose:
+                        print(f"{self.name} request failed ({e}), retrying in {delay:.1f}s")
+                    time.sleep(delay)
+                    attempt += 1
+        finally:
+            # In case the caller stopped reading before anything was recorded, e.g. a hedged request that lost
+            self.breaker.end_trial()
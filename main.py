@@ -1,36 +1,52 @@
-import time
+import sys
+
+# Start profiling before anything heavy is imported so the import breakdown is complete
+startup_profiler = None
+if __name__ == "__main__" and "--profile-startup" in sys.argv:
+    from utils.startup_profiler import StartupProfiler
+    startup_profiler = StartupProfiler()
+    startup_profiler.start()
+
 import threading
 from audio_recorder import AudioRecorder
 from transcription_manager import TranscriptionManager
 from input_apis.input_handler import get_input_handler
 import tts_manager
 from completion_manager import CompletionManager
-from utils.soundfx import play_sound_FX
+from utils.soundfx import play_sound_FX, preload_sound_FX
 from utils.utils import read_clipboard, does_model_support_images
 from config_loader import config
 import os
 import importlib
 from actions.base_action import BaseAction
+from utils.action_scheduler import ActionScheduler, REPLACE
+from utils.background_loader import BackgroundLoader
 
 class AlwaysReddy:
     def __init__(self):
         """Initialize the AlwaysReddy instance with default settings and objects."""
         self.verbose = config.VERBOSE
+        preload_sound_FX(verbose=self.verbose)
         self.recorder = AudioRecorder(verbose=self.verbose)
         self.clipboard_text = None
         self.last_clipboard_text = None
         self.clipboard_image = None 
         self.tts = tts_manager.TTSManager(parent_client=self, verbose=self.verbose)
+        self.tts.prewarm_in_background()
         self.recording_timeout_timer = None
         self.transcription_manager = TranscriptionManager(verbose=self.verbose)
         self.completion_client = CompletionManager(verbose=self.verbose)
-        self.action_thread = None
-        self.stop_action = False
+        self.actions = ActionScheduler(workers=config.ACTION_WORKERS, verbose=self.verbose)
         self.input_handler = get_input_handler(verbose=self.verbose)
         self.input_handler.double_tap_threshold = config.DOUBLE_TAP_THRESHOLD
-        self.last_action_time = 0
         self.current_recording_action = None
 
+    @property
+    def stop_action(self):
+        """Whether the action running on the calling thread has been cancelled, False outside an action."""
+        token = self.actions.current_token()
+        return token is not None and token.cancelled
+
     def _start_recording(self, action=None):
         """
         Start the audio recording process and set a timeout for automatic stopping.
@@ -40,6 +56,10 @@ class AlwaysReddy:
         """
         if self.verbose:
             print(f"Starting recording... Action: {action.__name__ if action else 'None'}")
+
+        # Barge-in: stop the assistant talking over the user, the speech fades out within one audio block
+        if self.tts.running_tts:
+            self.tts.stop()
             
         play_sound_FX("start", volume=config.START_SOUND_VOLUME, verbose=self.verbose)
         self.recorder.start_recording()
@@ -94,8 +114,7 @@ class AlwaysReddy:
         cancelled_something = False
         self._cancel_recording_timeout_timer()
         
-        if self.action_thread is not None and self.action_thread.is_alive():
-            self.stop_action = True
+        if self.actions.cancel_all():
             cancelled_something = True
 
         if self.recorder.recording:
@@ -109,7 +128,8 @@ class AlwaysReddy:
         if cancelled_something and not silent:
             play_sound_FX("cancel", volume=config.CANCEL_SOUND_VOLUME, verbose=self.verbose)
 
-    def add_action_hotkey(self, hotkey, *, pressed=None, released=None, held=None, held_release=None, double_tap=None, run_in_action_thread=True):
+    def add_action_hotkey(self, hotkey, *, pressed=None, released=None, held=None, held_release=None, double_tap=None, run_in_action_thread=True,
+                          priority=0, policy=REPLACE):
         """
         Add a hotkey for an action with specified callbacks for different events.
         
@@ -121,12 +141,14 @@ class AlwaysReddy:
             held_release (callable, optional): Callback for when the hotkey is released after being held.
             double_tap (callable, optional): Callback for when the hotkey is double-tapped.
             run_in_action_thread (bool): If True, the action will run in the main thread. Default is True.
+            priority (int): Queued actions with a higher priority run first.
+            policy (str): What to do if another action is running, "replace" (cancel it), "queue" or "drop".
         """
         def wrap_for_action_thread(method):
             if method is None:
                 return None
             def run_in_action_thread():
-                self.execute_action_in_thread(method)
+                self.execute_action_in_thread(method, priority=priority, policy=policy)
             return run_in_action_thread
 
         wrapped_kwargs = {}
@@ -148,48 +170,45 @@ class AlwaysReddy:
             str or None: The recording filename if stopped, None if started.
         """
         if self.recorder.recording:
-            self.stop_action = False
             filename = self._stop_recording()
             return filename
         else:
+            self._start_recording(action)
+            # Read the clipboard after the recording has started so any image is encoded while the user talks
             if config.ALWAYS_INCLUDE_CLIPBOARD:
                 self.save_clipboard_text()
-            self._start_recording(action)
             return None
 
-    def execute_action_in_thread(self, action_to_run, *args, **kwargs):
+    def execute_action_in_thread(self, action_to_run, *args, priority=0, policy=REPLACE, **kwargs):
         """
-        Execute an action in a separate thread.
+        Run an action on the action scheduler's worker threads, returning straight away.
+
+        Replacing a running action cancels it, and any TTS, without waiting for it to return. Actions
+        that take a `cancel_token` argument are passed a CancellationToken to check, others can check
+        `stop_action`.
         
         Args:
             action_to_run (callable): The action to be executed.
             *args: Positional arguments for the action.
+            priority (int): Queued actions with a higher priority run first.
+            policy (str): What to do if another action is running, "replace" (cancel it), "queue" or "drop".
             **kwargs: Keyword arguments for the action.
-        """
-        current_time = time.time()
-        if current_time - self.last_action_time < 0.1: # Delay between actions
-            print("Action triggered too quickly. Please wait.")
-            return
 
-        self.last_action_time = current_time
-
-        if self.action_thread is not None and self.action_thread.is_alive():
+        Returns:
+            ScheduledAction: The scheduled action, or None if it was dropped.
+        """
+        if policy == REPLACE and self.actions.busy:
             self.cancel_all(silent=True)
-            self.action_thread.join(timeout=2)  # Wait for up to 2 seconds
-            if self.action_thread.is_alive():
-                print("Warning: Previous action did not end properly.")
 
         if self.verbose:
             print(f"Running {action_to_run.__name__}...")
-        self.stop_action = False
-        self.action_thread = threading.Thread(target=action_to_run, args=args, kwargs=kwargs)
-        self.action_thread.start()
+        return self.actions.submit(action_to_run, *args, priority=priority, policy=policy, **kwargs)
 
     def save_clipboard_text(self):
         """Save the current clipboard text or image."""
         try:
             print("Saving clipboard content...")
-            clipboard_content = read_clipboard(does_model_support_images(config.COMPLETION_MODEL))
+            clipboard_content = read_clipboard(does_model_support_images(config.COMPLETION_MODEL, config.COMPLETIONS_API))
             
             if clipboard_content is None:
                 print("No content found in clipboard.")
@@ -234,6 +253,8 @@ class AlwaysReddy:
         """Run the AlwaysReddy instance, setting up hotkeys and entering the main loop."""
         print("\n\nSetting up AlwaysReddy...\n")
         self.discover_and_initialize_actions()
+        if startup_profiler:
+            startup_profiler.mark("Discover and initialize actions")
 
         if self.verbose and any([config.CANCEL_HOTKEY]): # if not hotkey below is set, skip the "system actions" print
             print("\nSystem actions:")
@@ -243,17 +264,37 @@ class AlwaysReddy:
             self.add_action_hotkey(config.CANCEL_HOTKEY, pressed=self.cancel_all, run_in_action_thread=False)
             print(f"'{config.CANCEL_HOTKEY}': Cancel currently running action, recording, TTS, or other")
 
+        # Anything kept on disk includes what was said, so say so rather than leave it to be found later
+        if config.SAVE_CONVERSATIONS:
+            print(f"\nChats are being saved to {config.CONVERSATION_DB_PATH} (SAVE_CONVERSATIONS in config.py).")
+        if config.RESPONSE_CACHE:
+            print(f"Responses are being cached in {config.RESPONSE_CACHE_PATH} (RESPONSE_CACHE in config.py).")
+        if config.SESSION_TRACE_DIR:
+            print(f"Sessions are being traced to {config.SESSION_TRACE_DIR} (SESSION_TRACE_DIR in config.py).")
+
         print("\nAlwaysReddy is reddy. Use any of the hotkeys above to get started.")
+        if startup_profiler:
+            startup_profiler.mark("Register system hotkeys")
+            startup_profiler.stop()
+            startup_profiler.report(background_loaders=BackgroundLoader.all_loaders())
         try:
             self.input_handler.start(blocking=True)
         except KeyboardInterrupt:
             print("\nShutting down AlwaysReddy...")
         finally:
             self.cancel_all(silent=True)
+            self.actions.shutdown()
+            if self.verbose:
+                print(f"Action metrics: {self.actions.metrics()}")
 
 if __name__ == "__main__":
     try:
-        AlwaysReddy().run()
+        if startup_profiler:
+            startup_profiler.mark("Imports")
+        always_reddy = AlwaysReddy()
+        if startup_profiler:
+            startup_profiler.mark("AlwaysReddy()")
+        always_reddy.run()
     except Exception as e:
         if config.VERBOSE:
             import traceback
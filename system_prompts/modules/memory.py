@@ -0,0 +1,40 @@
+import time
+import config
+from utils.embedding_memory import get_embedding_memory
+
+def _message_text(message):
+    content = message.get("content", "")
+    if isinstance(content, str):
+        return content
+    return "\n".join(item.get("text", "") for item in content if isinstance(item, dict))
+
+def get_prompt(messages=None):
+    """Add past messages and transcripts that are close in meaning to the user's latest message."""
+    memory = get_embedding_memory()
+    user_messages = [message for message in (messages or []) if message.get("role") == "user"]
+    if memory is None or not user_messages:
+        return ""
+
+    # Only the spoken part, not the timestamp or clipboard text appended after it
+    query = _message_text(user_messages[-1]).split("\n\n")[0]
+    in_context = {_message_text(message) for message in messages}
+    budget = config.MEMORY_TOKEN_BUDGET
+    lines = []
+    for result in memory.search(query, k=config.MEMORY_MAX_SNIPPETS * 2, min_score=config.MEMORY_MIN_SCORE):
+        if result.snippet in in_context:
+            continue  # Already part of this conversation
+        text = " ".join(result.snippet.split("\n\n")[0].split())
+        if len(text) > 400:
+            text = text[:400] + "..."
+        line = f"- [{time.strftime('%Y-%m-%d', time.localtime(result.created_at))}] {result.role}: {text}"
+        cost = len(line) // 4 + 1  # Rough token estimate, running the tokenizer here would cost more than it saves
+        if cost > budget:
+            break
+        budget -= cost
+        lines.append(line)
+        if len(lines) == config.MEMORY_MAX_SNIPPETS:
+            break
+
+    if not lines:
+        return ""
+    return "Things from past conversations that may be relevant, only use them if they help:\n" + "\n".join(lines)
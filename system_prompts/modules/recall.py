@@ -0,0 +1,55 @@
+import re
+import time
+import config
+from utils.conversation_store import get_conversation_store
+
+# Phrases that narrow the search to recent history, and how many days back they reach
+TIME_PHRASES = [
+    (re.compile(r"\btoday\b"), 1),
+    (re.compile(r"\byesterday\b"), 2),
+    (re.compile(r"\b(?:last|this|past) week\b"), 8),
+    (re.compile(r"\b(?:last|this|past) month\b"), 32),
+    (re.compile(r"\b(?:last|this|past) year\b"), 366),
+]
+
+def _message_text(message):
+    content = message.get("content", "")
+    if isinstance(content, str):
+        return content
+    return "\n".join(item.get("text", "") for item in content if isinstance(item, dict))
+
+def get_prompt(messages=None):
+    """Add snippets of past conversations and transcripts that match the user's latest message."""
+    store = get_conversation_store()
+    user_messages = [message for message in (messages or []) if message.get("role") == "user"]
+    if store is None or not user_messages:
+        return ""
+
+    # Only the spoken part, not the timestamp or clipboard text appended after it
+    query = _message_text(user_messages[-1]).split("\n\n")[0].lower()
+    since = None
+    for pattern, days in TIME_PHRASES:
+        if pattern.search(query):
+            since = time.time() - days * 86400
+            # The phrase sets the time range, it is not something to match on
+            query = pattern.sub(" ", query)
+            break
+
+    in_context = "\n".join(_message_text(message) for message in messages)
+    budget = config.RECALL_TOKEN_BUDGET
+    lines = []
+    for result in store.search(query, limit=config.RECALL_MAX_SNIPPETS * 2, since=since):
+        if result.snippet.strip(". ") in in_context:
+            continue  # Already part of this conversation
+        line = f"- [{time.strftime('%Y-%m-%d', time.localtime(result.created_at))}] {result.role}: {' '.join(result.snippet.split())}"
+        cost = len(line) // 4 + 1  # Rough token estimate, running the tokenizer here would cost more than it saves
+        if cost > budget:
+            break
+        budget -= cost
+        lines.append(line)
+        if len(lines) == config.RECALL_MAX_SNIPPETS:
+            break
+
+    if not lines:
+        return ""
+    return "Excerpts from past conversations that may be relevant, only use them if they help:\n" + "\n".join(lines)
@@ -0,0 +1,9 @@
+import os
+import sys
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_DIR)
+
+if not os.path.exists(os.path.join(REPO_DIR, "config.py")):
+    pytest.exit("config.py not found. Copy config_default.py to config.py (or run setup.py) first.")
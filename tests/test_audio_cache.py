@@ -0,0 +1,31 @@
+import os
+import threading
+from utils.audio_cache import AudioCache
+
+
+def test_stray_temporary_files_are_removed(tmp_path):
+    (tmp_path / "abc.wav.tmp").write_bytes(b"partial")
+    (tmp_path / "tmpx1y2z3.tmp").write_bytes(b"partial")
+    AudioCache(str(tmp_path))
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_concurrent_writes_of_the_same_key(tmp_path):
+    # Separate caches on one folder, like two processes, so every put writes the file
+    caches = [AudioCache(str(tmp_path)) for _ in range(8)]
+    key = AudioCache.key("engine", {"voice": "a"}, "Hello there.")
+    data = b"RIFF" + bytes(256 * 1024)
+    barrier = threading.Barrier(len(caches))
+
+    def put(cache):
+        barrier.wait()
+        cache.put(key, data)
+    threads = [threading.Thread(target=put, args=(cache,)) for cache in caches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert os.listdir(tmp_path) == [f"{key}.wav"]
+    reopened = AudioCache(str(tmp_path))
+    assert reopened.get(key) == data
@@ -0,0 +1,38 @@
+import numpy as np
+from audio_recorder import AudioRecorder
+from utils.audio_backend import SimulatedAudioBackend
+from utils.audio_mixer import AudioMixer
+
+def _tone(seconds, samplerate=48000):
+    return np.sin(np.arange(int(seconds * samplerate)) * 2 * np.pi * 440 / samplerate).astype(np.float32) * 0.1
+
+def test_refresh_closes_every_stream_before_reinitialising():
+    backend = SimulatedAudioBackend()
+    mixer = AudioMixer(backend=backend, idle_timeout=30)
+    recorder = AudioRecorder(backend=backend)
+    mixer.play(mixer.prepare(_tone(0.05), 48000)).wait(2)  # The mixer keeps its stream open afterwards
+    recorder.start_recording()
+    assert mixer._stream.active and recorder.stream.active
+
+    open_during_rescan = []
+    backend._rescan = lambda: open_during_rescan.append((mixer._stream, recorder.stream))
+    try:
+        recorder.device_manager.refresh()
+        assert open_during_rescan == [(None, None)]
+        # The recording carries on, and the mixer opens a fresh stream for the next sound
+        assert recorder.recording and recorder.stream.active
+        assert mixer.play(mixer.prepare(_tone(0.05), 48000)).wait(2)
+        assert mixer._stream.active
+    finally:
+        recorder.stop_recording(cancel=True)
+        mixer.stop_all()
+        mixer.close_streams()
+
+def test_refresh_does_not_reopen_a_stopped_recording():
+    backend = SimulatedAudioBackend()
+    recorder = AudioRecorder(backend=backend)
+    recorder.start_recording()
+    recorder.stop_recording(cancel=True)
+    recorder.device_manager.refresh()
+    assert recorder.stream is None
+    assert backend.reinitialisations == 1
@@ -0,0 +1,91 @@
+import os
+import time
+import numpy as np
+import pytest
+
+pytest.importorskip("onnxruntime")
+pytest.importorskip("tokenizers")
+
+from utils.conversation_store import ConversationStore
+from utils.embedding_memory import EmbeddingMemory, EmbeddingModel
+
+# Set to a folder holding the all-MiniLM-L6-v2 ONNX export, or a Hugging Face repo id if the hub is reachable
+MINILM = os.environ.get("TEST_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2")
+
+SAVED = [
+    "I planted tomatoes and basil in the garden last spring",
+    "The quarterly budget meeting has been moved to Friday afternoon",
+    "My laptop battery drains really fast when I watch videos",
+    "We booked a cheap flight to Lisbon for the summer holiday",
+]
+
+
+def _word_model(directory, words, dim=32):
+    """
+    Write a tiny ONNX model with the same inputs and outputs as a sentence transformer export: every word is
+    a fixed random vector, so texts sharing words come out similar. Runs the real onnxruntime and tokenizers
+    code without the 90 MB download.
+    """
+    onnx = pytest.importorskip("onnx")
+    from onnx import TensorProto, helper, numpy_helper
+    from tokenizers import Tokenizer, models, normalizers, pre_tokenizers
+
+    vocab = {"[PAD]": 0, "[UNK]": 1, **{word: i + 2 for i, word in enumerate(sorted(set(words)))}}
+    tokenizer = Tokenizer(models.WordLevel(vocab, unk_token="[UNK]"))
+    tokenizer.normalizer = normalizers.Lowercase()
+    tokenizer.pre_tokenizer = pre_tokenizers.Whitespace()
+    tokenizer.save(os.path.join(directory, "tokenizer.json"))
+
+    table = np.random.default_rng(0).standard_normal((len(vocab), dim)).astype(np.float32)
+    inputs = [helper.make_tensor_value_info(name, TensorProto.INT64, ["batch", "sequence"])
+              for name in ("input_ids", "attention_mask", "token_type_ids")]
+    output = helper.make_tensor_value_info("last_hidden_state", TensorProto.FLOAT, ["batch", "sequence", dim])
+    graph = helper.make_graph([helper.make_node("Gather", ["table", "input_ids"], ["last_hidden_state"])],
+                              "words", inputs, [output], [numpy_helper.from_array(table, "table")])
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    onnx.save(model, os.path.join(directory, "model.onnx"))
+    return str(directory)
+
+
+@pytest.fixture
+def word_model(tmp_path):
+    words = " ".join(SAVED + ["what did I grow in my garden", "dimension probe"]).lower().split()
+    return _word_model(tmp_path, words)
+
+
+def test_padding_does_not_change_embeddings(word_model):
+    model = EmbeddingModel(word_model)
+    alone = model.embed([SAVED[0]])
+    batched = model.embed([SAVED[0], SAVED[1] + " " + SAVED[2]])
+    assert batched.shape == (2, model.dim)
+    np.testing.assert_allclose(np.linalg.norm(batched, axis=1), 1.0, rtol=1e-5)
+    np.testing.assert_allclose(batched[0], alone[0], atol=1e-6)
+
+
+def test_saved_messages_are_recalled(word_model, tmp_path):
+    store = ConversationStore(str(tmp_path / "conversations.db"))
+    memory = EmbeddingMemory(store, word_model, str(tmp_path / "memory" / "vectors"))
+    conversation_id = store.new_conversation_id()
+    for text in SAVED:
+        store.append_message(conversation_id, {"role": "user", "content": text})
+    store.flush()
+
+    deadline = time.monotonic() + 10
+    while (not memory.ready or len(memory.index) < len(SAVED)) and time.monotonic() < deadline:
+        time.sleep(0.01)
+    results = memory.search("What did I grow in my garden?", k=2)
+    assert results and results[0].snippet == SAVED[0]
+    store.close()
+
+
+def test_minilm_ranks_the_paraphrase_first():
+    try:
+        model = EmbeddingModel(MINILM)
+    except Exception as e:
+        pytest.skip(f"all-MiniLM-L6-v2 is not available: {e}")
+    query = "Which vegetables did I put in last year?"
+    vectors = model.embed([query] + SAVED)
+    scores = vectors[1:] @ vectors[0]
+    assert int(np.argmax(scores)) == 0
+    assert scores[0] > 0.35  # config.MEMORY_MIN_SCORE
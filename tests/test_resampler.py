@@ -0,0 +1,19 @@
+import numpy as np
+import pytest
+from utils.resampler import StreamingResampler
+
+
+def _resample(in_rate, out_rate, audio, block_size):
+    resampler = StreamingResampler(in_rate, out_rate)
+    chunks = [resampler.process(audio[i:i + block_size]) for i in range(0, len(audio), block_size)]
+    chunks.append(resampler.flush())
+    return np.concatenate(chunks)
+
+
+@pytest.mark.parametrize("in_rate, out_rate", [(22050, 16000), (44100, 16000), (48000, 16000), (16000, 24000)])
+def test_output_does_not_depend_on_block_size(in_rate, out_rate):
+    audio = (np.random.default_rng(0).uniform(-1, 1, in_rate // 10) * 20000).astype(np.int16)
+    whole = _resample(in_rate, out_rate, audio, len(audio))
+    assert len(whole) == -(-len(audio) * out_rate // in_rate)
+    for block_size in (1, 7, 441, 512):
+        np.testing.assert_array_equal(_resample(in_rate, out_rate, audio, block_size), whole)
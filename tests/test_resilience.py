@@ -0,0 +1,163 @@
+import contextlib
+import io
+import json
+import threading
+import time
+import uuid
+import pytest
+import requests
+from benchmarks.mock_server import MockProviderServer
+from llm_apis.base_client import BaseClient
+from llm_apis.ollama_client import OllamaClient
+from llm_apis.resilience import CircuitOpenError, ResilientClient
+
+MESSAGES = [{"role": "user", "content": "hi"}]
+RESPONSE = "Sure, here is the answer."
+
+
+class _OpenAIStreamClient(BaseClient):
+    """
+    Streams from the mock server's OpenAI endpoint, raising like the SDKs do: an HTTPError carrying the
+    response for an error status, and a connection error for a stream cut off before it finished.
+    """
+    def __init__(self, server, recover_after=None):
+        super().__init__(verbose=False)
+        self.server = server
+        self.url = f"{server.openai_base_url}/chat/completions"
+        self.recover_after = recover_after  # Attempts after which the server stops failing
+        self.attempts = []  # When each attempt was made
+
+    def stream_completion(self, messages, model, **kwargs):
+        if self.recover_after is not None and len(self.attempts) >= self.recover_after:
+            self.server.error_rate = 0.0
+        self.attempts.append(time.monotonic())
+        with requests.post(self.url, json={"model": model, "messages": messages, "stream": True},
+                           stream=True, timeout=5) as response:
+            response.raise_for_status()
+            for line in response.iter_lines():
+                if not line.startswith(b"data: "):
+                    continue
+                if line == b"data: [DONE]":
+                    return
+                content = json.loads(line[6:])["choices"][0]["delta"].get("content")
+                if content:
+                    yield content
+        raise requests.ConnectionError("The stream ended before the response finished")
+
+
+def _resilient(client, **kwargs):
+    # Every test gets its own circuit breaker, they are shared per provider name
+    kwargs.setdefault("local", False)
+    return ResilientClient(client, f"test_{uuid.uuid4().hex}", **kwargs)
+
+def _complete(client):
+    with contextlib.redirect_stdout(io.StringIO()):  # The clients print every failure
+        return "".join(client.stream_completion(MESSAGES, "mock"))
+
+
+def test_transient_failures_are_retried():
+    with MockProviderServer(response=RESPONSE, error_rate=1.0) as server:
+        client = _resilient(_OpenAIStreamClient(server, recover_after=2), base_delay=0.01, max_delay=0.01)
+        assert _complete(client) == RESPONSE
+        assert server.failures == 2 and server.requests == 3
+        assert not client.breaker.is_open
+
+def test_retry_after_is_honoured():
+    with MockProviderServer(response=RESPONSE, error_rate=1.0, retry_after=0.2) as server:
+        inner = _OpenAIStreamClient(server)
+        client = _resilient(inner, latency_budget=0.7, base_delay=0.001, max_delay=0.001, failure_threshold=100)
+        with pytest.raises(requests.HTTPError):
+            _complete(client)
+    gaps = [later - earlier for earlier, later in zip(inner.attempts, inner.attempts[1:])]
+    assert len(gaps) >= 2
+    assert all(gap >= 0.2 for gap in gaps)
+
+def test_retry_after_is_honoured_through_the_ollama_client():
+    with MockProviderServer(response=RESPONSE, error_rate=1.0, retry_after=0.2) as server:
+        client = _resilient(OllamaClient(base_url=server.base_url), latency_budget=0.5, base_delay=0.001,
+                            max_delay=0.001, failure_threshold=100)
+        start_time = time.monotonic()
+        with pytest.raises(RuntimeError):
+            _complete(client)
+        elapsed = time.monotonic() - start_time
+        assert server.requests == 3  # Two waits of 0.2s fit in the budget, a third would not
+        assert elapsed >= 0.4
+
+def test_retries_stop_within_the_latency_budget():
+    with MockProviderServer(response=RESPONSE, error_rate=1.0, retry_after=0.15) as server:
+        client = _resilient(_OpenAIStreamClient(server), latency_budget=0.6, base_delay=0.001, max_delay=0.001,
+                            failure_threshold=100)
+        start_time = time.monotonic()
+        with pytest.raises(requests.HTTPError):
+            _complete(client)
+        elapsed = time.monotonic() - start_time
+        assert server.requests >= 3
+        assert elapsed < 0.6 + 0.25  # The budget, plus the time the last request itself took
+
+def test_errors_that_are_not_transient_are_not_retried():
+    with MockProviderServer(response=RESPONSE, error_rate=1.0, error_status=400) as server:
+        client = _resilient(_OpenAIStreamClient(server), base_delay=0.001)
+        with pytest.raises(requests.HTTPError):
+            _complete(client)
+        assert server.requests == 1
+        assert not client.breaker.is_open  # The provider answered, the request was bad
+
+def test_failures_after_the_first_chunk_are_not_retried():
+    with MockProviderServer(response=RESPONSE, chunk_chars=(4, 4), disconnect_rate=1.0) as server:
+        client = _resilient(_OpenAIStreamClient(server), base_delay=0.001)
+        received = []
+        with pytest.raises(requests.ConnectionError):
+            for chunk in client.stream_completion(MESSAGES, "mock"):
+                received.append(chunk)
+        assert received == [RESPONSE[:4]]
+        assert server.requests == 1 and server.disconnects == 1
+
+def test_circuit_opens_goes_half_open_and_closes():
+    with MockProviderServer(response=RESPONSE, error_rate=1.0) as server:
+        client = _resilient(_OpenAIStreamClient(server), latency_budget=0, failure_threshold=2, cooldown=0.3)
+        for _ in range(2):
+            with pytest.raises(requests.HTTPError):
+                _complete(client)
+        assert client.breaker.is_open
+
+        # While open, requests fail straight away without reaching the server
+        with pytest.raises(CircuitOpenError):
+            _complete(client)
+        assert server.requests == 2
+
+        # After the cooldown one trial request is let through, and a failure opens the circuit again
+        time.sleep(0.35)
+        with pytest.raises(requests.HTTPError):
+            _complete(client)
+        assert server.requests == 3 and client.breaker.is_open
+
+        # A trial that succeeds closes it, and while it waits for its first token no other request is let through
+        time.sleep(0.35)
+        server.error_rate = 0.0
+        server.time_to_first_token = 0.3
+        trial = []
+        thread = threading.Thread(target=lambda: trial.append(_complete(client)))
+        thread.start()
+        time.sleep(0.1)
+        with pytest.raises(CircuitOpenError):
+            _complete(client)
+        thread.join()
+        assert trial == [RESPONSE]
+        assert not client.breaker.is_open
+        server.time_to_first_token = 0.0
+        assert _complete(client) == RESPONSE
+        assert server.requests == 5
+
+def test_local_server_that_is_not_running_fails_fast():
+    server = MockProviderServer()
+    base_url = server.base_url
+    server.close()  # Nothing is listening on the port now
+
+    client = _resilient(OllamaClient(base_url=base_url), local=True, base_delay=0.5)
+    start_time = time.monotonic()
+    with pytest.raises(RuntimeError):
+        _complete(client)
+    assert time.monotonic() - start_time < 0.5  # Not retried
+    assert client.breaker.is_open
+    with pytest.raises(CircuitOpenError):
+        _complete(client)
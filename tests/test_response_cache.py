@@ -0,0 +1,43 @@
+import pytest
+from utils.response_cache import ResponseCache
+
+SYSTEM = "You are a helpful assistant.\nCurrent date: 2025-01-01 (Wednesday)\nCurrent time: 10:30"
+CLIPBOARD = "\n\nTHE USER HAS GRANTED YOU ACCESS TO THEIR CLIPBOARD, THIS IS ITS CONTENT (ignore if user doesn't mention it):\n```{}```"
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = ResponseCache(str(tmp_path / "responses.db"))
+    yield cache
+    cache.close()
+
+def _key(cache, user, system=SYSTEM, history=()):
+    messages = [{"role": "system", "content": system}, *history, {"role": "user", "content": user}]
+    return cache.key("model", {"temperature": 0.7}, messages)
+
+def test_transcript_case_spacing_punctuation_and_timestamps_are_ignored(cache):
+    first = _key(cache, "Proofread my essay.\n\nMESSAGE TIMESTAMP: 10:30 AM 2025-01-01 (Wednesday)")
+    second = _key(cache, "proofread  my essay\n\nMESSAGE TIMESTAMP: 11:45 AM 2025-01-02 (Thursday)",
+                  system=SYSTEM.replace("10:30", "11:45"))
+    assert first is not None and first == second
+
+def test_clipboard_content_must_match_exactly(cache):
+    first = _key(cache, "proofread my clipboard" + CLIPBOARD.format("def f():\n    return X  # at 10:30"))
+    second = _key(cache, "proofread my clipboard" + CLIPBOARD.format("def f(): return x  # at 11:45"))
+    assert first != second
+
+def test_images_must_match_exactly(cache):
+    def with_image(data):
+        return [{"type": "image", "source": {"type": "base64", "media_type": "image/png", "data": data}},
+                {"type": "text", "text": "What is this?\n\nTHE USER HAS GRANTED YOU ACCESS TO AN IMAGE FROM THEIR CLIPBOARD."}]
+    assert _key(cache, with_image("aaaa")) == _key(cache, with_image("aaaa"))
+    assert _key(cache, with_image("aaaa")) != _key(cache, with_image("aaab"))
+
+def test_earlier_turns_must_match_exactly(cache):
+    def history(answer):
+        return [{"role": "user", "content": "Name a colour."}, {"role": "assistant", "content": answer}]
+    assert _key(cache, "Another one.", history=history("Red.")) != _key(cache, "Another one.", history=history("red"))
+
+def test_time_sensitive_questions_are_not_cached(cache):
+    assert _key(cache, "What time is it?") is None
+    # Only what was said counts, not the clipboard
+    assert _key(cache, "Summarise this" + CLIPBOARD.format("the news today")) is not None
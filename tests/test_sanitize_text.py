@@ -0,0 +1,24 @@
+import pytest
+from utils.utils import sanitize_text
+
+@pytest.mark.parametrize("text, spoken", [
+    ("Pages 3-5.", "Pages 3 to 5."),
+    ("Between 1990-2000.", "Between 1990 to 2000."),
+    ("Version 3.5-4.0 is out", "Version 3.5 to 4.0 is out"),
+    ("Call 555-1234 now", "Call 555-1234 now"),
+    ("Call 1-800-555-1234 now", "Call 1-800-555-1234 now"),
+    ("On 2024-01-15 it shipped", "On 2024-01-15 it shipped"),
+    ("It takes 2 us", "It takes 2 us"),
+    ("Wait 1 min.", "Wait 1 minute."),
+    ("Wait 5 min.", "Wait 5 minutes."),
+    ("It is 200ms slower", "It is 200 milliseconds slower"),
+    ("That costs €3,50.", "That costs 3 euros 50 cents."),
+    ("That costs $1.50", "That costs 1 dollar 50 cents"),
+    ("It costs $0.99 today.", "It costs 99 cents today."),
+    ("A fee of €0,01.", "A fee of 1 cent."),
+    ("It raised $5m", "It raised 5 million dollars"),
+    ("About 1,000,000 people", "About 1000000 people"),
+    ("Up 5% on the day", "Up 5 percent on the day"),
+])
+def test_numbers_are_normalised_for_speech(text, spoken):
+    assert sanitize_text(text) == spoken
@@ -0,0 +1,79 @@
+import gzip
+import json
+import numpy as np
+import pytest
+from utils.session_trace import SessionTracer, completion_prompts, load_trace
+
+
+def _record_session(path, turns):
+    """Trace a few turns the way the voice assistant makes them, returning the prompt sent each turn."""
+    tracer = SessionTracer(str(path))
+    messages = []
+    sent = []
+    for number, (question, answer) in enumerate(turns):
+        started = tracer.now()
+        tracer.key_event("ctrl+alt+r", True)
+        tracer.key_event("ctrl+alt+r", False)
+        tracer.recording(np.zeros(1600, dtype=np.int16), 16000, started, tracer.now())
+        tracer.transcription(question, tracer.now())
+        messages.append({"role": "user", "content": question})
+        # The system prompt changes every turn, e.g. with the time
+        prompt = [{"role": "system", "content": f"Be brief. Current time: 10:{number:02d}"}] + messages
+        sent.append(json.loads(json.dumps(prompt)))
+        stream = tracer.trace_completion(iter([answer]), "mock", prompt, temperature=0.7)
+        messages.append({"role": "assistant", "content": "".join(stream)})
+        tracer.tts(answer, tracer.now(), audio_seconds=0.2)
+        tracer.playback(answer)
+    tracer.close()
+    return sent
+
+
+TURNS = [("What is two plus two?", "Four."), ("And times three?", "Twelve."), ("Minus five?", "Seven.")]
+
+def test_prompts_only_record_new_messages(tmp_path):
+    sent = _record_session(tmp_path / "trace.jsonl.gz", TURNS)
+    events = load_trace(str(tmp_path / "trace.jsonl.gz"))
+    prompts = [event for event in events if event["type"] == "prompt"]
+    # Each turn adds the new system prompt, the last answer and the new question
+    assert [sum(isinstance(message, dict) for message in prompt["messages"]) for prompt in prompts] == [2, 3, 3]
+    assert all("messages" not in event for event in events if event["type"] == "completion")
+
+    rebuilt = completion_prompts(events)
+    completions = [event for event in events if event["type"] == "completion"]
+    assert [rebuilt[completion["prompt"]] for completion in completions] == sent
+
+def test_damaged_traces_are_reported(tmp_path):
+    path = tmp_path / "trace.jsonl.gz"
+    _record_session(path, TURNS)
+    events = load_trace(str(path))
+    with gzip.open(path, "wt", encoding="utf-8") as trace_file:
+        for event in events:
+            if event["type"] == "prompt" and event["id"] == 1:
+                continue  # Lost, as if the file had been cut
+            trace_file.write(json.dumps(event) + "\n")
+    with pytest.raises(ValueError):
+        completion_prompts(load_trace(str(path)))
+
+def test_replay_rebuilds_the_prompts(tmp_path):
+    from benchmarks.replay_session import replay
+    _record_session(tmp_path / "trace.jsonl.gz", TURNS)
+    recorded, replayed = replay(str(tmp_path / "trace.jsonl.gz"))
+    assert len(replayed) == len(recorded) == len(TURNS)
+    assert [turn["completion"]["chunks"][0][1] for turn in replayed] == [answer for _, answer in TURNS]
+
+def test_trace_of_a_killed_session_can_be_read(tmp_path):
+    import os
+    import subprocess
+    import sys
+    path = tmp_path / "trace.jsonl.gz"
+    script = ("import os\n"
+              "from utils.session_trace import SessionTracer\n"
+              f"tracer = SessionTracer({str(path)!r})\n"
+              "for number in range(50):\n"
+              "    tracer.transcription(f'Turn {number}', tracer.now())\n"
+              "os._exit(0)\n")
+    repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", script], cwd=repo_dir, check=True, timeout=60)
+    events = load_trace(str(path))
+    assert [event["type"] for event in events] == ["session"] + ["transcription"] * 50
+    assert events[-1]["text"] == "Turn 49"
@@ -0,0 +1,51 @@
+import time
+import pytest
+
+pytest.importorskip("soundfile")
+
+import tts_manager
+from benchmarks.fakes import FakeTTSClient
+from config_loader import config
+from utils.action_scheduler import ActionScheduler
+from utils.audio_backend import SimulatedAudioBackend
+from utils.audio_mixer import AudioMixer
+
+
+class _Parent:
+    """Checks cancellation like AlwaysReddy, through the token of the action on the calling thread."""
+    def __init__(self):
+        self.actions = ActionScheduler()
+
+    @property
+    def stop_action(self):
+        token = self.actions.current_token()
+        return token is not None and token.cancelled
+
+
+@pytest.fixture
+def tts(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "AUDIO_FILE_DIR", str(tmp_path))
+    monkeypatch.setattr(config, "TTS_AUDIO_CACHE", False)
+    manager = tts_manager.TTSManager(parent_client=_Parent(), verbose=False)
+    manager._tts_client_loader.wait()
+    manager._tts_client = FakeTTSClient(seconds_per_char=0.02)
+    manager.backend = SimulatedAudioBackend()
+    manager.mixer = AudioMixer(backend=manager.backend)
+    yield manager
+    manager.parent_client.actions.shutdown()
+    manager.mixer.stop_all()
+
+
+def test_cancelling_an_action_drops_its_queued_speech(tts):
+    text = "This answer goes on for a while. It has a second sentence too. And a third one after that."
+    action = tts.parent_client.actions.submit(tts.run_tts, text, output_dir=config.AUDIO_FILE_DIR)
+    futures = action.future.result(timeout=10)
+    assert futures
+    time.sleep(0.2)  # Part way through the first sentence
+
+    # What AlwaysReddy.cancel_all does
+    tts.parent_client.actions.cancel_all()
+    tts.stop()
+    assert tts.wait(timeout=5)
+    assert not any(future.result(timeout=1) for future in futures)
+    assert tts.interrupted_sentence and text.startswith(tts.interrupted_sentence.rstrip("."))
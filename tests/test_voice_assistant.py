@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+from actions.always_reddy_voice_assistant.main import AlwaysReddyVoiceAssistant
+
+
+class _Chat:
+    def __init__(self, response):
+        self.response = response
+        self.messages = []
+
+    def add_message(self, role, content):
+        self.messages.append((role, content))
+
+    def remove_last_message(self):
+        self.messages.pop()
+
+    def get_completion(self, marker_tuples=None):
+        return self.response
+
+
+def _assistant(response, tts):
+    assistant = AlwaysReddyVoiceAssistant.__new__(AlwaysReddyVoiceAssistant)
+    assistant.AR = SimpleNamespace(
+        toggle_recording=lambda action: "recording.wav",
+        transcription_manager=SimpleNamespace(transcribe_audio=lambda filename: "Tell me more."),
+        tts=tts, clipboard_text=None, last_clipboard_text=None, verbose=False)
+    assistant.chat = _Chat(response)
+    assistant.last_message_was_cut_off = False
+    return assistant
+
+
+def test_an_earlier_interruption_does_not_cut_off_an_unspoken_response():
+    # The previous turn was cut off at "Sure.", and this turn's response is never spoken, e.g. TTS failed
+    tts = SimpleNamespace(interrupted_sentence="Sure.", last_sentence_spoken="Sure.", wait=lambda: None)
+    assistant = _assistant("Sure. Here is the rest of it.", tts)
+    assistant.handle_default_assistant_response()
+    assert assistant.chat.messages[-1] == ("assistant", "Sure. Here is the rest of it.")
+    assert not assistant.last_message_was_cut_off
+
+
+def test_an_interruption_during_the_response_cuts_it_off():
+    tts = SimpleNamespace(interrupted_sentence=None, last_sentence_spoken="")
+
+    def talked_over():
+        # stop() while "First part." was playing
+        tts.interrupted_sentence = tts.last_sentence_spoken = "First part."
+    tts.wait = talked_over
+    assistant = _assistant("First part. Second part.", tts)
+    assistant.handle_default_assistant_response()
+    assert assistant.chat.messages[-1] == ("assistant", "First part.")
+    assert assistant.last_message_was_cut_off
@@ -1,28 +1,37 @@
 import os
 from dotenv import load_dotenv
-from config import AUDIO_FILE_DIR
 from config_loader import config
+from utils.background_loader import BackgroundLoader
+from utils.session_trace import get_session_tracer
 
 # Load .env file if present
 load_dotenv()
 
 class TranscriptionManager:
     def __init__(self, verbose=config.VERBOSE):
-        self.client = None
+        self._client = None
         self.verbose = verbose
-        self._setup_client()
+        self.tracer = get_session_tracer(verbose)
+        # Loading a local Whisper model takes seconds, so do it while the hotkeys are already live
+        self._client_loader = BackgroundLoader(self._setup_client, f"{config.TRANSCRIPTION_API} transcription client", verbose=verbose)
+
+    @property
+    def client(self):
+        """The transcription client, waiting for it to finish loading if needed."""
+        self._client_loader.wait()
+        return self._client
 
     def _setup_client(self):
         """Instantiates the appropriate transcription client based on configuration file."""
         if config.TRANSCRIPTION_API == "openai":
             from transcription_apis.openai_client import OpenAIClient
-            self.client = OpenAIClient(verbose=self.verbose)
+            self._client = OpenAIClient(verbose=self.verbose)
         elif config.TRANSCRIPTION_API == "FasterWhisper":
             from transcription_apis.faster_whisper_client import FasterWhisperClient
-            self.client = FasterWhisperClient(verbose=self.verbose)
+            self._client = FasterWhisperClient(verbose=self.verbose)
         elif config.TRANSCRIPTION_API == "TransformersWhisper":
             from transcription_apis.transformers_whisper_client import TransformersWhisperClient
-            self.client = TransformersWhisperClient(verbose=self.verbose)
+            self._client = TransformersWhisperClient(verbose=self.verbose)
         else:
             raise ValueError("Unsupported transcription API service configured")
 
@@ -41,8 +50,11 @@ class TranscriptionManager:
             Exception: If there is an error during the transcription process.
         """
         try:
-            full_path = os.path.join(AUDIO_FILE_DIR, file_path)
+            full_path = os.path.join(config.AUDIO_FILE_DIR, file_path)
+            started = self.tracer.now() if self.tracer is not None else None
             transcript = self.client.transcribe_audio_file(full_path)
+            if self.tracer is not None:
+                self.tracer.transcription(transcript, started)
             
             # Delete the audio file
             os.remove(full_path)
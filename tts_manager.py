@@ -1,11 +1,16 @@
+import io
 import os
 import threading
 import queue
+from concurrent.futures import Future
 from config_loader import config
+from utils.audio_cache import get_audio_cache
+from utils.session_trace import get_session_tracer
+from utils.background_loader import BackgroundLoader
+from utils.speech_segmenter import segment_text
+from utils.utils import sanitize_text
 import tempfile
-import pyaudio
 import wave
-import re
 
 class TTSManager:
     """
@@ -18,49 +23,173 @@ class TTSManager:
         self.service = config.TTS_ENGINE
         self.audio_queue = queue.Queue()
         self.parent_client = parent_client
-        self.queing = False
         self.temp_files = []
-        self._play_audio_thread = threading.Thread(target=self._play_audio)
-        self.running_tts = False
+        self._play_audio_thread = threading.Thread(target=self._play_audio, name="tts_playback", daemon=True)
         self.last_sentence_spoken = ""
         self.verbose = verbose
-        self.stop_playback = False
-        self.playback_stopped = threading.Event()
-        self.sentence_pattern = r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?|\!)(?=\s|$)|\n'
+        self._mixer = None
+        self._voice = None  # The unit of speech playing now
+        self._voice_sentence = None
+        self.interrupted_sentence = None  # The sentence stop() cut off part way, until the next one starts playing or the next turn starts
+        # Set whenever nothing is being synthesised, queued or played. _busy counts run_tts calls in progress
+        # and queued units of speech.
+        self.idle = threading.Event()
+        self.idle.set()
+        self._busy = 0
+        self._busy_lock = threading.Lock()
+        self._generation = 0  # Bumped by stop(), speech queued before then is dropped
 
+        self._tts_client = None
+        self._tts_client_loader = BackgroundLoader(self._setup_client, f"{self.service} TTS client", verbose=self.verbose)
+        self.audio_cache = get_audio_cache(verbose=self.verbose)
+        self.tracer = get_session_tracer(verbose=self.verbose)
+
+        # Delete any leftover temp files if any
+        for file in os.listdir(config.AUDIO_FILE_DIR):
+            if file.endswith(".wav") or file.endswith(".mp3"):
+                os.remove(os.path.join(config.AUDIO_FILE_DIR, file))
+
+    def _setup_client(self):
+        """Instantiates the appropriate TTS client based on configuration file."""
         ## NOTE: For now all TTS services need to return wav files.
         if self.service == "openai":
             from TTS_apis.openai_tts_client import OpenAITTSClient
-            self.tts_client = OpenAITTSClient(verbose=self.verbose)
+            self._tts_client = OpenAITTSClient(verbose=self.verbose)
         elif self.service == "piper":
             from TTS_apis.piper_tts_client import PiperTTSClient
-            self.tts_client = PiperTTSClient(verbose=self.verbose)
+            self._tts_client = PiperTTSClient(verbose=self.verbose)
         elif self.service == "mac":
             from TTS_apis.mac_tts_client import MacTTSClient
-            self.tts_client = MacTTSClient(verbose=self.verbose)
+            self._tts_client = MacTTSClient(verbose=self.verbose)
         else:
             raise ValueError("Unsupported TTS engine configured")
 
-        # Delete any leftover temp files if any
-        for file in os.listdir(config.AUDIO_FILE_DIR):
-            if file.endswith(".wav") or file.endswith(".mp3"):
-                os.remove(os.path.join(config.AUDIO_FILE_DIR, file))
+    @property
+    def mixer(self):
+        """The AudioMixer speech is played through, the one shared with the sound effects by default."""
+        if self._mixer is None:
+            from utils.audio_mixer import get_mixer
+            self._mixer = get_mixer(verbose=self.verbose)
+        return self._mixer
+
+    @mixer.setter
+    def mixer(self, mixer):
+        self._mixer = mixer
 
-    def wait(self):
+    @property
+    def tts_client(self):
+        """The TTS client, waiting for it to finish loading if needed."""
+        self._tts_client_loader.wait()
+        return self._tts_client
+
+    def voice_settings(self):
+        """The settings of the current engine that change how it sounds, part of the audio cache key."""
+        if self.service == "piper":
+            return {"voice": config.PIPER_VOICE, "index": config.PIPER_VOICE_INDEX, "speed": config.PIPER_VOICE_SPEED}
+        if self.service == "openai":
+            return {"voice": getattr(config, "OPENAI_VOICE", None)}
+        return {}
+
+    def _synthesise(self, text, output_dir):
         """
-        Wait for the _play_audio_thread to join.
+        Get speech for a piece of text, from the audio cache if it has been spoken before.
+
+        Returns:
+            The path of a new WAV file, or a file-like object holding cached WAV data, or None if the TTS failed.
         """
-        self._play_audio_thread.join()
+        cache_key = None
+        if self.audio_cache is not None:
+            cache_key = self.audio_cache.key(self.service, self.voice_settings(), sanitize_text(text))
+            cached_audio = self.audio_cache.get(cache_key)
+            if cached_audio is not None:
+                return io.BytesIO(cached_audio)
 
-    def split_sentences(self, text):
+        # Create a temporary file in the output directory
+        temp_file = tempfile.NamedTemporaryFile(delete=False, dir=output_dir, suffix=".wav")
+        temp_output_file = temp_file.name
+        temp_file.close()
+
+        # Run the TTS using the appropriate service
+        if self.tts_client.tts(text, temp_output_file) != "success":
+            return None
+
+        if cache_key is not None:
+            try:
+                with open(temp_output_file, "rb") as audio_file:
+                    self.audio_cache.put(cache_key, audio_file.read())
+            except OSError as e:
+                if self.verbose:
+                    print(f"Error caching audio: {e}")
+        return temp_output_file
+
+    @staticmethod
+    def _audio_seconds(audio):
+        """The length of synthesised WAV audio, a path or a file-like object, or None if it cannot be read."""
+        try:
+            with wave.open(audio, 'rb') as audio_file:
+                seconds = audio_file.getnframes() / audio_file.getframerate()
+            return round(seconds, 3)
+        except Exception:
+            return None
+        finally:
+            if hasattr(audio, "seek"):
+                audio.seek(0)
+
+    def prewarm_in_background(self, phrases=None):
+        """
+        Synthesise stock phrases into the audio cache on a background thread, so they play instantly
+        the first time they are needed. Phrases already cached from an earlier run are skipped.
+
+        Args:
+            phrases (list, optional): The phrases. Defaults to config.TTS_STOCK_PHRASES and the code block summary.
+        """
+        if self.audio_cache is None:
+            return
+        if phrases is None:
+            phrases = list(config.TTS_STOCK_PHRASES) + [config.TTS_CODE_BLOCK_SUMMARY]
+        threading.Thread(target=self._prewarm, args=([phrase for phrase in phrases if phrase],),
+                         name="tts_prewarm", daemon=True).start()
+
+    def _prewarm(self, phrases):
+        try:
+            client = self.tts_client
+        except Exception:
+            return  # The loader has already reported why
+        voice = self.voice_settings()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            for phrase in phrases:
+                key = self.audio_cache.key(self.service, voice, sanitize_text(phrase))
+                if key in self.audio_cache:
+                    continue
+                output_file = os.path.join(temp_dir, "phrase.wav")
+                try:
+                    if client.tts(phrase, output_file) == "success":
+                        with open(output_file, "rb") as audio_file:
+                            self.audio_cache.put(key, audio_file.read())
+                except Exception as e:
+                    if self.verbose:
+                        print(f"Error pre-synthesising '{phrase}': {e}")
+        if self.verbose:
+            print(f"Audio cache warmed with {len(phrases)} stock phrases")
+
+    def wait(self, timeout=None):
         """
-        Split the text into sentences and remove empty ones.
+        Wait until all queued audio has played, or been cancelled by stop().
+
+        Args:
+            timeout (float, optional): The most seconds to wait.
+
+        Returns:
+            bool: True if the TTS is idle, False if the timeout passed first.
         """
-        sentences = re.split(self.sentence_pattern, text)
-        # Ensure sentences end with punctuation and remove empty sentences
-        sentences = [s + '.' if not s.strip().endswith(('.', '!', '?')) else s for s in sentences if s.strip()]
+        return self.idle.wait(timeout)
 
-        return sentences
+    def split_sentences(self, text):
+        """
+        Split the text into units of speech, see SpeechSegmenter.
+        Short sentences are merged and code blocks are skipped, so each unit is worth a TTS call.
+        """
+        return segment_text(text, eager_first=False)
 
     def run_tts(self, text, output_dir=config.AUDIO_FILE_DIR, split_sentences=True):
         """
@@ -70,194 +199,199 @@ class TTSManager:
             text (str): The text to be converted to speech.
             output_dir (str): The directory where the audio files will be saved.
             split_sentences (bool): Whether to split the text into sentences. Default is True.
-        """
-        self.queing = True
-    
-        if not self._play_audio_thread.is_alive():
-            self._play_audio_thread = threading.Thread(target=self._play_audio)
-            self._play_audio_thread.start()
-    
-        if not os.path.exists(output_dir):
-            try:
-                os.makedirs(output_dir)
-            except OSError as e:
-                if self.verbose:
-                    print(f"Error creating output directory {output_dir}: {e}")
-                self.queing = False
-                return
-    
-        texts_to_process = self.split_sentences(text) if split_sentences else [text]
-    
-    
-        for current_text in texts_to_process:
-            try:
-                #if the text does not end with a punctuation mark, add a period
-                if not current_text.endswith((".", "!", "?")):
-                    current_text += "."
-                    
-                # Create a temporary file in the output directory
-                temp_file = tempfile.NamedTemporaryFile(delete=False, dir=output_dir, suffix=".wav")
-                temp_output_file = temp_file.name
-                temp_file.close()
-    
-                # Run the TTS using the appropriate service
-                result = self.tts_client.tts(current_text, temp_output_file)
-                
-                # If the TTS was successful, add the output file to the queue
-                if result == "success":                   
-                    # If the stop flag is set, return early
-                    if self.parent_client.stop_action:
-                        return
-                    
-                    self.temp_files.append(temp_output_file)
-                    self.audio_queue.put((temp_output_file, current_text))
 
-            except Exception as e:
-                if self.verbose:
-                    import traceback
-                    traceback.print_exc()
-                else:
-                    print(f"Error during TTS processing: {e}")
-    
-        # Set queuing flag to False
-        self.queing = False
-
-    def _play_audio(self): 
-        """
-        Play the audio from the audio queue.
+        Returns:
+            list: A Future per queued unit of speech, resolved once it has finished playing: True if it was
+                played to the end, False if it was cancelled or could not be played.
         """
-        # While there are items in the queue or the queuing flag is set
-        while self.queing or not self.audio_queue.empty():
-            # If the stop response flag or stop_playback flag is set, break the loop
-            if self.parent_client.stop_action or self.stop_playback:
-                break
+        generation = self._generation
+        futures = []
+        self._begin()
+        try:
+            if not self._play_audio_thread.is_alive():
+                self._play_audio_thread = threading.Thread(target=self._play_audio, name="tts_playback", daemon=True)
+                self._play_audio_thread.start()
 
-            # Set the running TTS flag to True
-            self.running_tts = True
-            try:
-                # Try to get an item from the queue, with a timeout of 1 second
-                file_path, sentence = self.audio_queue.get(timeout=1)
-            except queue.Empty:
-                # If the queue is empty, continue to the next iteration of the loop
-                continue
+            if not os.path.exists(output_dir):
+                try:
+                    os.makedirs(output_dir)
+                except OSError as e:
+                    if self.verbose:
+                        print(f"Error creating output directory {output_dir}: {e}")
+                    return futures
 
-            try:
-                
-                if self.verbose:
-                    print(f"Playing audio: {sentence}")
-                # Load the audio file using wave
-                with wave.open(file_path, 'rb') as audio_file:
-                    # Create a PyAudio instance
-                    p = pyaudio.PyAudio()
-
-                    # Open a stream for playback
-                    stream = p.open(format=p.get_format_from_width(audio_file.getsampwidth()),
-                                    channels=audio_file.getnchannels(),
-                                    rate=audio_file.getframerate(),
-                                    output=True)
-
-                    # Read audio data in chunks and write to the stream
-                    data = audio_file.readframes(1024)
-                    while data and not self.stop_playback:
-                        stream.write(data)
-                        data = audio_file.readframes(1024)
-
-                    # Stop and close the stream
-                    stream.stop_stream()
-                    stream.close()
-
-                    # Terminate the PyAudio instance
-                    p.terminate()
-
-                    if self.stop_playback:
-                        self.playback_stopped.set()
+            texts_to_process = self.split_sentences(text) if split_sentences else [text]
 
-            except Exception as e:
-                if self.verbose:
-                    print(f"Error playing audio: {e}")
-                continue
+            for current_text in texts_to_process:
+                try:
+                    #if the text does not end with a punctuation mark, add a period
+                    if not current_text.endswith((".", "!", "?")):
+                        current_text += "."
 
-            self.last_sentence_spoken = sentence
-            # Mark the task as done in the queue
-            self.audio_queue.task_done()
+                    started = self.tracer.now() if self.tracer is not None else None
+                    audio = self._synthesise(current_text, output_dir)
+                    if self.tracer is not None and audio is not None:
+                        self.tracer.tts(current_text, started, audio_seconds=self._audio_seconds(audio),
+                                        cached=not isinstance(audio, str))
+
+                    # If the TTS was successful, add the audio to the queue
+                    if audio is not None:
+                        # If this action was cancelled, or the speech stopped, while this was synthesised, drop it
+                        if self.parent_client.stop_action or generation != self._generation:
+                            self._remove_audio(audio)
+                            return futures
+
+                        if isinstance(audio, str):
+                            self.temp_files.append(audio)
+                        future = Future()
+                        self._begin()  # Ended by the playback thread, or stop() if it is never played
+                        self.audio_queue.put((audio, current_text, future, generation))
+                        futures.append(future)
+
+                except Exception as e:
+                    if self.verbose:
+                        import traceback
+                        traceback.print_exc()
+                    else:
+                        print(f"Error during TTS processing: {e}")
+            return futures
+        finally:
+            self._end()
+
+    @property
+    def running_tts(self):
+        """Whether speech is being synthesised, is queued, or is playing."""
+        return not self.idle.is_set()
+
+    def _begin(self):
+        """Count a run_tts call or queued unit of speech as in progress."""
+        with self._busy_lock:
+            self._busy += 1
+            self.idle.clear()
+
+    def _end(self):
+        """Count a run_tts call or queued unit of speech as finished, setting `idle` if it was the last."""
+        with self._busy_lock:
+            self._busy -= 1
+            if self._busy == 0:
+                self.idle.set()
 
+    def _play_audio(self):
+        """
+        Play the audio from the audio queue, one unit of speech after another.
+
+        The thread blocks on the queue, so it costs nothing while there is nothing to say.
+        """
+        while True:
+            audio, sentence, future, generation = self.audio_queue.get()
+            played = False
             try:
-                # If the audio file exists, remove it
-                if os.path.exists(file_path):
-                    os.remove(file_path)
-                    # If the file path is in the temp_files list, remove it
-                    if file_path in self.temp_files:
-                        self.temp_files.remove(file_path)
+                # Speech queued before the last stop() is dropped. This thread runs no action, so there is no
+                # cancel token to check, cancelling an action stops the TTS, which bumps the generation
+                if generation == self._generation:
+                    played = self._play(audio, sentence, generation)
+                    if played:
+                        self.last_sentence_spoken = sentence
             except Exception as e:
                 if self.verbose:
-                    print(f"Error deleting file {file_path}: {e}")
+                    print(f"Error playing audio: {e}")
+            finally:
+                self._remove_audio(audio)
+                if not future.done():
+                    future.set_result(played)
+                self.audio_queue.task_done()
+                self._end()
+
+    def _play(self, audio, sentence, generation):
+        """
+        Play one unit of speech through the mixer, returning once it has finished or been cancelled.
+
+        Returns:
+            bool: True if it played to the end.
+        """
+        import soundfile as sf
+
+        if self.verbose:
+            print(f"Playing audio: {sentence}")
+        # Speech goes through the shared mixer, so it plays on the output stream that is already open
+        mixer = self.mixer
+        if not mixer.available:
+            raise RuntimeError("No audio output device")
+        samples, samplerate = sf.read(audio, dtype='float32', always_2d=True)
+        voice = mixer.play(mixer.prepare(samples, samplerate))
+        if voice is None:
+            return False
+        self._voice_sentence = sentence
+        self._voice = voice
+        self.interrupted_sentence = None
+        try:
+            if self.tracer is not None:
+                self.tracer.playback(sentence)
+            # stop() may have run between the generation check and now, before there was a voice to cancel
+            if generation != self._generation:
+                voice.cancel()
+            # Returns once the sentence has played, or within a block of stop() cancelling it
+            voice.wait()
+        finally:
+            self._voice = None
+            self._voice_sentence = None
+        return not voice.cancelled
 
-        # Set the running TTS flag to False
-        self.running_tts = False
+    def _remove_audio_files(self, audio_files):
+        for audio in audio_files:
+            self._remove_audio(audio)
 
-        # Delete any leftover temp files if any (this is just to be safe and should not be needed)
+    def _remove_audio(self, audio):
+        """Delete the temp file of a unit of speech, cached audio is played from memory."""
+        if not isinstance(audio, str):
+            return
         try:
-            for file in os.listdir(config.AUDIO_FILE_DIR):
-                if file.endswith(".wav") or file.endswith(".mp3"):
-                    os.remove(os.path.join(config.AUDIO_FILE_DIR, file))
+            if os.path.exists(audio):
+                os.remove(audio)
         except Exception as e:
             if self.verbose:
-                print(f"Error deleting leftover files: {e}")
+                print(f"Error deleting file {audio}: {e}")
+        if audio in self.temp_files:
+            self.temp_files.remove(audio)
 
     def stop(self):
         """
-        Stop the TTS process and clean up any temporary files.
+        Stop the speech playing now and drop everything queued, without waiting for the playback thread
+        or the file system, so it is safe to call from the input thread when the user talks over the TTS.
+
+        The playing unit of speech fades out within one mixer block, and is kept in `interrupted_sentence`
+        and `last_sentence_spoken`. Speech that is still being synthesised when this is called is dropped
+        once it is ready. This is what silences a cancelled action, the playback thread only checks the
+        generation this bumps.
         """
-        # Print a message indicating that the TTS process is stopping
         if self.verbose:
             print("Stopping TTS")
 
-        # Set the stop_playback flag to signal the _play_audio thread to stop
-        self.stop_playback = True
-
-        # Wait for the playback to stop or for a timeout of 1 second
-        self.playback_stopped.wait(timeout=0.01)
+        self._generation += 1
+        voice = self._voice
+        sentence = self._voice_sentence  # Set before _voice by _play, and cleared after it
+        if voice is not None and not voice.done.is_set():
+            voice.cancel()
+            # Part of it was heard, so a response cut off here is kept up to the end of it
+            self.interrupted_sentence = sentence
+            self.last_sentence_spoken = sentence
+            if self.tracer is not None:
+                self.tracer.record("interrupted", text=sentence)
 
-        # Attempt to clear the queue immediately to prevent any further processing
-        while not self.audio_queue.empty():
+        # Resolve everything still queued, the playback thread would only skip it
+        dropped_audio = []
+        while True:
             try:
-                # Try to get an item from the queue without waiting
-                self.audio_queue.get_nowait()
+                audio, _, future, _ = self.audio_queue.get_nowait()
             except queue.Empty:
-                # If the queue is empty, continue to the next iteration
-                continue
-            # Mark the task as done in the queue
+                break
+            dropped_audio.append(audio)
+            if not future.done():
+                future.set_result(False)
             self.audio_queue.task_done()
+            self._end()
 
-        # Start a new thread to handle file deletion
-        file_deletion_thread = threading.Thread(target=self._delete_temp_files)
-        file_deletion_thread.start()
-
-        # If the audio playback thread is alive
-        if self._play_audio_thread.is_alive():
-            # Wait for the thread to finish
-            self._play_audio_thread.join()
-
-        # Wait for the file deletion thread to finish
-        file_deletion_thread.join()
-        
-        # Reset the stop_playback flag and the playback_stopped event
-        self.stop_playback = False
-        self.playback_stopped.clear()
-
-    def _delete_temp_files(self):
-        """
-        Delete any temporary files.
-        """
-        # Iterate over a copy of the list of temporary files
-        for temp_file in self.temp_files.copy():
-            # If the file exists
-            if os.path.exists(temp_file):
-                try:
-                    # Try to remove the file
-                    os.remove(temp_file)
-                    # If the file path is in the temp_files list, remove it
-                    if temp_file in self.temp_files:
-                        self.temp_files.remove(temp_file)
-                except PermissionError as e:
-                    pass
\ No newline at end of file
+        # The files are deleted in the background, the caller may be about to start recording
+        if any(isinstance(audio, str) for audio in dropped_audio):
+            threading.Thread(target=self._remove_audio_files, args=(dropped_audio,), name="tts_cleanup",
+                             daemon=True).start()
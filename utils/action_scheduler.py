@@ -0,0 +1,294 @@
+import heapq
+import inspect
+import itertools
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+REPLACE = "replace"  # Cancel whatever is running or queued, then run
+QUEUE = "queue"  # Run once a worker is free, higher priorities first
+DROP = "drop"  # Ignore the trigger if anything is running or queued
+POLICIES = (REPLACE, QUEUE, DROP)
+
+
+class CancellationToken:
+    """
+    Tells an action it has been cancelled. Cancelling never waits for the action, it is up to the action
+    to check `cancelled` between steps and return early.
+    """
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        """Cancel the action, running any callbacks added with `on_cancel`. Cancelling twice does nothing."""
+        with self._lock:
+            if self._cancelled.is_set():
+                return
+            self._cancelled.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback()
+            except Exception as e:
+                print(f"Error in cancellation callback: {e}")
+
+    def on_cancel(self, callback):
+        """Call a function when the token is cancelled, straight away if it already has been."""
+        with self._lock:
+            if not self._cancelled.is_set():
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    def wait(self, timeout=None):
+        """
+        Sleep until the token is cancelled, for actions that pause.
+
+        Returns:
+            bool: True if it was cancelled, False if the timeout passed first.
+        """
+        return self._cancelled.wait(timeout)
+
+
+class ScheduledAction:
+    """An action submitted to the ActionScheduler, queued or running."""
+    def __init__(self, action, args, kwargs, name, priority, policy):
+        self.action = action
+        self.args = args
+        self.kwargs = kwargs
+        self.name = name
+        self.priority = priority
+        self.policy = policy
+        self.token = CancellationToken()
+        self.future = Future()  # Resolved with the action's return value, or cancelled if it never ran
+        self.submitted = time.perf_counter()
+        self.started = None
+
+    @property
+    def cancelled(self):
+        return self.token.cancelled
+
+    def cancel(self):
+        """Cancel the action. If it is still queued it will not run."""
+        self.token.cancel()
+        self.future.cancel()  # Only succeeds if the action has not started
+
+    def wait(self, timeout=None):
+        """
+        Wait for the action to finish, or be dropped from the queue.
+
+        Returns:
+            bool: True if it is done, False if the timeout passed first.
+        """
+        try:
+            self.future.exception(timeout)
+        except TimeoutError:
+            return False
+        except Exception:
+            pass  # Cancelled before it ran
+        return True
+
+
+def _accepts_token(action):
+    """Whether an action takes a `cancel_token` keyword argument."""
+    try:
+        return "cancel_token" in inspect.signature(action).parameters
+    except (TypeError, ValueError):
+        return False
+
+
+class ActionScheduler:
+    """
+    Runs actions on a small pool of worker threads, so whoever triggers them (the input thread) never waits.
+
+    Each action is submitted with a priority and a policy: REPLACE cancels everything running or queued
+    first, QUEUE waits for a free worker, and DROP ignores the trigger if anything else is going on.
+    Cancelled actions are not waited for, they keep their worker until they notice their token, which is
+    why there is more than one worker: the replacing action can start straight away.
+
+    Actions that take a `cancel_token` keyword argument are passed their CancellationToken. Any other code
+    running on the action's thread can find it with `current_token`.
+    """
+    def __init__(self, workers=2, history=200, verbose=False):
+        """
+        Initialize the ActionScheduler.
+
+        Args:
+            workers (int): Worker threads, the most actions that run at once.
+            history (int): How many of the most recent actions the latency metrics cover.
+            verbose (bool): Whether to print verbose output.
+        """
+        self.workers = max(1, workers)
+        self.verbose = verbose
+        self._queue = []  # Heap of (-priority, sequence, ScheduledAction)
+        self._sequence = itertools.count()
+        self._running = set()
+        self._threads = []
+        self._condition = threading.Condition()
+        self._shutdown = False
+        self._local = threading.local()
+
+        self._queue_waits = deque(maxlen=history)
+        self._run_times = deque(maxlen=history)
+        self._counts = {"submitted": 0, "completed": 0, "failed": 0, "cancelled": 0, "dropped": 0}
+        self._max_queue_depth = 0
+
+    def submit(self, action, *args, priority=0, policy=REPLACE, name=None, **kwargs):
+        """
+        Schedule an action to run on a worker thread. Returns straight away.
+
+        Args:
+            action (callable): The action.
+            *args: Positional arguments for the action.
+            priority (int): Queued actions with a higher priority run first.
+            policy (str): REPLACE, QUEUE or DROP, see the class docstring.
+            name (str, optional): Used in messages and errors. Defaults to the action's name.
+            **kwargs: Keyword arguments for the action.
+
+        Returns:
+            ScheduledAction: The scheduled action, or None if it was dropped.
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Unsupported action policy: {policy}")
+        name = name or getattr(action, "__name__", repr(action))
+        scheduled = ScheduledAction(action, args, kwargs, name, priority, policy)
+        if _accepts_token(action):
+            scheduled.kwargs = {**kwargs, "cancel_token": scheduled.token}
+
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError("The action scheduler has been shut down")
+            self._counts["submitted"] += 1
+            if policy == DROP and self._busy():
+                self._counts["dropped"] += 1
+                if self.verbose:
+                    print(f"Dropped {name}, another action is running")
+                return None
+            if policy == REPLACE:
+                self._cancel_all()
+            heapq.heappush(self._queue, (-priority, next(self._sequence), scheduled))
+            self._max_queue_depth = max(self._max_queue_depth, len(self._queue))
+            if len(self._threads) < self.workers and len(self._running) + len(self._queue) > len(self._threads):
+                thread = threading.Thread(target=self._work, name=f"action_worker_{len(self._threads)}", daemon=True)
+                self._threads.append(thread)
+                thread.start()
+            self._condition.notify()
+        return scheduled
+
+    def _busy(self):
+        return any(not scheduled.cancelled for scheduled in self._running) or \
+            any(not scheduled.cancelled for _, _, scheduled in self._queue)
+
+    @property
+    def busy(self):
+        """Whether an action is queued, or running and not cancelled."""
+        with self._condition:
+            return self._busy()
+
+    def _cancel_all(self):
+        cancelled = False
+        for scheduled in self._running:
+            if not scheduled.cancelled:
+                scheduled.token.cancel()
+                cancelled = True
+        for _, _, scheduled in self._queue:
+            scheduled.cancel()
+            self._counts["cancelled"] += 1
+            cancelled = True
+        self._queue = []
+        return cancelled
+
+    def cancel_all(self):
+        """
+        Cancel every running and queued action, without waiting for them.
+
+        Returns:
+            bool: True if there was anything to cancel.
+        """
+        with self._condition:
+            return self._cancel_all()
+
+    def current_token(self):
+        """The CancellationToken of the action running on this thread, or None outside an action."""
+        return getattr(self._local, "scheduled", None) and self._local.scheduled.token
+
+    def _work(self):
+        while True:
+            with self._condition:
+                while not self._queue and not self._shutdown:
+                    self._condition.wait()
+                if self._shutdown:
+                    return
+                _, _, scheduled = heapq.heappop(self._queue)
+                if not scheduled.future.set_running_or_notify_cancel():
+                    self._counts["cancelled"] += 1  # Cancelled through its ScheduledAction while queued
+                    continue
+                scheduled.started = time.perf_counter()
+                self._queue_waits.append(scheduled.started - scheduled.submitted)
+                self._running.add(scheduled)
+            self._run(scheduled)
+
+    def _run(self, scheduled):
+        self._local.scheduled = scheduled
+        try:
+            result = scheduled.action(*scheduled.args, **scheduled.kwargs)
+        except Exception as e:
+            outcome = "failed"
+            scheduled.future.set_exception(e)
+            if self.verbose:
+                import traceback
+                traceback.print_exc()
+            else:
+                print(f"Error running {scheduled.name}: {e}")
+        else:
+            outcome = "cancelled" if scheduled.cancelled else "completed"
+            scheduled.future.set_result(result)
+        finally:
+            self._local.scheduled = None
+            with self._condition:
+                self._running.discard(scheduled)
+                self._run_times.append(time.perf_counter() - scheduled.started)
+                self._counts[outcome] += 1
+
+    def metrics(self):
+        """
+        Queue depth, latency and outcome counts.
+
+        Returns:
+            dict: The queue depth now and at its deepest, the actions running, the median and 95th
+                percentile seconds actions waited in the queue and ran for (None before any ran),
+                and how many actions were submitted, completed, failed, cancelled and dropped.
+        """
+        def percentile(times, fraction):
+            if not times:
+                return None
+            times = sorted(times)
+            return times[min(len(times) - 1, int(fraction * len(times)))]
+
+        with self._condition:
+            queue_waits = list(self._queue_waits)
+            run_times = list(self._run_times)
+            return {
+                "queue_depth": len(self._queue),
+                "max_queue_depth": self._max_queue_depth,
+                "running": len(self._running),
+                "queue_wait_p50": percentile(queue_waits, 0.5),
+                "queue_wait_p95": percentile(queue_waits, 0.95),
+                "run_time_p50": percentile(run_times, 0.5),
+                "run_time_p95": percentile(run_times, 0.95),
+                **self._counts,
+            }
+
+    def shutdown(self):
+        """Cancel everything and stop the workers once their current action returns, without waiting for them."""
+        with self._condition:
+            self._cancel_all()
+            self._shutdown = True
+            self._condition.notify_all()
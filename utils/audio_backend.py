@@ -0,0 +1,357 @@
+import sys
+import threading
+import time
+import weakref
+from collections import deque
+import numpy as np
+from config_loader import config
+from utils.resampler import StreamingResampler
+
+def _reinitialise_owners(owners, lock, rescan):
+    """
+    Close the streams of every owner, run rescan, then let the owners reopen their streams.
+
+    Args:
+        owners (weakref.WeakSet): Objects with close_streams() and reopen_streams() methods.
+        lock (threading.Lock): Held throughout, so two reinitialisations never overlap.
+        rescan (callable): Does the actual reinitialisation, with no stream open.
+    """
+    with lock:
+        owners = list(owners)
+        for owner in owners:
+            owner.close_streams()
+        try:
+            rescan()
+        finally:
+            for owner in owners:
+                try:
+                    owner.reopen_streams()
+                except Exception as e:
+                    print(f"Error reopening audio stream after re-scanning devices: {e}")
+
+class SoundDeviceBackend:
+    """
+    Audio input and output through PortAudio, using sounddevice.
+
+    sounddevice is only imported when this backend is created, so the simulated backend works on
+    machines without PortAudio installed.
+    """
+    name = "sounddevice"
+
+    def __init__(self, verbose=False):
+        import sounddevice as sd
+        self.verbose = verbose
+        self._sd = sd
+        self.Error = sd.PortAudioError
+        self.CallbackStop = sd.CallbackStop
+        self._stream_owners = weakref.WeakSet()
+        self._reinitialise_lock = threading.Lock()
+
+        # Load ALSA library and set error handler for Linux, it prints a wall of warnings while PortAudio probes devices
+        self._asound = None
+        if sys.platform.startswith('linux'):
+            from ctypes import CFUNCTYPE, c_char_p, c_int, cdll
+            try:
+                self._asound = cdll.LoadLibrary('libasound.so')
+                self._c_error_handler = CFUNCTYPE(None, c_char_p, c_int, c_char_p, c_int, c_char_p)(self._alsa_error_handler)
+                self._asound.snd_lib_error_set_handler(self._c_error_handler)
+            except OSError:
+                self._asound = None
+
+    def _alsa_error_handler(self, filename, line, function, err, fmt):
+        """A custom error handler to suppress ALSA error messages."""
+        pass
+
+    def query_devices(self, kind=None):
+        """Return every device, or the default 'input' or 'output' device, as sounddevice device dicts."""
+        return self._sd.query_devices(kind=kind)
+
+    def check_input_settings(self, **kwargs):
+        """Raise an error if the input device does not accept the settings, see sounddevice.check_input_settings."""
+        self._sd.check_input_settings(**kwargs)
+
+    def input_stream(self, **kwargs):
+        """Create a callback-mode input stream, taking the arguments of sounddevice.InputStream."""
+        return self._sd.InputStream(**kwargs)
+
+    def output_stream(self, **kwargs):
+        """Create a callback-mode output stream, taking the arguments of sounddevice.OutputStream."""
+        return self._sd.OutputStream(**kwargs)
+
+    def add_stream_owner(self, owner):
+        """
+        Register something that keeps streams open, e.g. the AudioMixer or AudioRecorder, so `reinitialise`
+        can close them first. The owner needs close_streams() and reopen_streams() methods, and is held weakly.
+        """
+        self._stream_owners.add(owner)
+
+    def reinitialise(self):
+        """
+        Re-scan the audio devices. PortAudio only does so when it is initialised, so this reinitialises it.
+
+        Terminating PortAudio with a stream open would leave its owner holding a dead stream, so every
+        registered owner's streams are closed first and reopened afterwards.
+        """
+        _reinitialise_owners(self._stream_owners, self._reinitialise_lock, self._rescan)
+
+    def _rescan(self):
+        self._sd._terminate()
+        self._sd._initialize()
+
+
+class SimulatedAudioError(Exception):
+    """An error from the simulated audio backend."""
+    pass
+
+
+class _CallbackStop(Exception):
+    """Raised from a simulated stream's callback to stop the stream."""
+    pass
+
+
+class _CallbackFlags:
+    """Stands in for sounddevice.CallbackFlags. A simulated device never overflows."""
+    input_overflow = False
+    input_underflow = False
+    output_underflow = False
+
+    def __bool__(self):
+        return False
+
+
+class _SimulatedStream:
+    """A callback-mode stream driven by a thread at the rate a sound card would call back."""
+    def __init__(self, backend, kind, samplerate, channels, dtype, blocksize, callback, finished_callback):
+        self.backend = backend
+        self.kind = kind
+        self.samplerate = samplerate
+        self.channels = channels
+        self.dtype = np.dtype(dtype)
+        self.blocksize = blocksize or 512
+        self.callback = callback
+        self.finished_callback = finished_callback
+        self._stopping = threading.Event()
+        self._thread = None
+
+    @property
+    def active(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.active:
+            return
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name=f"simulated_{self.kind}_stream", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        period = self.blocksize / self.samplerate / self.backend.speed
+        flags = _CallbackFlags()
+        next_time = time.monotonic()
+        try:
+            while not self._stopping.is_set():
+                if self.kind == "input":
+                    block = self.backend._read_microphone(self.blocksize, self.samplerate)
+                    indata = np.repeat(block[:, None], self.channels, axis=1).astype(self.dtype)
+                    self.callback(indata, self.blocksize, None, flags)
+                else:
+                    outdata = np.zeros((self.blocksize, self.channels), dtype=self.dtype)
+                    self.callback(outdata, self.blocksize, None, flags)
+                    self.backend._capture_playback(outdata, self.samplerate)
+                next_time += period
+                delay = next_time - time.monotonic()
+                if delay > 0:
+                    self._stopping.wait(delay)
+                else:
+                    next_time = time.monotonic()  # Fell behind, e.g. a slow callback, carry on from now
+        except _CallbackStop:
+            pass
+        finally:
+            if self.finished_callback is not None:
+                self.finished_callback()
+
+    def stop(self):
+        """Stop the stream, waiting for the callback in progress to finish like PortAudio does."""
+        self._stopping.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def close(self):
+        self.stop()
+
+
+class SimulatedAudioBackend:
+    """
+    Audio input and output without sound hardware, for running the whole pipeline headless.
+
+    The simulated microphone plays audio files queued with `feed` in real time, and silence between them.
+    Everything sent to the simulated speakers is captured with the time each block was played, so the
+    latency from the end of a spoken question to the first sound of the answer can be measured.
+    """
+    name = "simulated"
+    Error = SimulatedAudioError
+    CallbackStop = _CallbackStop
+
+    def __init__(self, input_samplerate=16000, output_samplerate=48000, output_channels=2, speed=1.0, verbose=False):
+        """
+        Initialize the SimulatedAudioBackend.
+
+        Args:
+            input_samplerate (int): The native sample rate of the simulated microphone.
+            output_samplerate (int): The native sample rate of the simulated speakers.
+            output_channels (int): Channels of the simulated speakers.
+            speed (float): How much faster than real time the streams run, 1 for real time.
+            verbose (bool): Whether to print verbose output.
+        """
+        self.speed = speed
+        self.verbose = verbose
+        self.input_device = {"name": "Simulated microphone", "index": 0, "max_input_channels": 1,
+                             "max_output_channels": 0, "default_samplerate": float(input_samplerate)}
+        self.output_device = {"name": "Simulated speakers", "index": 1, "max_input_channels": 0,
+                              "max_output_channels": output_channels, "default_samplerate": float(output_samplerate)}
+        self._lock = threading.Lock()
+        self._microphone = deque()  # [label, samples, position]
+        self.input_events = []  # (time, "start" or "end", label)
+        self.playback = []  # (time, samples) for every block that was not silent
+        self.reinitialisations = 0
+        self._stream_owners = weakref.WeakSet()
+        self._reinitialise_lock = threading.Lock()
+
+    def feed(self, audio, samplerate=None, label=None):
+        """
+        Queue audio to be heard by the simulated microphone, after anything already queued.
+
+        Args:
+            audio (str or numpy.ndarray): The path of an audio file, or int16 or float samples.
+            samplerate (int, optional): The sample rate of the samples, needed unless a file is given.
+            label (str, optional): Names the audio in input_events, the file name by default.
+        """
+        if isinstance(audio, str):
+            import soundfile as sf
+            label = label or audio
+            audio, samplerate = sf.read(audio, dtype='int16', always_2d=True)
+            audio = audio.mean(axis=1)
+        samples = np.asarray(audio)
+        if samples.dtype.kind == 'f':
+            samples = np.clip(samples * 32767, -32768, 32767)
+        samples = samples.astype(np.int16)
+        rate = int(self.input_device["default_samplerate"])
+        if samplerate and samplerate != rate:
+            resampler = StreamingResampler(samplerate, rate)
+            samples = np.concatenate((resampler.process(samples), resampler.flush()))
+        with self._lock:
+            self._microphone.append([label, samples, 0])
+
+    @property
+    def microphone_idle(self):
+        """Whether everything fed to the microphone has been heard."""
+        with self._lock:
+            return not self._microphone
+
+    def wait_for_input(self, timeout=None):
+        """Block until everything fed to the microphone has been heard, returning False on timeout."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.microphone_idle:
+            if deadline is not None and time.monotonic() > deadline:
+                return False
+            time.sleep(0.005)
+        return True
+
+    def first_sound_after(self, start_time):
+        """
+        Return when the speakers first played something at or after a time.
+
+        Args:
+            start_time (float): A time.monotonic() timestamp.
+
+        Returns:
+            float: The time.monotonic() timestamp of the first block that was not silent, or None.
+        """
+        with self._lock:
+            for played_at, _ in self.playback:
+                if played_at >= start_time:
+                    return played_at
+        return None
+
+    def played_audio(self):
+        """Return everything the speakers played as one array, leaving out the silence."""
+        with self._lock:
+            blocks = [samples for _, samples in self.playback]
+        if not blocks:
+            return np.zeros((0, self.output_device["max_output_channels"]), dtype=np.float32)
+        return np.concatenate(blocks)
+
+    def clear_playback(self):
+        """Forget the captured playback."""
+        with self._lock:
+            self.playback = []
+
+    def _read_microphone(self, frames, samplerate):
+        block = np.zeros(frames, dtype=np.int16)
+        filled = 0
+        with self._lock:
+            while filled < frames and self._microphone:
+                clip = self._microphone[0]
+                label, samples, position = clip
+                if position == 0:
+                    self.input_events.append((time.monotonic(), "start", label))
+                chunk = samples[position:position + frames - filled]
+                block[filled:filled + len(chunk)] = chunk
+                filled += len(chunk)
+                clip[2] += len(chunk)
+                if clip[2] >= len(samples):
+                    self._microphone.popleft()
+                    self.input_events.append((time.monotonic(), "end", label))
+        return block
+
+    def _capture_playback(self, outdata, samplerate):
+        if np.any(outdata):
+            with self._lock:
+                self.playback.append((time.monotonic(), outdata.copy()))
+
+    # The sounddevice interface
+
+    def query_devices(self, kind=None):
+        if kind == "input":
+            return self.input_device
+        if kind == "output":
+            return self.output_device
+        return [self.input_device, self.output_device]
+
+    def check_input_settings(self, device=None, samplerate=None, channels=None, dtype=None, **kwargs):
+        if channels is not None and channels > self.input_device["max_input_channels"]:
+            raise SimulatedAudioError(f"The simulated microphone has {self.input_device['max_input_channels']} channel")
+
+    def input_stream(self, samplerate, channels, dtype, blocksize=None, callback=None, finished_callback=None, **kwargs):
+        return _SimulatedStream(self, "input", samplerate, channels, dtype, blocksize, callback, finished_callback)
+
+    def output_stream(self, samplerate, channels, dtype, blocksize=None, callback=None, finished_callback=None, **kwargs):
+        return _SimulatedStream(self, "output", samplerate, channels, dtype, blocksize, callback, finished_callback)
+
+    def add_stream_owner(self, owner):
+        self._stream_owners.add(owner)
+
+    def reinitialise(self):
+        _reinitialise_owners(self._stream_owners, self._reinitialise_lock, self._rescan)
+
+    def _rescan(self):
+        self.reinitialisations += 1
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_audio_backend(verbose=False):
+    """Return the audio backend set in the config, shared by everything in the process."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            if config.AUDIO_BACKEND == "simulated":
+                _backend = SimulatedAudioBackend(verbose=verbose)
+                for path in config.SIMULATED_MICROPHONE_FILES:
+                    _backend.feed(path)
+            elif config.AUDIO_BACKEND == "sounddevice":
+                _backend = SoundDeviceBackend(verbose=verbose)
+            else:
+                raise ValueError(f"Unsupported AUDIO_BACKEND configured: {config.AUDIO_BACKEND}")
+        return _backend
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from config_loader import config
+
+class AudioCache:
+    """
+    Content addressed cache of synthesised speech, so a sentence that has been spoken before plays
+    straight away instead of waiting on the TTS engine again.
+
+    Audio is keyed on a hash of the engine, the voice settings and the sanitised text, and held as WAV
+    bytes in an in-memory LRU, backed by an on-disk LRU tier that survives restarts.
+    """
+    def __init__(self, directory, memory_bytes=32 * 2**20, disk_bytes=256 * 2**20, verbose=False):
+        """
+        Initialize the AudioCache.
+
+        Args:
+            directory (str): The folder the disk tier is kept in, created if it does not exist.
+            memory_bytes (int): The most audio kept in memory.
+            disk_bytes (int): The most audio kept on disk.
+            verbose (bool): Whether to print verbose output.
+        """
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self.verbose = verbose
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_size = 0
+
+        # The disk tier's LRU order is rebuilt from the files' modification times, which hits refresh
+        os.makedirs(directory, exist_ok=True)
+        files = []
+        for name in os.listdir(directory):
+            if name.endswith(".tmp"):
+                # Left behind by a write that never finished
+                try:
+                    os.remove(os.path.join(directory, name))
+                except OSError:
+                    pass
+            elif name.endswith(".wav"):
+                stat = os.stat(os.path.join(directory, name))
+                files.append((stat.st_mtime, name[:-4], stat.st_size))
+        self._disk = OrderedDict((key, size) for _, key, size in sorted(files))
+        self._disk_size = sum(self._disk.values())
+
+    @staticmethod
+    def key(engine, voice, text):
+        """
+        Build the key of a piece of speech.
+
+        Args:
+            engine (str): The TTS engine.
+            voice (dict): The settings that change how the engine sounds, e.g. voice and speed.
+            text (str): The sanitised text as it is sent to the engine.
+
+        Returns:
+            str: The key.
+        """
+        payload = json.dumps([engine, voice, text], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.wav")
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._memory or key in self._disk
+
+    def get(self, key):
+        """
+        Look up a piece of speech.
+
+        Args:
+            key (str): A key from `key`.
+
+        Returns:
+            bytes: The WAV data, or None if it is not cached.
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return self._memory[key]
+            on_disk = key in self._disk
+
+        if on_disk:
+            try:
+                with open(self._path(key), "rb") as audio_file:
+                    data = audio_file.read()
+                os.utime(self._path(key))
+            except OSError:
+                data = None
+            with self._lock:
+                if data is None:
+                    self._disk_size -= self._disk.pop(key, 0)
+                else:
+                    self._disk.move_to_end(key)
+                    self.hits += 1
+                    self._add_to_memory(key, data)
+                    return data
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, data):
+        """
+        Cache a piece of speech in memory and on disk, evicting the least recently used audio if needed.
+
+        Args:
+            key (str): A key from `key`.
+            data (bytes): The WAV data.
+        """
+        with self._lock:
+            self._add_to_memory(key, data)
+            if key in self._disk:
+                return
+
+        # A temporary file per write, so writes of the same key from two threads never share one
+        temp_path = None
+        try:
+            fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+            with os.fdopen(fd, "wb") as audio_file:
+                audio_file.write(data)
+            os.replace(temp_path, self._path(key))
+        except OSError as e:
+            if temp_path is not None:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+            if self.verbose:
+                print(f"Error saving audio to the cache: {e}")
+            return
+
+        evicted = []
+        with self._lock:
+            if key not in self._disk:
+                self._disk_size += len(data)
+            self._disk[key] = len(data)
+            while self._disk_size > self.disk_bytes and len(self._disk) > 1:
+                old_key, size = self._disk.popitem(last=False)
+                self._disk_size -= size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+    def _add_to_memory(self, key, data):
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return
+        self._memory[key] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes and len(self._memory) > 1:
+            _, old_data = self._memory.popitem(last=False)
+            self._memory_size -= len(old_data)
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_audio_cache(verbose=False):
+    """Return the process wide AudioCache, or None if it is turned off."""
+    global _cache
+    if not config.TTS_AUDIO_CACHE:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = AudioCache(config.TTS_AUDIO_CACHE_DIR,
+                                memory_bytes=int(config.TTS_AUDIO_CACHE_MEMORY_MB * 2**20),
+                                disk_bytes=int(config.TTS_AUDIO_CACHE_DISK_MB * 2**20),
+                                verbose=verbose)
+        return _cache
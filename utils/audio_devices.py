@@ -0,0 +1,120 @@
+import threading
+from utils.audio_backend import get_audio_backend
+
+class AudioDeviceManager:
+    """
+    Enumerates audio input devices once and caches the chosen microphone and its supported sample rates.
+
+    The device list is only re-enumerated when `refresh` is called, which the recorder does after a stream
+    fails to open or stops unexpectedly (e.g. a USB microphone was unplugged).
+    """
+    CANDIDATE_RATES = (16000, 48000, 44100, 32000, 22050, 8000)
+
+    def __init__(self, device_name=None, backend=None, verbose=False):
+        """
+        Initialize the AudioDeviceManager.
+
+        Args:
+            device_name (str, optional): Name, or part of the name, of the microphone to use. Uses the system default if None.
+            backend (optional): The audio backend to enumerate, see utils.audio_backend. The configured one by default.
+            verbose (bool): Whether to print verbose output.
+        """
+        self.device_name = device_name
+        self.verbose = verbose
+        self.backend = backend or get_audio_backend(verbose=verbose)
+        self._lock = threading.Lock()
+        self._devices = None
+        self._device = None
+        self._supported_rates = None
+        self._capture_rate = None
+
+    def list_input_devices(self):
+        """Return the cached list of input devices, enumerating them on first use."""
+        with self._lock:
+            if self._devices is None:
+                self._devices = [device for device in self.backend.query_devices() if device['max_input_channels'] > 0]
+            return self._devices
+
+    def get_input_device(self):
+        """
+        Get the microphone to record from.
+
+        Returns:
+            dict or None: The device info of the chosen microphone, or None if there is no input device.
+        """
+        if self._device is None:
+            self._device = self._choose_device()
+            self._supported_rates = None
+            self._capture_rate = None
+            if self.verbose and self._device is not None:
+                print(f"Using microphone: {self._device['name']}")
+        return self._device
+
+    def _choose_device(self):
+        """Pick the configured device by name, falling back to the system default."""
+        devices = self.list_input_devices()
+        if self.device_name:
+            for device in devices:
+                if self.device_name.lower() in device['name'].lower():
+                    return device
+            print(f"Microphone '{self.device_name}' not found, using the system default instead.")
+
+        try:
+            return self.backend.query_devices(kind='input')
+        except (self.backend.Error, ValueError):
+            return devices[0] if devices else None
+
+    def supported_rates(self):
+        """Return the cached list of sample rates the chosen device accepts for mono 16 bit capture."""
+        device = self.get_input_device()
+        if device is None:
+            return []
+        if self._supported_rates is None:
+            rates = []
+            for rate in self.CANDIDATE_RATES:
+                try:
+                    self.backend.check_input_settings(device=device['index'], samplerate=rate, channels=1, dtype='int16')
+                    rates.append(rate)
+                except Exception:
+                    continue
+            self._supported_rates = rates
+        return self._supported_rates
+
+    def capture_rate(self):
+        """
+        Return the rate to record at, which is the device's native rate whenever it accepts mono 16 bit capture at it.
+
+        Recording at the native rate avoids the OS (or ALSA's plug layer) resampling on our behalf.
+        """
+        device = self.get_input_device()
+        if device is None:
+            return None
+        if self._capture_rate is None:
+            native_rate = int(device['default_samplerate'])
+            try:
+                self.backend.check_input_settings(device=device['index'], samplerate=native_rate, channels=1, dtype='int16')
+                self._capture_rate = native_rate
+            except Exception:
+                rates = self.supported_rates()
+                self._capture_rate = rates[0] if rates else native_rate
+        return self._capture_rate
+
+    def refresh(self):
+        """
+        Re-enumerate the audio devices and forget the cached choice.
+
+        PortAudio only scans for devices when it is initialised, so this reinitialises the backend, which
+        closes the streams of its owners (the mixer and recorder) first and reopens them afterwards.
+        """
+        with self._lock:
+            if self.verbose:
+                print("Re-enumerating audio devices...")
+            try:
+                self.backend.reinitialise()
+            except Exception as e:
+                if self.verbose:
+                    print(f"Error reinitialising audio devices: {e}")
+            self._devices = None
+            self._device = None
+            self._supported_rates = None
+            self._capture_rate = None
@@ -0,0 +1,206 @@
+import threading
+from collections import deque
+import numpy as np
+from utils.audio_backend import get_audio_backend
+from utils.resampler import StreamingResampler
+
+class Voice:
+    """A sound queued on the AudioMixer. Can be waited on or cancelled from any thread."""
+    __slots__ = ('samples', 'position', 'cancelled', 'done')
+
+    def __init__(self, samples):
+        self.samples = samples
+        self.position = 0
+        self.cancelled = False
+        self.done = threading.Event()
+
+    def cancel(self):
+        """Stop the sound at the next audio block, which fades it out so it does not click."""
+        self.cancelled = True
+
+    def wait(self, timeout=None):
+        """Block until the sound has finished playing or was cancelled."""
+        return self.done.wait(timeout)
+
+
+class AudioMixer:
+    """
+    Plays any number of overlapping sounds through one shared callback-mode output stream.
+
+    Opening an output device takes tens of milliseconds, so the stream is kept open between sounds
+    and only closed after `idle_timeout` seconds of silence. New sounds are handed to the audio
+    callback through a deque, so the callback never waits on a lock.
+    """
+    def __init__(self, block_size=256, idle_timeout=30, backend=None, verbose=False):
+        """
+        Initialize the AudioMixer.
+
+        Args:
+            block_size (int): Frames per audio callback, this bounds how long a new sound waits to start.
+            idle_timeout (float): Seconds of silence after which the output stream is closed.
+            backend (optional): The audio backend to play through, see utils.audio_backend. The configured one by default.
+            verbose (bool): Whether to print verbose output.
+        """
+        self.verbose = verbose
+        self.block_size = block_size
+        self.idle_timeout = idle_timeout
+        self._pending = deque()
+        self._active = []
+        self._idle_frames = 0
+        self._stream = None
+        self._stream_lock = threading.Lock()
+        self._fade_out = np.linspace(1, 0, block_size, dtype=np.float32)[:, None]
+
+        try:
+            self.backend = backend or get_audio_backend(verbose=verbose)
+            device = self.backend.query_devices(kind='output')
+            self.samplerate = int(device['default_samplerate'])
+            # Limit the number of channels to avoid 'invalid number of channels' errors
+            self.channels = min(2, device['max_output_channels'])
+            self.available = self.channels > 0
+            self.backend.add_stream_owner(self)
+        except Exception:
+            self.backend = None
+            self.samplerate = 0
+            self.channels = 0
+            self.available = False  # No output devices
+
+    def prepare(self, samples, samplerate):
+        """
+        Convert audio to the mixer's sample rate and channel count so it can be played without further work.
+
+        Args:
+            samples (numpy.ndarray): Float audio in the range -1 to 1, shaped (frames,) or (frames, channels).
+            samplerate (int): The sample rate of the audio.
+
+        Returns:
+            numpy.ndarray: float32 audio shaped (frames, mixer channels).
+        """
+        samples = np.asarray(samples, dtype=np.float32)
+        if samples.ndim == 1:
+            samples = samples[:, None]
+
+        if samples.shape[1] != self.channels:
+            mono = samples.mean(axis=1, keepdims=True)
+            samples = np.repeat(mono, self.channels, axis=1)
+
+        if samplerate != self.samplerate:
+            converted = []
+            for channel in samples.T:
+                resampler = StreamingResampler(samplerate, self.samplerate)
+                pcm = np.clip(channel * 32767, -32768, 32767).astype(np.int16)
+                converted.append(np.concatenate((resampler.process(pcm), resampler.flush())))
+            samples = np.stack(converted, axis=1).astype(np.float32) / 32767
+
+        return np.ascontiguousarray(samples)
+
+    def play(self, samples):
+        """
+        Start playing prepared audio, mixed with anything already playing.
+
+        Args:
+            samples (numpy.ndarray): Audio returned by `prepare`.
+
+        Returns:
+            Voice or None: A handle for the sound, or None if there is no output device.
+        """
+        if not self.available:
+            return None
+        voice = Voice(samples)
+        self._pending.append(voice)
+        try:
+            self._ensure_stream()
+        except Exception as e:
+            voice.done.set()
+            if self.verbose:
+                import traceback
+                traceback.print_exc()
+            else:
+                print(f"An error occurred while opening the audio output: {e}")
+        return voice
+
+    def stop_all(self):
+        """Cancel every sound that is playing or waiting to play."""
+        for voice in list(self._pending) + list(self._active):
+            voice.cancel()
+
+    def close_streams(self):
+        """Close the output stream, called by the backend before it reinitialises. Sounds playing now are cut off."""
+        with self._stream_lock:
+            if self._stream is not None:
+                try:
+                    self._stream.close()
+                except Exception as e:
+                    if self.verbose:
+                        print(f"Error closing the audio output: {e}")
+                self._stream = None
+            self._finished()
+
+    def reopen_streams(self):
+        """Reopen the output stream after the backend reinitialised, if a sound is waiting to play."""
+        if self._pending:
+            self._ensure_stream()
+
+    def _ensure_stream(self):
+        """Open the output stream if it is not already running."""
+        with self._stream_lock:
+            if self._stream is not None and self._stream.active:
+                return
+            if self._stream is not None:
+                self._stream.close()
+            self._idle_frames = 0
+            self._stream = self.backend.output_stream(samplerate=self.samplerate, channels=self.channels, dtype='float32',
+                                                   blocksize=self.block_size, latency='low', callback=self._callback,
+                                                   finished_callback=self._finished)
+            self._stream.start()
+
+    def _callback(self, outdata, frames, time_info, status):
+        """Called by the audio backend for each output block, sums every active voice into it."""
+        while self._pending:
+            self._active.append(self._pending.popleft())
+
+        outdata.fill(0)
+        if not self._active:
+            self._idle_frames += frames
+            if self._idle_frames >= self.idle_timeout * self.samplerate and not self._pending:
+                raise self.backend.CallbackStop
+            return
+        self._idle_frames = 0
+
+        still_playing = []
+        for voice in self._active:
+            chunk = voice.samples[voice.position:voice.position + frames]
+            if not voice.cancelled:
+                outdata[:len(chunk)] += chunk
+                voice.position += len(chunk)
+                if voice.position < len(voice.samples):
+                    still_playing.append(voice)
+                    continue
+            elif voice.position:
+                # Cut off part way, ramp down over this block rather than stopping dead
+                if len(self._fade_out) != frames:
+                    self._fade_out = np.linspace(1, 0, frames, dtype=np.float32)[:, None]
+                outdata[:len(chunk)] += chunk * self._fade_out[:len(chunk)]
+            voice.done.set()
+        self._active = still_playing
+
+        # Overlapping sounds can sum past full scale
+        np.clip(outdata, -1.0, 1.0, out=outdata)
+
+    def _finished(self):
+        """Release anything still waiting on sounds when the stream stops."""
+        for voice in self._active:
+            voice.done.set()
+        self._active = []
+
+
+_mixer = None
+_mixer_lock = threading.Lock()
+
+def get_mixer(verbose=False):
+    """Return the AudioMixer shared by everything in the process, creating it on first use."""
+    global _mixer
+    with _mixer_lock:
+        if _mixer is None:
+            _mixer = AudioMixer(verbose=verbose)
+        return _mixer
@@ -0,0 +1,70 @@
+import threading
+import time
+
+class BackgroundLoader:
+    """
+    Runs a slow setup function (importing an SDK, loading a model) on a background thread so startup
+    can carry on, and lets the first user of the result wait for it to finish.
+    """
+    _loaders = []
+
+    def __init__(self, target, name, verbose=False):
+        """
+        Start running target in the background.
+
+        Args:
+            target (callable): The setup function to run. Its return value is available from `wait`.
+            name (str): A short description used in messages and the startup profile.
+            verbose (bool): Whether to print verbose output.
+        """
+        self.target = target
+        self.name = name
+        self.verbose = verbose
+        self.elapsed = None
+        self._result = None
+        self._error = None
+        self._done = threading.Event()
+        BackgroundLoader._loaders.append(self)
+        threading.Thread(target=self._run, name=f"load {name}", daemon=True).start()
+
+    def _run(self):
+        start_time = time.perf_counter()
+        try:
+            self._result = self.target()
+        except Exception as e:
+            self._error = e
+            if self.verbose:
+                import traceback
+                traceback.print_exc()
+            else:
+                print(f"Failed to load {self.name}: {e}")
+        finally:
+            self.elapsed = time.perf_counter() - start_time
+            if self.verbose and self._error is None:
+                print(f"Loaded {self.name} in {self.elapsed:.2f}s")
+            self._done.set()
+
+    @property
+    def done(self):
+        """True once the setup function has finished, successfully or not."""
+        return self._done.is_set()
+
+    def wait(self):
+        """
+        Block until the setup function has finished.
+
+        Returns:
+            The setup function's return value.
+
+        Raises:
+            Exception: The exception raised by the setup function, if it failed.
+        """
+        self._done.wait()
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+    @classmethod
+    def all_loaders(cls):
+        """Return every loader that has been started in this process."""
+        return list(cls._loaders)
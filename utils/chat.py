@@ -1,8 +1,9 @@
+import threading
 from typing import Union, List, Dict, Callable, Optional, Any
 from llm_apis.base_client import BaseClient
 import config
 from utils import prompt
-from utils.utils import maintain_token_limit
+from utils.utils import maintain_token_limit, cache_token_count, get_capability_registry
 
 
 class Chat:
@@ -21,6 +22,12 @@ class Chat:
         message_callbacks (List[Callable]): A list of callbacks that modify the message list.
             Each callback should accept the current message list as its only parameter and
             return a new message list.
+        store (Optional[ConversationStore]): If provided, every message is saved to it so the conversation can be resumed.
+        conversation_id (Optional[str]): The id the current conversation is saved under, assigned on its first message.
+        compactor (Optional[HistoryCompactor]): If provided, the oldest messages are summarised in the background
+            after each reply, rather than being dropped once the prompt reaches max_prompt_tokens.
+        history_summary (Optional[str]): The summary of the messages the compactor has replaced, added to the system prompt.
+        response_cache (Optional[ResponseCache]): If provided, responses to repeated prompts are replayed from it.
     """
 
     def __init__(self,
@@ -32,7 +39,10 @@ class Chat:
                  system_prompt: str = "",
                  system_prompt_filename: Optional[str] = None,
                  message_callbacks: Optional[List[Callable[[List[Dict[str, Union[str, list]]]], 
-                                                        List[Dict[str, Union[str, list]]]]]] = None):
+                                                        List[Dict[str, Union[str, list]]]]]] = None,
+                 store: Optional[Any] = None,
+                 compactor: Optional[Any] = None,
+                 response_cache: Optional[Any] = None):
         """
         Initialize the Chat object.
 
@@ -46,6 +56,9 @@ class Chat:
             system_prompt_filename (str, optional): Filename for the system prompt. If provided, it overwrites system_prompt.
             message_callbacks (List[Callable], optional): A list of functions that will be applied to the message
                 list each time a new message is added.
+            store (ConversationStore, optional): A store to save the conversation to as messages are added.
+            compactor (HistoryCompactor, optional): Summarises the oldest messages once the conversation grows long.
+            response_cache (ResponseCache, optional): A cache of responses to replay when the same prompt is sent again.
         """
         if completion_params is None:
             completion_params = {'temperature': 0.7, 'max_tokens': 2048}
@@ -57,6 +70,13 @@ class Chat:
         self.tts_callback = tts_callback
         self.system_prompt = system_prompt
         self.system_prompt_filename = system_prompt_filename
+        self.store = store
+        self.conversation_id = None
+        self.compactor = compactor
+        self.history_summary = None
+        self.response_cache = response_cache
+        # The compactor edits the history from its own thread
+        self._lock = threading.Lock()
 
         # Store the list of callbacks or initialize as an empty list if not provided.
         self.message_callbacks: List[Callable[[List[Dict[str, Union[str, list]]]],
@@ -107,12 +127,25 @@ class Chat:
         completion_params = completion_params or self.completion_params
         messages = messages or self.messages
 
-        # Update system prompt from file if applicable.
-        if self.system_prompt_filename:
-            prompt.update_system_prompt_in_messages(self.system_prompt_filename)
+        with self._lock:
+            # Update system prompt from file if applicable.
+            if self.system_prompt_filename:
+                prompt.update_system_prompt_in_messages(self.system_prompt_filename, self.messages)
+
+            # Maintain token limit for the conversation messages.
+            messages = maintain_token_limit(self._with_history_summary(self.messages), max_prompt_tokens, model)
 
-        # Maintain token limit for the conversation messages.
-        messages = maintain_token_limit(self.messages, max_prompt_tokens)
+        # A cached response is replayed through the same processing, so TTS and markers behave as if it was streamed
+        cache_key = None
+        if self.response_cache is not None:
+            cache_key = self.response_cache.key(model, completion_params, messages)
+            cached_response = self.response_cache.get(cache_key) if cache_key else None
+            if cached_response is not None:
+                return completions_api_client.process_text_stream(
+                    iter([cached_response]),
+                    marker_tuples=marker_tuples,
+                    tts_callback=tts_callback
+                )
 
         # Get the stream of completions from the API.
         stream = completions_api_client.get_completion_stream(
@@ -127,6 +160,9 @@ class Chat:
             marker_tuples=marker_tuples,
             tts_callback=tts_callback
         )
+
+        if cache_key and response:
+            self.response_cache.put(cache_key, model, response)
         return response
 
     def add_message(self, role: str, content: Union[str, list]) -> None:
@@ -141,11 +177,64 @@ class Chat:
             role (str): The role of the message sender (e.g., 'user', 'assistant', 'system').
             content (Union[str, list]): The content of the message.
         """
-        self.messages.append({"role": role, "content": content})
+        with self._lock:
+            self.messages.append({"role": role, "content": content})
+
+            # Process the messages through each callback sequentially.
+            for callback in self.message_callbacks:
+                self.messages = callback(self.messages)
+
+        # Save the message as the callbacks left it, the write happens on the store's own thread
+        if self.store is not None and role != "system":
+            if self.conversation_id is None:
+                self.conversation_id = self.store.new_conversation_id()
+            self.store.append_message(self.conversation_id, self.messages[-1], self.model)
+
+        # The reply is finished, so this is idle time until the user speaks again
+        if self.compactor is not None and role == "assistant":
+            self.compactor.compact_in_background(self)
+
+    def remove_last_message(self) -> None:
+        """
+        Remove the most recent message from the conversation history, and from the store if one is set.
+        """
+        with self._lock:
+            if not self.messages:
+                return
+            removed = self.messages.pop()
+        if self.store is not None and self.conversation_id is not None and removed.get("role") != "system":
+            self.store.delete_last_message(self.conversation_id)
+
+    def resume_last_conversation(self) -> bool:
+        """
+        Replace the current conversation with the most recently saved one.
+
+        The system prompt is rebuilt as for a new chat, and the saved token counts are reused so the
+        resumed history does not have to be tokenised again.
+
+        Returns:
+            bool: True if a conversation was resumed, False if there was nothing to resume.
+        """
+        if self.store is None:
+            return False
+        conversation_id, saved_messages, token_counts = self.store.load_last_conversation()
+        if conversation_id is None:
+            return False
+
+        tokenizer = get_capability_registry().lookup(self.model).tokenizer
+        for message, (token_count, saved_tokenizer) in zip(saved_messages, token_counts):
+            if token_count is not None and saved_tokenizer == tokenizer:
+                cache_token_count(message, self.model, token_count)
+
+        self.clear_chat()
+        with self._lock:
+            self.messages = (self.messages or []) + saved_messages
+        self.conversation_id = conversation_id
 
-        # Process the messages through each callback sequentially.
-        for callback in self.message_callbacks:
-            self.messages = callback(self.messages)
+        # A long resumed conversation can be summarised before the user's next message
+        if self.compactor is not None:
+            self.compactor.compact_in_background(self)
+        return True
 
     def clear_chat(self) -> None:
         """
@@ -155,8 +244,55 @@ class Chat:
         with the initial system prompt; otherwise, it is cleared completely.
         """
         if self.system_prompt_filename:
-            self.messages = prompt.build_initial_messages_from_prompt_name(config.ACTIVE_PROMPT)
+            messages = prompt.build_initial_messages_from_prompt_name(config.ACTIVE_PROMPT)
         elif self.system_prompt:
-            self.messages = [{"role": "system", "content": self.system_prompt}]
+            messages = [{"role": "system", "content": self.system_prompt}]
         else:
-            self.messages = []
+            messages = []
+        with self._lock:
+            self.messages = messages
+            self.history_summary = None
+        self.conversation_id = None
+
+    def history_snapshot(self):
+        """
+        Return a copy of the message list and the current history summary, for the compactor to work on.
+
+        Returns:
+            tuple: (messages, history_summary)
+        """
+        with self._lock:
+            return list(self.messages), self.history_summary
+
+    def replace_history(self, replaced_messages: List[Dict[str, Union[str, list]]], summary: str) -> bool:
+        """
+        Replace a run of the oldest messages with a summary of them.
+
+        Args:
+            replaced_messages (list): The messages the summary covers, as returned by history_snapshot.
+            summary (str): The new history summary, which also covers the previous one.
+
+        Returns:
+            bool: False if the messages are no longer in the history, e.g. because the chat was cleared.
+        """
+        with self._lock:
+            start = next((i for i, message in enumerate(self.messages) if message is replaced_messages[0]), None)
+            if start is None:
+                return False
+            current = self.messages[start:start + len(replaced_messages)]
+            if len(current) != len(replaced_messages) or any(a is not b for a, b in zip(current, replaced_messages)):
+                return False
+            del self.messages[start:start + len(replaced_messages)]
+            self.history_summary = summary
+            return True
+
+    def _with_history_summary(self, messages):
+        """Return the messages with the history summary added to the system prompt, leaving the originals unchanged."""
+        if not self.history_summary:
+            return messages
+        summary = f"Summary of the earlier part of this conversation:\n{self.history_summary}"
+        for i, message in enumerate(messages):
+            if message.get("role") == "system":
+                return messages[:i] + [{**message, "content": f"{message['content']}\n\n{summary}"}] + messages[i + 1:]
+        return [{"role": "system", "content": summary}] + messages
+
@@ -0,0 +1,377 @@
+import atexit
+import json
+import re
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+from config_loader import config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS conversations (
+    id TEXT PRIMARY KEY,
+    started_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    conversation_id TEXT NOT NULL REFERENCES conversations(id),
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    is_json INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    token_count INTEGER,
+    tokenizer TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_messages_conversation ON messages(conversation_id, id);
+CREATE INDEX IF NOT EXISTS idx_messages_created ON messages(created_at);
+CREATE INDEX IF NOT EXISTS idx_conversations_updated ON conversations(updated_at);
+CREATE TABLE IF NOT EXISTS transcripts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    text TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+# Messages are indexed under their own id and transcripts under their negated id
+SEARCH_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+    text, role UNINDEXED, conversation_id UNINDEXED, created_at UNINDEXED,
+    tokenize = 'porter unicode61'
+);
+"""
+
+SearchResult = namedtuple('SearchResult', ['role', 'snippet', 'conversation_id', 'created_at', 'score'])
+
+# Words too common to be worth matching on
+STOPWORDS = frozenset("""
+a about above after again all also am an and any are as at be because been before being below between both but by
+can could did do does doing down during each few for from further had has have having he her here hers him his how i
+if in into is it its just me more most my no nor not now of off on once only or other our out over own same she should
+so some such than that the their them then there these they this those through to too under until up very was we were
+what when where which while who whom why will with would you your yours tell said say says remember talk talked
+""".split())
+
+class ConversationStore:
+    """
+    Saves conversations to an SQLite database so they survive a restart and can be resumed.
+
+    Writes are queued to a single writer thread, so saving a message never holds up a voice turn.
+    Each message is one appended row, stored with its token count so a resumed conversation does
+    not need to be tokenised again. The database runs in WAL mode, so reads never wait on the writer.
+
+    Messages and transcripts are also added to an FTS5 full text index in the same transaction as
+    the row itself, so the index is always up to date without ever being rebuilt.
+    """
+    def __init__(self, path, verbose=False):
+        """
+        Initialize the ConversationStore.
+
+        Args:
+            path (str): Path of the SQLite database file, created if it does not exist.
+            verbose (bool): Whether to print verbose output.
+        """
+        self.path = path
+        self.verbose = verbose
+        self._queue = queue.Queue()
+        self._read_lock = threading.Lock()
+        self._read_connection = None
+        self._write_hooks = []
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        connection = self._connect()
+        connection.executescript(SCHEMA)
+        try:
+            connection.executescript(SEARCH_SCHEMA)
+            self.search_available = True
+            with connection:
+                self._index_unindexed_messages(connection)
+        except sqlite3.OperationalError as e:
+            # SQLite builds without FTS5 can still save and resume conversations
+            self.search_available = False
+            if self.verbose:
+                print(f"Full text search unavailable: {e}")
+        connection.close()
+
+        self._writer = threading.Thread(target=self._write_loop, name="conversation_store", daemon=True)
+        self._writer.start()
+        atexit.register(self.close)
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, check_same_thread=False)
+        connection.execute("PRAGMA journal_mode=WAL")
+        # WAL keeps the database consistent without a sync on every commit
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def new_conversation_id(self):
+        """Return an id for a new conversation, its row is created with the first message."""
+        return uuid.uuid4().hex
+
+    def append_message(self, conversation_id, message, model=None):
+        """
+        Queue a message to be saved at the end of a conversation.
+
+        Args:
+            conversation_id (str): The conversation the message belongs to.
+            message (dict): The message, with 'role' and 'content' keys.
+            model (str, optional): The model the conversation uses, its tokenizer is used to count the message's tokens.
+        """
+        self._queue.put(("append", conversation_id, dict(message), model, time.time()))
+
+    def delete_last_message(self, conversation_id):
+        """Queue removal of the most recent message of a conversation, e.g. a user message that got no reply."""
+        self._queue.put(("delete_last", conversation_id))
+
+    def add_write_hook(self, hook):
+        """
+        Register a function to be called on the writer thread after each message or transcript is saved.
+
+        Args:
+            hook (callable): Called with (entry_id, role, text, created_at). Message ids are positive and transcript
+                ids negative, matching get_entries. It must return quickly, later writes wait on it.
+        """
+        self._write_hooks.append(hook)
+
+    def get_entries(self, entry_ids):
+        """
+        Look up saved messages and transcripts by id.
+
+        Args:
+            entry_ids (list): Ids as passed to write hooks, positive for messages and negative for transcripts.
+
+        Returns:
+            dict: Maps each id that still exists to a SearchResult whose snippet is the full text and score is None.
+        """
+        message_ids = [entry_id for entry_id in entry_ids if entry_id > 0]
+        transcript_ids = [-entry_id for entry_id in entry_ids if entry_id < 0]
+        entries = {}
+        with self._read_lock:
+            connection = self._reader()
+            if message_ids:
+                rows = connection.execute(
+                    f"SELECT id, role, content, is_json, conversation_id, created_at FROM messages "
+                    f"WHERE id IN ({','.join('?' * len(message_ids))})", message_ids).fetchall()
+                for message_id, role, content, is_json, conversation_id, created_at in rows:
+                    text = _message_text(json.loads(content) if is_json else content)
+                    entries[message_id] = SearchResult(role, text, conversation_id, created_at, None)
+            if transcript_ids:
+                rows = connection.execute(
+                    f"SELECT id, text, created_at FROM transcripts WHERE id IN ({','.join('?' * len(transcript_ids))})",
+                    transcript_ids).fetchall()
+                for transcript_id, text, created_at in rows:
+                    entries[-transcript_id] = SearchResult("transcript", text, None, created_at, None)
+        return entries
+
+    def messages_after(self, message_id, limit=1000):
+        """
+        Return saved messages with an id greater than message_id, oldest first.
+
+        Returns:
+            list: (message_id, role, text, created_at) tuples.
+        """
+        with self._read_lock:
+            rows = self._reader().execute(
+                "SELECT id, role, content, is_json, created_at FROM messages WHERE id > ? ORDER BY id LIMIT ?",
+                (message_id, limit)).fetchall()
+        return [(row_id, role, _message_text(json.loads(content) if is_json else content), created_at)
+                for row_id, role, content, is_json, created_at in rows]
+
+    def add_transcript(self, text):
+        """Queue a transcript that was not part of a conversation (e.g. dictation) to be saved and indexed."""
+        self._queue.put(("transcript", text, time.time()))
+
+    def search(self, query, limit=5, since=None, snippet_tokens=32):
+        """
+        Find the saved messages and transcripts that best match a query.
+
+        Args:
+            query (str): Free text, e.g. the user's latest message. It is reduced to its keywords.
+            limit (int): The maximum number of results.
+            since (float, optional): Only return results created after this unix time.
+            snippet_tokens (int): The length of the snippet returned for each result, in words.
+
+        Returns:
+            list: SearchResult tuples, best match first. Empty if nothing matches or search is unavailable.
+        """
+        match_query = self.build_match_query(query)
+        if not self.search_available or not match_query:
+            return []
+
+        sql = ("SELECT role, snippet(search_index, 0, '', '', '...', ?), conversation_id, created_at, "
+               "bm25(search_index) AS score FROM search_index WHERE search_index MATCH ?")
+        parameters = [snippet_tokens, match_query]
+        if since is not None:
+            sql += " AND created_at >= ?"
+            parameters.append(since)
+        sql += " ORDER BY score LIMIT ?"
+        parameters.append(limit)
+
+        with self._read_lock:
+            rows = self._reader().execute(sql, parameters).fetchall()
+        return [SearchResult(*row) for row in rows]
+
+    @staticmethod
+    def build_match_query(text, max_terms=12):
+        """Turn free text into an FTS5 query that matches any of its keywords."""
+        terms = []
+        for word in re.findall(r"\w+", text.lower()):
+            if len(word) > 2 and word not in STOPWORDS and word not in terms:
+                terms.append(word)
+        return " OR ".join(f'"{term}"' for term in terms[:max_terms])
+
+    def flush(self):
+        """Block until every queued write has been committed."""
+        self._queue.join()
+
+    def load_last_conversation(self):
+        """
+        Load the most recently updated conversation.
+
+        Returns:
+            tuple: (conversation_id, messages, token_counts) where token_counts holds (count, tokenizer) per message,
+                or (None, [], []) if nothing has been saved yet.
+        """
+        self.flush()
+        with self._read_lock:
+            connection = self._reader()
+            row = connection.execute("SELECT id FROM conversations ORDER BY updated_at DESC LIMIT 1").fetchone()
+            if row is None:
+                return None, [], []
+            conversation_id = row[0]
+            rows = connection.execute(
+                "SELECT role, content, is_json, token_count, tokenizer FROM messages "
+                "WHERE conversation_id = ? ORDER BY id", (conversation_id,)).fetchall()
+
+        messages = []
+        token_counts = []
+        for role, content, is_json, token_count, tokenizer in rows:
+            messages.append({"role": role, "content": json.loads(content) if is_json else content})
+            token_counts.append((token_count, tokenizer))
+        return conversation_id, messages, token_counts
+
+    def _reader(self):
+        if self._read_connection is None:
+            self._read_connection = self._connect()
+        return self._read_connection
+
+    def close(self):
+        """Commit anything still queued and stop the writer thread."""
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join(timeout=5)
+
+    def _write_loop(self):
+        connection = self._connect()
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    connection.close()
+                    return
+                with connection:
+                    if item[0] == "append":
+                        self._write_message(connection, *item[1:])
+                    elif item[0] == "transcript":
+                        self._write_transcript(connection, *item[1:])
+                    elif item[0] == "delete_last":
+                        row = connection.execute("SELECT MAX(id) FROM messages WHERE conversation_id = ?", (item[1],)).fetchone()
+                        if row[0] is not None:
+                            connection.execute("DELETE FROM messages WHERE id = ?", (row[0],))
+                            if self.search_available:
+                                connection.execute("DELETE FROM search_index WHERE rowid = ?", (row[0],))
+            except Exception as e:
+                if self.verbose:
+                    import traceback
+                    traceback.print_exc()
+                else:
+                    print(f"Error saving conversation: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _write_message(self, connection, conversation_id, message, model, created_at):
+        content = message.get("content", "")
+        is_json = not isinstance(content, str)
+        if is_json:
+            # Image data would bloat the database, only the text parts are kept
+            content = [item for item in content if not (isinstance(item, dict) and item.get("type") == "image")]
+            message = {**message, "content": content}
+            content = json.dumps(content)
+
+        token_count, tokenizer = None, None
+        if model:
+            try:
+                from utils.utils import count_message_tokens, get_capability_registry
+                # Counting here also warms the token cache the next request's trimming uses
+                token_count = count_message_tokens(message, model)
+                tokenizer = get_capability_registry().lookup(model).tokenizer
+            except Exception as e:
+                if self.verbose:
+                    print(f"Could not count tokens for a saved message: {e}")
+
+        connection.execute(
+            "INSERT INTO conversations (id, started_at, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET updated_at = excluded.updated_at",
+            (conversation_id, created_at, created_at))
+        cursor = connection.execute(
+            "INSERT INTO messages (conversation_id, role, content, is_json, created_at, token_count, tokenizer) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (conversation_id, message.get("role", ""), content, int(is_json), created_at, token_count, tokenizer))
+        text = _message_text(message.get("content", ""))
+        if self.search_available:
+            connection.execute(
+                "INSERT INTO search_index (rowid, text, role, conversation_id, created_at) VALUES (?, ?, ?, ?, ?)",
+                (cursor.lastrowid, text, message.get("role", ""), conversation_id, created_at))
+        self._run_write_hooks(cursor.lastrowid, message.get("role", ""), text, created_at)
+
+    def _write_transcript(self, connection, text, created_at):
+        cursor = connection.execute("INSERT INTO transcripts (text, created_at) VALUES (?, ?)", (text, created_at))
+        if self.search_available:
+            connection.execute(
+                "INSERT INTO search_index (rowid, text, role, conversation_id, created_at) VALUES (?, ?, 'transcript', NULL, ?)",
+                (-cursor.lastrowid, text, created_at))
+        self._run_write_hooks(-cursor.lastrowid, "transcript", text, created_at)
+
+    def _run_write_hooks(self, entry_id, role, text, created_at):
+        for hook in self._write_hooks:
+            try:
+                hook(entry_id, role, text, created_at)
+            except Exception as e:
+                if self.verbose:
+                    print(f"Error in conversation store write hook: {e}")
+
+    def _index_unindexed_messages(self, connection):
+        """Index messages saved before the search index existed."""
+        last_indexed = connection.execute("SELECT COALESCE(MAX(rowid), 0) FROM search_index").fetchone()[0]
+        rows = connection.execute(
+            "SELECT id, role, content, is_json, conversation_id, created_at FROM messages WHERE id > ?",
+            (last_indexed,)).fetchall()
+        connection.executemany(
+            "INSERT INTO search_index (rowid, text, role, conversation_id, created_at) VALUES (?, ?, ?, ?, ?)",
+            [(message_id, _message_text(json.loads(content) if is_json else content), role, conversation_id, created_at)
+             for message_id, role, content, is_json, conversation_id, created_at in rows])
+
+
+def _message_text(content):
+    """The searchable text of a message's content."""
+    if isinstance(content, str):
+        return content
+    return "\n".join(item.get("text", "") if isinstance(item, dict) else str(item) for item in content)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_conversation_store(verbose=False):
+    """Return the process wide ConversationStore, or None if saving conversations is turned off."""
+    global _store
+    if not config.SAVE_CONVERSATIONS:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = ConversationStore(config.CONVERSATION_DB_PATH, verbose=verbose)
+        return _store
@@ -0,0 +1,206 @@
+import os
+import queue
+import threading
+import numpy as np
+from config_loader import config
+from utils.background_loader import BackgroundLoader
+from utils.vector_index import VectorIndex
+
+class EmbeddingModel:
+    """
+    A sentence embedding model (e.g. all-MiniLM-L6-v2 exported to ONNX) run on the CPU with onnxruntime.
+
+    Needs onnxruntime and tokenizers, see requirements/embedding_memory_requirements.txt.
+    """
+    def __init__(self, model, max_length=256):
+        """
+        Initialize the EmbeddingModel.
+
+        Args:
+            model (str): A folder holding model.onnx (or onnx/model.onnx) and tokenizer.json, or a Hugging Face
+                repo id to download them from, which needs huggingface_hub.
+            max_length (int): Longer texts are truncated to this many tokens.
+        """
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        model_dir = model if os.path.isdir(model) else self._download(model)
+        model_path = os.path.join(model_dir, "model.onnx")
+        if not os.path.exists(model_path):
+            model_path = os.path.join(model_dir, "onnx", "model.onnx")
+
+        options = onnxruntime.SessionOptions()
+        # Leave cores free for transcription and TTS, embedding a turn is a few milliseconds either way
+        options.intra_op_num_threads = 2
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=max_length)
+        self.tokenizer.enable_padding()
+        self.dim = self.embed(["dimension probe"]).shape[1]
+
+    @staticmethod
+    def _download(repo_id):
+        from huggingface_hub import snapshot_download
+        return snapshot_download(repo_id, allow_patterns=["onnx/model.onnx", "model.onnx", "tokenizer.json"])
+
+    def embed(self, texts):
+        """
+        Embed a batch of texts.
+
+        Args:
+            texts (list): The texts to embed.
+
+        Returns:
+            numpy.ndarray: float32 unit length vectors shaped (len(texts), dim).
+        """
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.array([encoding.ids for encoding in encodings], dtype=np.int64)
+        attention_mask = np.array([encoding.attention_mask for encoding in encodings], dtype=np.int64)
+        feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+        output = self.session.run(None, feeds)[0]
+        if output.ndim == 3:
+            # Mean of the token embeddings, ignoring padding
+            mask = attention_mask[:, :, None].astype(np.float32)
+            output = (output * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        norms = np.linalg.norm(output, axis=1, keepdims=True)
+        return (output / np.maximum(norms, 1e-12)).astype(np.float32)
+
+
+class EmbeddingMemory:
+    """
+    Semantic recall over saved conversations.
+
+    Every message and transcript the ConversationStore saves is embedded once on a background worker and
+    added to a VectorIndex, so embedding never holds up a voice turn. Messages saved before the memory was
+    enabled are embedded on startup. Only the query is embedded at request time.
+    """
+    MIN_CHARS = 20  # Shorter turns ("yes", "thanks") carry no meaning worth recalling
+    BATCH_SIZE = 16
+
+    def __init__(self, store, model, index_path, verbose=False):
+        """
+        Initialize the EmbeddingMemory.
+
+        Args:
+            store (ConversationStore): The store whose messages are embedded and looked up.
+            model (str): Folder or Hugging Face repo id of the embedding model, see EmbeddingModel.
+            index_path (str): Path prefix of the vector index files.
+            verbose (bool): Whether to print verbose output.
+        """
+        self.store = store
+        self.model_name = model
+        self.index_path = index_path
+        self.verbose = verbose
+        self.model = None
+        self.index = None
+        self._queue = queue.Queue()
+
+        # Register before anything else can be saved, items just wait in the queue until the model is loaded
+        self.store.add_write_hook(self._on_saved)
+        self._loader = BackgroundLoader(self._load, "embedding model", verbose=verbose)
+        self._worker = threading.Thread(target=self._work, name="embedding_memory", daemon=True)
+        self._worker.start()
+
+    @property
+    def ready(self):
+        """Whether the model has loaded and searches can be answered."""
+        return self._loader.done and self.model is not None
+
+    def _load(self):
+        self.model = EmbeddingModel(self.model_name)
+        self.index = VectorIndex(self.index_path, self.model.dim)
+
+    def _on_saved(self, entry_id, role, text, created_at):
+        if self._loader.done and self.model is None:
+            return  # The model failed to load, nothing will take items off the queue
+        if role in ("user", "assistant", "transcript") and len(text) >= self.MIN_CHARS:
+            self._queue.put((entry_id, text))
+
+    def _work(self):
+        try:
+            self._loader.wait()
+        except Exception:
+            # The loader has already reported why
+            print("Embedding memory is disabled until the embedding model can be loaded.")
+            return
+        backfilled_id = self._backfill()
+
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.BATCH_SIZE:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            # Messages saved while the model was loading were already picked up by the backfill
+            batch = [item for item in batch if not 0 < item[0] <= backfilled_id]
+            if batch:
+                self._embed(batch)
+
+    def _backfill(self):
+        """Embed messages that were saved while the memory was not running, returning the last id covered."""
+        last_id = max(self.index.max_id(), 0)
+        while True:
+            rows = self.store.messages_after(last_id, limit=256)
+            if not rows:
+                return last_id
+            last_id = rows[-1][0]
+            batch = [(entry_id, text) for entry_id, role, text, _ in rows
+                     if role in ("user", "assistant") and len(text) >= self.MIN_CHARS]
+            for start in range(0, len(batch), self.BATCH_SIZE):
+                self._embed(batch[start:start + self.BATCH_SIZE])
+            if self.verbose:
+                print(f"Embedded saved messages up to id {last_id}")
+
+    def _embed(self, batch):
+        try:
+            # Only the first part of long messages, e.g. not the pasted clipboard text after the question
+            vectors = self.model.embed([text[:2000] for _, text in batch])
+            self.index.add([entry_id for entry_id, _ in batch], vectors)
+        except Exception as e:
+            if self.verbose:
+                import traceback
+                traceback.print_exc()
+            else:
+                print(f"Error embedding messages: {e}")
+
+    def search(self, query, k=5, min_score=0.0):
+        """
+        Find the saved messages and transcripts closest in meaning to a query.
+
+        Args:
+            query (str): The text to search for.
+            k (int): The maximum number of results.
+            min_score (float): Results with a lower cosine similarity are left out.
+
+        Returns:
+            list: SearchResult tuples with the full text as the snippet, most similar first.
+                Empty while the model is still loading.
+        """
+        if not self.ready or not query.strip():
+            return []
+        hits = [(entry_id, score) for entry_id, score in self.index.search(self.model.embed([query])[0], k)
+                if score >= min_score]
+        entries = self.store.get_entries([entry_id for entry_id, _ in hits])
+        return [entries[entry_id]._replace(score=score) for entry_id, score in hits if entry_id in entries]
+
+
+_memory = None
+_memory_lock = threading.Lock()
+
+def get_embedding_memory(verbose=False):
+    """Return the process wide EmbeddingMemory, or None if conversations are not being saved."""
+    global _memory
+    from utils.conversation_store import get_conversation_store
+    store = get_conversation_store(verbose=verbose)
+    if store is None:
+        return None
+    with _memory_lock:
+        if _memory is None:
+            _memory = EmbeddingMemory(store, config.MEMORY_EMBEDDING_MODEL, config.MEMORY_INDEX_PATH, verbose=verbose)
+        return _memory
@@ -0,0 +1,138 @@
+import threading
+from utils.utils import count_message_tokens
+
+SUMMARY_INSTRUCTIONS = (
+    "You keep a running summary of a conversation between a user and a voice assistant, so the assistant "
+    "can carry on the conversation after the older messages are removed. Update the summary with the new "
+    "messages. Keep names, numbers, decisions, preferences and open questions, drop small talk. Write it "
+    "in the third person as plain prose, and reply with the summary only."
+)
+
+def _message_text(message):
+    content = message.get("content", "")
+    if isinstance(content, str):
+        return content
+    return "\n".join(item.get("text", "") if item.get("type") == "text" else "[image]"
+                     for item in content if isinstance(item, dict))
+
+
+class HistoryCompactor:
+    """
+    Keeps a Chat's prompt small by summarising its oldest messages in the background.
+
+    Once the conversation passes a fraction of the token limit, the oldest messages are summarised with
+    the completions client and replaced by the summary, which Chat adds to the system prompt. This runs
+    between turns, after a reply has been spoken, so it never delays a response, and nothing is lost the
+    way it is when maintain_token_limit has to drop messages. That trimming is still the fallback if the
+    limit is reached before a summary is ready.
+    """
+    def __init__(self, completions_api_client, model, max_prompt_tokens, completion_params=None,
+                 trigger_fraction=0.75, target_fraction=0.5, verbose=False):
+        """
+        Initialize the HistoryCompactor.
+
+        Args:
+            completions_api_client (CompletionManager): The client used to write summaries.
+            model (str): The model used to write summaries.
+            max_prompt_tokens (int): The prompt token limit of the chat.
+            completion_params (dict, optional): Parameters for the completions API, max_tokens is overridden.
+            trigger_fraction (float): Compact once the prompt passes this fraction of max_prompt_tokens.
+            target_fraction (float): Summarise enough of the oldest messages to bring the prompt under this fraction.
+            verbose (bool): Whether to print verbose output.
+        """
+        self.completions_api_client = completions_api_client
+        self.model = model
+        self.max_prompt_tokens = max_prompt_tokens
+        self.completion_params = dict(completion_params or {})
+        self.trigger_tokens = int(max_prompt_tokens * trigger_fraction)
+        self.target_tokens = int(max_prompt_tokens * target_fraction)
+        # The summary has to fit in the room compacting makes, or the next compaction would summarise it away
+        self.summary_max_tokens = max(128, (self.trigger_tokens - self.target_tokens) // 2)
+        self.verbose = verbose
+        self._running = threading.Lock()
+
+    def compact_in_background(self, chat):
+        """
+        Start compacting a chat on a background thread if it is over the threshold.
+
+        Does nothing if a compaction is already running.
+
+        Args:
+            chat (Chat): The chat to compact.
+        """
+        if not self._running.acquire(blocking=False):
+            return
+        thread = threading.Thread(target=self._run, args=(chat,), name="history_compactor", daemon=True)
+        thread.start()
+
+    def _run(self, chat):
+        try:
+            self.compact(chat)
+        except Exception as e:
+            if self.verbose:
+                import traceback
+                traceback.print_exc()
+            else:
+                print(f"Error summarising the chat history: {e}")
+        finally:
+            self._running.release()
+
+    def compact(self, chat):
+        """
+        Summarise the oldest messages of a chat if it is over the threshold.
+
+        Args:
+            chat (Chat): The chat to compact.
+
+        Returns:
+            bool: True if messages were replaced by a summary.
+        """
+        messages, summary = chat.history_snapshot()
+        counts = [count_message_tokens(message, self.model) for message in messages]
+        summary_tokens = count_message_tokens({"role": "system", "content": summary}, self.model) if summary else 0
+        total = sum(counts) + summary_tokens
+        if total <= self.trigger_tokens:
+            return False
+
+        span = self._select_span(messages, counts, total - self.target_tokens)
+        if not span:
+            return False
+
+        transcript = "\n\n".join(f"{message['role'].upper()}: {_message_text(message)}" for message in span)
+        request = [
+            {"role": "system", "content": SUMMARY_INSTRUCTIONS},
+            {"role": "user", "content": f"Summary so far:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"},
+        ]
+        params = {**self.completion_params, "max_tokens": self.summary_max_tokens}
+        new_summary = self.completions_api_client.get_completion(request, self.model, **params)
+        if not new_summary or not new_summary.strip():
+            return False
+
+        if not chat.replace_history(span, new_summary.strip()):
+            return False  # The chat was cleared or resumed while the summary was being written
+        if self.verbose:
+            span_tokens = sum(count_message_tokens(message, self.model) for message in span)
+            print(f"Summarised {len(span)} older messages ({span_tokens} tokens) in the background")
+        return True
+
+    @staticmethod
+    def _select_span(messages, counts, tokens_to_free):
+        """
+        Pick the oldest non-system messages to summarise.
+
+        The span ends on an assistant message, so the conversation left behind still starts with the user,
+        and the latest exchange is always kept.
+        """
+        span = []
+        freed = 0
+        end = None
+        for i, message in enumerate(messages[:-2]):
+            if message.get("role") == "system":
+                continue
+            span.append(message)
+            freed += counts[i]
+            if message.get("role") == "assistant":
+                end = len(span)
+                if freed >= tokens_to_free:
+                    break
+        return span[:end] if end else []
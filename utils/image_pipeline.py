@@ -0,0 +1,132 @@
+import base64
+import hashlib
+import io
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from config_loader import config
+
+EncodedImage = namedtuple('EncodedImage', ['data', 'media_type'])
+
+# Target size and format per completions API. Sending pixels the provider would throw away only costs
+# encode and upload time, so each profile stops at the size the provider downscales to anyway.
+IMAGE_PROFILES = {
+    "default": {"max_long_edge": 1024, "max_short_edge": None, "format": "JPEG", "quality": 85},
+    # Anthropic resizes anything with a long edge over 1568px
+    "anthropic": {"max_long_edge": 1568, "max_short_edge": None, "format": "JPEG", "quality": 85},
+    # OpenAI fits images within 2048x2048 and then scales the short edge down to 768px
+    "openai": {"max_long_edge": 2048, "max_short_edge": 768, "format": "JPEG", "quality": 85},
+    # Gemini bills larger images per 768x768 tile, 1536px keeps it to four tiles
+    "google": {"max_long_edge": 1536, "max_short_edge": None, "format": "JPEG", "quality": 85},
+}
+
+class ImagePipeline:
+    """
+    Resizes and encodes clipboard images for LLM input on a background worker.
+
+    Encoded results are cached by a hash of the raw image, so sending the same clipboard image
+    again skips the resize and encode entirely.
+    """
+    def __init__(self, provider=None, cache_size=8, verbose=False):
+        """
+        Initialize the ImagePipeline.
+
+        Args:
+            provider (str, optional): The completions API the images are for, used to pick the target size and format.
+            cache_size (int): The number of encoded images to keep.
+            verbose (bool): Whether to print verbose output.
+        """
+        self.profile = IMAGE_PROFILES.get(provider, IMAGE_PROFILES["default"])
+        self.cache_size = cache_size
+        self.verbose = verbose
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="image_pipeline")
+
+    def submit(self, image):
+        """
+        Start encoding an image in the background.
+
+        Args:
+            image (PIL.Image.Image): The image to encode.
+
+        Returns:
+            concurrent.futures.Future: Resolves to an EncodedImage.
+        """
+        return self._executor.submit(self.encode, image)
+
+    def encode(self, image):
+        """
+        Resize and encode an image, or return the cached result for an identical image.
+
+        Args:
+            image (PIL.Image.Image): The image to encode.
+
+        Returns:
+            EncodedImage: The base64 encoded image data and its media type.
+        """
+        key = self._hash(image)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                if self.verbose:
+                    print("Using cached encoding of clipboard image.")
+                return self._cache[key]
+
+        encoded = self._encode(self._resize(image))
+
+        with self._lock:
+            self._cache[key] = encoded
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return encoded
+
+    def _hash(self, image):
+        """Hash the raw pixels of an image."""
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(f"{image.mode}{image.size}".encode())
+        digest.update(image.tobytes())
+        return digest.hexdigest()
+
+    def _resize(self, image):
+        """Scale an image down to fit the profile's limits."""
+        width, height = image.size
+        long_edge, short_edge = max(width, height), min(width, height)
+        scale = min(1.0, self.profile["max_long_edge"] / long_edge)
+        if self.profile["max_short_edge"]:
+            scale = min(scale, self.profile["max_short_edge"] / short_edge)
+        if scale >= 1.0:
+            return image
+
+        new_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        # reducing_gap first shrinks by a whole factor with a cheap box filter, so for large downsizes
+        # the final pass only covers the last 2x and bicubic is indistinguishable from Lanczos
+        resample = Image.BICUBIC if scale < 0.5 else Image.LANCZOS
+        return image.resize(new_size, resample, reducing_gap=2.0)
+
+    def _encode(self, image):
+        """Encode an image in the profile's format and base64 it."""
+        image_format = self.profile["format"]
+        if image_format == "JPEG" and image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        buffered = io.BytesIO()
+        if image_format == "JPEG":
+            image.save(buffered, format="JPEG", quality=self.profile["quality"], subsampling=0)
+        else:
+            image.save(buffered, format=image_format)
+        return EncodedImage(base64.b64encode(buffered.getvalue()).decode('utf-8'),
+                            f"image/{image_format.lower()}")
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+def get_image_pipeline(verbose=False):
+    """Return the process wide ImagePipeline for the configured completions API, creating it on first use."""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is None:
+            _pipeline = ImagePipeline(provider=config.COMPLETIONS_API, verbose=verbose)
+        return _pipeline
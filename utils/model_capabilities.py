@@ -0,0 +1,103 @@
+import json
+import os
+import threading
+from collections import namedtuple
+from fnmatch import fnmatchcase
+
+ModelCapabilities = namedtuple('ModelCapabilities', ['supports_images', 'context_window', 'max_output_tokens', 'tokenizer'])
+
+CAPABILITIES_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'model_capabilities.json')
+
+class CapabilityRegistry:
+    """
+    Looks up what a model can do from model_capabilities.json.
+
+    Each entry in the file has a glob `pattern` (e.g. "gpt-4o*", "llava*"), an optional `provider`
+    (the COMPLETIONS_API it applies to) and any of the capability fields. Every matching entry
+    contributes the fields it defines, and for each field the first matching entry in the file wins,
+    so put specific entries above general ones. Patterns are matched against the full model name and
+    against the part after the last "/" so OpenRouter style names like "openai/gpt-4o" match too.
+
+    The file is parsed once and every answer is memoised, so repeated lookups are a dict hit.
+    """
+    FIELDS = ModelCapabilities._fields
+
+    def __init__(self, path=CAPABILITIES_FILE, verbose=False):
+        """
+        Initialize the CapabilityRegistry.
+
+        Args:
+            path (str): Path to the capabilities JSON file.
+            verbose (bool): Whether to print verbose output.
+        """
+        self.verbose = verbose
+        self._cache = {}
+        self._lock = threading.Lock()
+        try:
+            with open(path, 'r') as file:
+                data = json.load(file)
+        except Exception as e:
+            print(f"Error reading or parsing the model capabilities file: {e}")
+            data = {}
+
+        defaults = {
+            "supports_images": False,
+            "context_window": 8192,
+            "max_output_tokens": 4096,
+            "tokenizer": "cl100k_base",
+        }
+        defaults.update(data.get("defaults", {}))
+        self.defaults = ModelCapabilities(**{field: defaults[field] for field in self.FIELDS})
+        self.entries = [(entry.get("provider"), entry["pattern"].lower(), entry)
+                        for entry in data.get("models", []) if "pattern" in entry]
+
+    def lookup(self, model_name, provider=None):
+        """
+        Get the capabilities of a model.
+
+        Args:
+            model_name (str): The model name as passed to the completions API.
+            provider (str, optional): The COMPLETIONS_API the model is served by.
+
+        Returns:
+            ModelCapabilities: The capabilities, with defaults filled in for anything unknown.
+        """
+        key = (provider, model_name)
+        capabilities = self._cache.get(key)
+        if capabilities is None:
+            capabilities = self._resolve(model_name or "", provider)
+            with self._lock:
+                self._cache[key] = capabilities
+        return capabilities
+
+    def _resolve(self, model_name, provider):
+        """Merge the fields of every entry matching the model."""
+        full_name = model_name.lower()
+        short_name = full_name.rsplit('/', 1)[-1]
+        resolved = {}
+        for entry_provider, pattern, entry in self.entries:
+            if entry_provider is not None and entry_provider != provider:
+                continue
+            if fnmatchcase(full_name, pattern) or fnmatchcase(short_name, pattern):
+                for field in self.FIELDS:
+                    if field in entry and field not in resolved:
+                        resolved[field] = entry[field]
+        if self.verbose and not resolved:
+            print(f"No capability information found for model '{model_name}', using defaults.")
+        return self.defaults._replace(**resolved)
+
+    def supports_images(self, model_name, provider=None):
+        """Return True if the model accepts image input."""
+        return self.lookup(model_name, provider).supports_images
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+def get_capability_registry(verbose=False):
+    """Return the process wide CapabilityRegistry, loading model_capabilities.json on first use."""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = CapabilityRegistry(verbose=verbose)
+        return _registry
@@ -1,4 +1,5 @@
 import importlib
+import inspect
 import config
 
 
@@ -31,8 +32,14 @@ def update_system_prompt_in_messages(prompt_name : str, messages : list = None):
     prompt = system_prompt.get_prompt().strip()
 
     for module in config.ACTIVE_PROMPT_MODULES:
-        module_prompt = importlib.import_module(f"system_prompts.modules.{module}").get_prompt().strip()
-        prompt += "\n\n" + module_prompt
+        get_module_prompt = importlib.import_module(f"system_prompts.modules.{module}").get_prompt
+        # Modules that take an argument are given the conversation, e.g. to search for related history
+        if inspect.signature(get_module_prompt).parameters:
+            module_prompt = get_module_prompt(messages).strip()
+        else:
+            module_prompt = get_module_prompt().strip()
+        if module_prompt:
+            prompt += "\n\n" + module_prompt
 
     system_message = {"role": "system", "content": prompt}
     if messages == None:
@@ -0,0 +1,135 @@
+import math
+import numpy as np
+
+class StreamingResampler:
+    """
+    A vectorised polyphase resampler that converts audio between sample rates one block at a time.
+
+    The anti-aliasing filter is a Kaiser windowed sinc designed the same way as scipy's resample_poly,
+    and the filter state is carried between blocks so the output matches resampling the whole
+    recording in one go.
+    """
+    def __init__(self, in_rate, out_rate, half_width=10, beta=5.0):
+        """
+        Initialize the StreamingResampler.
+
+        Args:
+            in_rate (int): The sample rate of the input audio.
+            out_rate (int): The sample rate to convert to.
+            half_width (int): Half the filter length, in units of the lower of the two rates. Higher is sharper but slower.
+            beta (float): The Kaiser window shape parameter.
+        """
+        self.in_rate = int(in_rate)
+        self.out_rate = int(out_rate)
+        divisor = math.gcd(self.in_rate, self.out_rate)
+        self.up = self.out_rate // divisor
+        self.down = self.in_rate // divisor
+        self.passthrough = self.up == self.down
+
+        if not self.passthrough:
+            max_rate = max(self.up, self.down)
+            self.half_len = half_width * max_rate
+            n = np.arange(2 * self.half_len + 1) - self.half_len
+            taps = np.sinc(n / max_rate) * np.kaiser(2 * self.half_len + 1, beta)
+            taps *= self.up / taps.sum()
+
+            # Split the filter into one row per output phase: phases[p, j] = taps[p + j * up]
+            self.taps_per_phase = math.ceil(len(taps) / self.up)
+            padded = np.zeros(self.taps_per_phase * self.up)
+            padded[:len(taps)] = taps
+            self.phases = padded.reshape(self.taps_per_phase, self.up).T.astype(np.float32)
+
+            # Output index 0 lines up with the centre of the filter, which removes the filter delay
+            self.delay = self.half_len
+        self.reset()
+
+    def reset(self):
+        """Clear the filter state so the next block is treated as the start of a new stream."""
+        self._inputs_seen = 0
+        self._outputs_made = 0
+        if not self.passthrough:
+            self._history = np.zeros(self.taps_per_phase - 1, dtype=np.float32)
+
+    def process(self, samples):
+        """
+        Resample a block of samples.
+
+        Args:
+            samples (numpy.ndarray): A 1-D block of int16 or float samples at the input rate.
+
+        Returns:
+            numpy.ndarray: The resampled int16 samples that can be produced so far.
+        """
+        if self.passthrough:
+            return np.asarray(samples, dtype=np.int16)
+
+        samples = np.asarray(samples, dtype=np.float32)
+        buffer = np.concatenate((self._history, samples))
+        first_index = self._inputs_seen - len(self._history)  # Global input index of buffer[0]
+        self._inputs_seen += len(samples)
+
+        # Output n needs inputs up to (n * down + delay) // up, which must already have arrived
+        last_output = ((self._inputs_seen - 1) * self.up - self.delay) // self.down
+        out = self._compute(buffer, first_index, self._outputs_made, last_output + 1)
+
+        # Keep every input from the oldest one the next output needs
+        oldest = (self._outputs_made * self.down + self.delay) // self.up - (self.taps_per_phase - 1)
+        self._history = buffer[max(0, oldest - first_index):]
+        return out
+
+    def flush(self):
+        """
+        Produce the samples still held back by the filter at the end of a stream.
+
+        Returns:
+            numpy.ndarray: The remaining int16 samples, after which the resampler is reset.
+        """
+        if self.passthrough:
+            self.reset()
+            return np.zeros(0, dtype=np.int16)
+
+        total_outputs = math.ceil(self._inputs_seen * self.up / self.down)
+        padding = math.ceil(self.delay / self.up) + 1
+        buffer = np.concatenate((self._history, np.zeros(padding, dtype=np.float32)))
+        first_index = self._inputs_seen - len(self._history)
+        out = self._compute(buffer, first_index, self._outputs_made, total_outputs)
+        self.reset()
+        return out
+
+    def _compute(self, buffer, first_index, start, stop):
+        """Compute outputs [start, stop) from a buffer whose first sample has global index first_index."""
+        if stop <= start:
+            return np.zeros(0, dtype=np.int16)
+
+        t = np.arange(start, stop, dtype=np.int64) * self.down + self.delay
+        phase = t % self.up
+        newest = t // self.up - first_index
+
+        # Gather the inputs each output needs (newest first) and weight them with that output's phase
+        offsets = newest[:, None] - np.arange(self.taps_per_phase)[None, :]
+        valid = offsets >= 0
+        window = np.where(valid, buffer[np.clip(offsets, 0, len(buffer) - 1)], 0.0)
+        out = np.einsum('ij,ij->i', window, self.phases[phase])
+
+        self._outputs_made = stop
+        return np.clip(np.rint(out), -32768, 32767).astype(np.int16)
+
+
+# Benchmark the StreamingResampler
+if __name__ == "__main__":
+    import time
+
+    block_size = 512
+    seconds = 10
+    for in_rate in (48000, 44100, 22050):
+        resampler = StreamingResampler(in_rate, 16000)
+        audio = (np.sin(np.arange(in_rate * seconds) * 2 * np.pi * 440 / in_rate) * 10000).astype(np.int16)
+
+        start = time.perf_counter()
+        chunks = [resampler.process(audio[i:i + block_size]) for i in range(0, len(audio), block_size)]
+        chunks.append(resampler.flush())
+        elapsed = time.perf_counter() - start
+
+        output = np.concatenate(chunks)
+        print(f"{in_rate} Hz -> 16000 Hz: {elapsed / seconds * 1000:.2f} ms CPU per second of audio "
+              f"({len(output)} samples out, {block_size} sample blocks)")
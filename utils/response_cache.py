@@ -0,0 +1,222 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from config_loader import config
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    response TEXT NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses(last_used);
+"""
+
+# Timestamps added by the "time" prompt module and TIMESTAMP_MESSAGES, which would otherwise make every key unique
+_TIMESTAMP_PATTERN = re.compile(r"^(?:MESSAGE TIMESTAMP|Current (?:date|time)):[^\n]*$", re.MULTILINE)
+# Answers to these depend on when they are asked, which the key leaves out
+_TIME_SENSITIVE_PATTERN = re.compile(
+    r"\b(?:time|today|tonight|tomorrow|yesterday|now|date|weather|latest|news|currently|this (?:morning|week|month|year))\b",
+    re.IGNORECASE)
+
+
+def _split_spoken(text):
+    """
+    Split the text of a user message into what was said and what was added after it, the clipboard
+    text, image instructions and timestamp, which always follow a blank line.
+    """
+    spoken, _, added = text.partition("\n\n")
+    return spoken, added
+
+def _spoken_text(content):
+    """What was said in a user message, leaving out anything added after it."""
+    if isinstance(content, str):
+        return _split_spoken(content)[0]
+    return "\n".join(_split_spoken(item.get("text", ""))[0] for item in content
+                     if isinstance(item, dict) and item.get("type") == "text")
+
+def _latest_message_key(content):
+    """
+    The part of the latest user message's content that goes in the key. Only the transcript is normalised,
+    clipboard text and images must match exactly, the timestamp is left out.
+    """
+    items = [content] if isinstance(content, str) else content
+    key = []
+    for item in items:
+        if isinstance(item, str) or item.get("type") == "text":
+            spoken, added = _split_spoken(item if isinstance(item, str) else item.get("text", ""))
+            key.append([normalise_text(spoken), _TIMESTAMP_PATTERN.sub("", added)])
+        else:
+            key.append(item)
+    return key
+
+def normalise_text(text):
+    """Reduce a transcript to what matters for a cache hit: no case or spacing, nor its final punctuation."""
+    return " ".join(text.casefold().split()).strip(" .!?,")
+
+
+class ResponseCache:
+    """
+    Caches LLM responses on disk, so asking something again gets the answer without waiting on the API.
+
+    Responses are keyed on a hash of the model, the completion parameters and the whole prompt as sent.
+    Only what was said in the latest message is normalised, so case, spacing and the punctuation a
+    transcription adds or drops do not matter. Clipboard text, images and earlier messages must match
+    exactly, and only the timestamps AlwaysReddy adds are left out. Requests that mention the time or date are never cached. Entries expire after a TTL, and the
+    least recently used ones are evicted once there are more than max_entries.
+    """
+    def __init__(self, path, max_entries=1000, ttl=7 * 86400, verbose=False):
+        """
+        Initialize the ResponseCache.
+
+        Args:
+            path (str): Path of the SQLite database file, created if it does not exist.
+            max_entries (int): The most responses kept.
+            ttl (float): Seconds a response is kept for.
+            verbose (bool): Whether to print verbose output.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.verbose = verbose
+        self.hits = 0
+        self.misses = 0
+        self.skipped = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(SCHEMA)
+
+    def key(self, model, completion_params, messages):
+        """
+        Build the cache key of a request.
+
+        Args:
+            model (str): The model the request is for.
+            completion_params (dict): The completion parameters.
+            messages (list): The messages exactly as they will be sent.
+
+        Returns:
+            str: The key, or None if the request should not be cached.
+        """
+        user_indexes = [index for index, message in enumerate(messages) if message.get("role") == "user"]
+        if not user_indexes:
+            return None
+        latest = user_indexes[-1]
+        # Only what was said counts, not the clipboard text appended after it
+        if _TIME_SENSITIVE_PATTERN.search(_spoken_text(messages[latest].get("content", ""))):
+            with self._lock:
+                self.skipped += 1
+            return None
+
+        keyed = []
+        for index, message in enumerate(messages):
+            content = message.get("content", "")
+            if index == latest:
+                content = _latest_message_key(content)
+            elif message.get("role") == "system" and isinstance(content, str):
+                content = _TIMESTAMP_PATTERN.sub("", content)
+            keyed.append((message.get("role"), content))
+        payload = json.dumps([model, completion_params or {}, keyed], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key):
+        """
+        Look up a response.
+
+        Args:
+            key (str): A key from `key`.
+
+        Returns:
+            str: The cached response, or None if there is none or it has expired.
+        """
+        now = time.time()
+        with self._lock:
+            row = self._connection.execute("SELECT response, created_at FROM responses WHERE key = ?",
+                                           (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl:
+                self.misses += 1
+                if row is not None:
+                    with self._connection:
+                        self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                return None
+            self.hits += 1
+            with self._connection:
+                self._connection.execute("UPDATE responses SET last_used = ?, hits = hits + 1 WHERE key = ?",
+                                         (now, key))
+        if self.verbose:
+            print(f"Response cache hit ({self.stats()['hit_rate']:.0%} of lookups so far)")
+        return row[0]
+
+    def put(self, key, model, response):
+        """
+        Save a response, evicting the least recently used ones if the cache is full.
+
+        Args:
+            key (str): A key from `key`.
+            model (str): The model that wrote the response.
+            response (str): The response text.
+        """
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, created_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now))
+            excess = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0] - self.max_entries
+            if excess > 0:
+                self._connection.execute(
+                    "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_used LIMIT ?)",
+                    (excess,))
+
+    def clear(self):
+        """Remove every cached response."""
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM responses")
+
+    def close(self):
+        """Close the database."""
+        with self._lock:
+            self._connection.close()
+
+    def stats(self):
+        """
+        Return the cache's hit and miss counts since startup.
+
+        Returns:
+            dict: hits, misses, skipped (requests that were not cacheable), hit_rate and entries.
+        """
+        with self._lock:
+            entries = self._connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "skipped": self.skipped,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": entries,
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_response_cache(verbose=False):
+    """Return the process wide ResponseCache, or None if response caching is turned off."""
+    global _cache
+    if not config.RESPONSE_CACHE:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResponseCache(config.RESPONSE_CACHE_PATH, max_entries=config.RESPONSE_CACHE_MAX_ENTRIES,
+                                   ttl=config.RESPONSE_CACHE_TTL_HOURS * 3600, verbose=verbose)
+        return _cache
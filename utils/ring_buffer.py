@@ -0,0 +1,100 @@
+import numpy as np
+
+class RingBuffer:
+    """
+    A fixed-size single-producer, single-consumer ring buffer for audio samples.
+
+    The producer (an audio callback) only ever advances the write position and the consumer
+    only ever advances the read position, so the two sides never need to share a lock.
+    Samples that arrive while the buffer is full are dropped and counted in `overruns`,
+    reads that ask for more samples than are available are counted in `underruns`.
+    """
+    def __init__(self, capacity, dtype=np.int16):
+        """
+        Initialize the RingBuffer.
+
+        Args:
+            capacity (int): The maximum number of samples the buffer can hold.
+            dtype (numpy.dtype): The sample type stored in the buffer.
+        """
+        self.capacity = int(capacity)
+        # np.empty does not touch the memory, so large buffers only cost what is actually written
+        self._buffer = np.empty(self.capacity, dtype=dtype)
+        self._write_pos = 0  # Total number of samples ever written
+        self._read_pos = 0   # Total number of samples ever read
+        self.overruns = 0
+        self.underruns = 0
+
+    def __len__(self):
+        """Return the number of samples waiting to be read."""
+        return self._write_pos - self._read_pos
+
+    @property
+    def free(self):
+        """Return the number of samples that can be written before the buffer is full."""
+        return self.capacity - len(self)
+
+    def write(self, samples):
+        """
+        Write samples to the buffer. Called from the producer side only.
+
+        Args:
+            samples (numpy.ndarray): A 1-D array of samples.
+
+        Returns:
+            int: The number of samples actually written.
+        """
+        n = len(samples)
+        free = self.capacity - (self._write_pos - self._read_pos)
+        if n > free:
+            self.overruns += n - free
+            samples = samples[:free]
+            n = free
+        if n == 0:
+            return 0
+
+        start = self._write_pos % self.capacity
+        end = start + n
+        if end <= self.capacity:
+            self._buffer[start:end] = samples
+        else:
+            split = self.capacity - start
+            self._buffer[start:] = samples[:split]
+            self._buffer[:n - split] = samples[split:]
+
+        # Publish the samples only once they have been copied in
+        self._write_pos += n
+        return n
+
+    def read(self, n=None):
+        """
+        Read samples from the buffer. Called from the consumer side only.
+
+        Args:
+            n (int, optional): The number of samples to read. Reads everything available if None.
+
+        Returns:
+            numpy.ndarray: A copy of the samples read.
+        """
+        available = self._write_pos - self._read_pos
+        if n is None:
+            n = available
+        elif n > available:
+            self.underruns += n - available
+            n = available
+
+        start = self._read_pos % self.capacity
+        end = start + n
+        if end <= self.capacity:
+            out = self._buffer[start:end].copy()
+        else:
+            out = np.concatenate((self._buffer[start:], self._buffer[:end - self.capacity]))
+
+        self._read_pos += n
+        return out
+
+    def clear(self):
+        """Discard all unread samples and reset the counters."""
+        self._read_pos = self._write_pos
+        self.overruns = 0
+        self.underruns = 0
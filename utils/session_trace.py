@@ -0,0 +1,230 @@
+import atexit
+import base64
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+import numpy as np
+from config_loader import config
+
+class SessionTracer:
+    """
+    Records what happens in a session, and when, to a trace file that can be replayed against later code
+    to check for latency regressions (see benchmarks/replay_session.py).
+
+    The trace is gzipped JSON lines, one event per line, each with "t", the seconds since the session
+    started. It holds the hotkey events, the audio of every recording, the transcripts, the prompts, the
+    completion streams with the time each chunk arrived, and when each sentence was synthesised and played.
+    Events are grouped into turns, a new one starting whenever a recording is kept.
+
+    Each prompt only records the messages that were not in the prompt before it, as the whole conversation
+    is sent again every turn. `completion_prompts` rebuilds them.
+    """
+    def __init__(self, path, verbose=False):
+        """
+        Initialize the SessionTracer.
+
+        Args:
+            path (str): The trace file to write, its folder is created if it does not exist.
+            verbose (bool): Whether to print verbose output.
+        """
+        self.path = path
+        self.verbose = verbose
+        self.turn = 0
+        self._prompt_count = 0
+        self._last_prompt = (None, [])  # The id of the last prompt, and its messages serialised
+        self._start = time.monotonic()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = gzip.open(path, "wt", encoding="utf-8")
+        self.record("session", started_at=time.time(), completion_model=config.COMPLETION_MODEL,
+                    completions_api=config.COMPLETIONS_API, transcription_api=config.TRANSCRIPTION_API,
+                    tts_engine=config.TTS_ENGINE)
+        atexit.register(self.close)  # Writes the end of the gzip stream
+
+    def now(self):
+        """Seconds since the session started, the clock every event is timed on."""
+        return time.monotonic() - self._start
+
+    def record(self, event_type, t=None, **fields):
+        """
+        Write an event to the trace.
+
+        Args:
+            event_type (str): What happened, e.g. "key" or "completion".
+            t (float, optional): When it happened, from `now`. Defaults to now.
+            **fields: The details of the event, which must be JSON serialisable.
+        """
+        event = {"type": event_type, "t": round(self.now() if t is None else t, 6), "turn": self.turn, **fields}
+        line = json.dumps(event, default=str)
+        with self._lock:
+            if self._file is None:
+                return
+            try:
+                self._file.write(line + "\n")
+                # A sync flush, so if AlwaysReddy is killed before close() load_trace can still read every event
+                self._file.flush()
+            except Exception as e:
+                if self.verbose:
+                    print(f"Error writing session trace: {e}")
+
+    def key_event(self, hotkey, is_pressed):
+        self.record("key", hotkey=hotkey, pressed=is_pressed)
+
+    def recording(self, samples, samplerate, started, stopped):
+        """
+        Record the audio of a kept recording, which starts a new turn.
+
+        Args:
+            samples (numpy.ndarray): The int16 mono audio.
+            samplerate (int): Its sample rate.
+            started (float): When recording started, from `now`.
+            stopped (float): When stopping was asked for, from `now`.
+        """
+        with self._lock:
+            self.turn += 1
+        audio = base64.b64encode(np.asarray(samples, dtype=np.int16).tobytes()).decode("ascii")
+        self.record("recording", started=round(started, 6), stopped=round(stopped, 6), samplerate=samplerate,
+                    audio=audio)
+
+    def transcription(self, text, started):
+        self.record("transcription", started=round(started, 6), text=text)
+
+    def prompt(self, messages):
+        """
+        Record a prompt as it is sent, writing the messages the previous prompt already had as their index in it.
+
+        Args:
+            messages (list): The messages of the prompt.
+
+        Returns:
+            int: The prompt's id, which the completion event refers to.
+        """
+        serialised = [json.dumps(message, sort_keys=True, default=str) for message in messages]
+        with self._lock:
+            self._prompt_count += 1
+            prompt_id = self._prompt_count
+            base_id, base = self._last_prompt
+            self._last_prompt = (prompt_id, serialised)
+        positions = {message: index for index, message in enumerate(base)}
+        self.record("prompt", id=prompt_id, base=base_id, hash=_prompt_hash(serialised),
+                    messages=[positions.get(message, json.loads(message)) for message in serialised])
+        return prompt_id
+
+    def trace_completion(self, stream, model, messages, **kwargs):
+        """
+        Record the prompt, then pass a completion stream through, recording when each chunk arrived once it has finished.
+
+        Args:
+            stream (iterable): The completion stream.
+            model (str): The model it is from.
+            messages (list): The prompt, kept so the request can be replayed against a real provider.
+            **kwargs: The completion parameters.
+
+        Returns:
+            generator: The chunks of the stream.
+        """
+        # Recorded now rather than when the stream is first read, the caller may add to the messages by then
+        prompt_id = self.prompt(messages)
+        return self._trace_stream(stream, model, prompt_id, kwargs)
+
+    def _trace_stream(self, stream, model, prompt_id, params):
+        started = self.now()
+        chunks = []
+        error = None
+        try:
+            for chunk in stream:
+                chunks.append([round(self.now() - started, 6), chunk])
+                yield chunk
+        except Exception as e:
+            error = repr(e)
+            raise
+        finally:
+            self.record("completion", started=round(started, 6), model=model, params=params,
+                        prompt=prompt_id, chunks=chunks, error=error)
+
+    def tts(self, text, started, audio_seconds=None, cached=False):
+        self.record("tts", started=round(started, 6), text=text, audio_seconds=audio_seconds, cached=cached)
+
+    def playback(self, text):
+        self.record("playback", text=text)
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+def load_trace(path):
+    """
+    Read a trace written by SessionTracer. A trace whose session was killed before it was closed is read up
+    to its last whole event.
+
+    Returns:
+        list: The events, as dicts, in the order they were written.
+    """
+    events = []
+    with gzip.open(path, "rt", encoding="utf-8") as trace_file:
+        try:
+            for line in trace_file:
+                if not line.endswith("\n"):
+                    break  # Cut off part way through writing the event
+                if line.strip():
+                    events.append(json.loads(line))
+        except EOFError:
+            pass  # The end of the gzip stream was never written
+    return events
+
+def completion_prompts(events):
+    """
+    Rebuild the full messages of every prompt in a trace.
+
+    Returns:
+        dict: The messages of each prompt, keyed on the id its "completion" event refers to.
+
+    Raises:
+        ValueError: If a prompt cannot be rebuilt, e.g. the trace was cut short or edited.
+    """
+    prompts = {}
+    for event in events:
+        if event["type"] != "prompt":
+            continue
+        error = ValueError(f"Prompt {event['id']} of the trace could not be rebuilt")
+        if event["base"] is not None and event["base"] not in prompts:
+            raise error
+        base = prompts.get(event["base"], [])
+        try:
+            messages = [base[item] if isinstance(item, int) else item for item in event["messages"]]
+        except IndexError:
+            raise error from None
+        if _prompt_hash([json.dumps(message, sort_keys=True, default=str) for message in messages]) != event["hash"]:
+            raise error
+        prompts[event["id"]] = messages
+    return prompts
+
+def _prompt_hash(serialised):
+    return hashlib.sha256("\n".join(serialised).encode()).hexdigest()[:16]
+
+def recording_audio(event):
+    """The int16 samples of a "recording" event."""
+    return np.frombuffer(base64.b64decode(event["audio"]), dtype=np.int16)
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+def get_session_tracer(verbose=False):
+    """Return the process wide SessionTracer, or None if SESSION_TRACE_DIR is not set."""
+    global _tracer
+    if not config.SESSION_TRACE_DIR:
+        return None
+    with _tracer_lock:
+        if _tracer is None:
+            filename = time.strftime("session-%Y%m%d-%H%M%S.jsonl.gz")
+            _tracer = SessionTracer(os.path.join(config.SESSION_TRACE_DIR, filename), verbose=verbose)
+            if verbose:
+                print(f"Recording a session trace to {_tracer.path}")
+        return _tracer
@@ -1,71 +1,81 @@
 from config_loader import config
-import threading
 import os
-import math
-import time
-import pyaudio
-import wave
-import numpy as np
-import platform
+import threading
+import soundfile as sf
+from utils.audio_mixer import get_mixer
 
-def __play_sound_file(file_name, volume, verbose=False):
-    try:
-        # Load the audio file using wave
-        with wave.open(file_name, 'rb') as audio_file:
-            # Create a PyAudio instance
-            p = pyaudio.PyAudio()
+class SoundFXBank:
+    """
+    Decodes each sound effect once and keeps it in memory, already scaled to its volume and converted
+    to the output device's format, so playing it is just handing the samples to the shared mixer.
+    """
+    def __init__(self, sounds_dir="sounds", verbose=False):
+        self.sounds_dir = sounds_dir
+        self.verbose = verbose
+        self.mixer = get_mixer(verbose=verbose)
+        self.sounds = {}
+        self._lock = threading.Lock()
 
-            try:
-                output_device = p.get_default_output_device_info()
-            except OSError:
-                p.terminate()
-                return # No output devices
+    def _find_file(self, name):
+        """Find the file for a sound effect name."""
+        sound_file_name = os.path.join(self.sounds_dir, f"recording-{name}")
+        for extension in (".wav", ".mp3"):
+            if os.path.exists(sound_file_name + extension):
+                return sound_file_name + extension
+        raise FileNotFoundError(f"No sound file found for {name}")
 
-            # Used to limit the number of channels to avoid 'invalid number of channels' error
-            output_device_channels = output_device['maxOutputChannels']
+    def load(self, name, volume):
+        """
+        Decode a sound effect at the given volume, or return it from the cache.
 
-            # Open a stream for playback
-            stream = p.open(format=p.get_format_from_width(audio_file.getsampwidth()),
-                            channels=min(audio_file.getnchannels(), output_device_channels),
-                            rate=audio_file.getframerate(),
-                            output=True)
+        Args:
+            name (str): The sound effect name, e.g. "start".
+            volume (float): The final volume, including BASE_VOLUME.
 
-            # Adjust volume if volume != 1.0
-            if volume != 1.0:
-                # Read audio data into memory
-                data = audio_file.readframes(audio_file.getnframes())
-                audio = np.frombuffer(data, dtype=np.int16)
-                
-                # Adjust volume
-                audio = np.multiply(audio, volume).astype(np.int16)
+        Returns:
+            numpy.ndarray: The samples ready to hand to the mixer.
+        """
+        key = (name, volume)
+        with self._lock:
+            if key not in self.sounds:
+                data, samplerate = sf.read(self._find_file(name), dtype='float32', always_2d=True)
+                self.sounds[key] = self.mixer.prepare(data * volume, samplerate)
+            return self.sounds[key]
 
-                # Write adjusted audio data to the stream
-                stream.write(audio.tobytes())
-            else:
-                # Read audio data in chunks and write to the stream
-                data = audio_file.readframes(1024)
-                while data:
-                    stream.write(data)
-                    data = audio_file.readframes(1024)
+    def play(self, name, volume):
+        """Play a sound effect through the shared mixer without blocking."""
+        if not self.mixer.available:
+            return None
+        return self.mixer.play(self.load(name, volume))
 
-            # Stop and close the stream
-            stream.stop_stream()
-            stream.close()
 
-            # Terminate the PyAudio instance
-            p.terminate()
+_bank = None
+_bank_lock = threading.Lock()
 
-    except FileNotFoundError as e:
-        if verbose:
-            print(f"The sound file {file_name} was not found.")
-        raise FileNotFoundError(f"The sound file {file_name} was not found.") from e
+def get_sound_FX_bank(verbose=False):
+    """Return the process wide SoundFXBank, creating it on first use."""
+    global _bank
+    with _bank_lock:
+        if _bank is None:
+            _bank = SoundFXBank(verbose=verbose)
+        return _bank
+
+def preload_sound_FX(verbose=False):
+    """Decode the start, end and cancel sounds at their configured volumes so the first beep plays instantly."""
+    try:
+        bank = get_sound_FX_bank(verbose)
+        for name, volume in (("start", config.START_SOUND_VOLUME),
+                             ("end", config.END_SOUND_VOLUME),
+                             ("cancel", config.CANCEL_SOUND_VOLUME)):
+            volume *= config.BASE_VOLUME
+            if volume > 0.0:
+                bank.load(name, volume)
     except Exception as e:
         if verbose:
             import traceback
             traceback.print_exc()
         else:
-            print(f"An error occurred while playing the sound file: {e}")
-        raise Exception(f"An error occurred while playing the sound file: {e}") from e
+            print(f"An error occurred while loading sound FX: {e}")
 
 def play_sound_FX(name, volume=1.0, verbose=False):
     try:
@@ -74,20 +84,11 @@ def play_sound_FX(name, volume=1.0, verbose=False):
         if volume <= 0.0:
             return
 
-        sound_file_name = f"sounds/recording-{name}"
-        if os.path.exists(sound_file_name + ".wav"):
-            sound_file_name += ".wav"
-        elif os.path.exists(sound_file_name + ".mp3"):
-            sound_file_name += ".mp3"
-        else:
-            raise FileNotFoundError(f"No sound file found for {name}")
-
-        sound_thread = threading.Thread(target=__play_sound_file, args=(sound_file_name, volume, verbose))
-        sound_thread.start()
+        get_sound_FX_bank(verbose).play(name, volume)
 
     except Exception as e:
         if verbose:
             import traceback
             traceback.print_exc()
         else:
-            print(f"An error occurred while attempting to play sound FX: {e}")
\ No newline at end of file
+            print(f"An error occurred while attempting to play sound FX: {e}")
@@ -0,0 +1,239 @@
+import re
+from config_loader import config
+
+# Words that end with a full stop without ending the sentence
+ABBREVIATIONS = {"mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "vs", "etc", "approx", "fig", "eq", "dept", "est"}
+
+_TRIGGER = re.compile(r"[.!?`]")
+_LAST_WORD = re.compile(r"(\S+)$")
+_INITIALISM = re.compile(r"(?:[A-Za-z]\.)*[A-Za-z]")  # e.g, i.e, U.S, J
+_LINE_START = re.compile(r"\s*\S+\s")
+_LIST_OR_HEADING = re.compile(r"\s*(?:[-*+•]|\d{1,3}[.)]|#{1,6})\s+")
+_LINK = re.compile(r"\[([^\]]+)\]\([^)\s]+\)")
+_URL = re.compile(r"\bhttps?://(?:www\.)?([^/\s]+)\S*")
+_SPEAKABLE = re.compile(r"\w")
+
+class SpeechSegmenter:
+    """
+    Turns streamed markdown into units of speech for the TTS engine.
+
+    Every unit costs a TTS call (for Piper, a process launch), so rather than one call per full stop
+    or newline the segmenter:
+    - skips fenced code blocks, speaking a short summary in their place,
+    - keeps inline code, list numbers, abbreviations, initials and decimals from ending a sentence,
+    - strips list bullets and heading markers, and reads links and URLs as their text or domain,
+    - merges short sentences into units of at least `min_chars`, up to `max_chars`.
+
+    The first unit is sent as soon as it is complete so speech starts without waiting for the merge.
+    Text is scanned once as it arrives, only a line's first few characters are held back until it is
+    known whether they start a code fence, list item or heading.
+    """
+    def __init__(self, callback, min_chars=None, max_chars=None, code_summary=None, eager_first=True, standalone=None):
+        """
+        Initialize the SpeechSegmenter.
+
+        Args:
+            callback (callable): Called with each unit of text to speak.
+            min_chars (int, optional): Sentences are merged until a unit is at least this long. Defaults to config.TTS_MIN_CHUNK_CHARS.
+            max_chars (int, optional): Sentences are not merged past this length. Defaults to config.TTS_MAX_CHUNK_CHARS.
+            code_summary (str, optional): Spoken in place of a code block. Defaults to config.TTS_CODE_BLOCK_SUMMARY, "" skips code blocks silently.
+            eager_first (bool): Whether to send the first sentence straight away instead of merging it.
+            standalone (iterable, optional): Sentences that are always a unit of their own, so they match the audio
+                cache. Defaults to config.TTS_STOCK_PHRASES and the code summary while the audio cache is on.
+        """
+        self.callback = callback
+        self.min_chars = config.TTS_MIN_CHUNK_CHARS if min_chars is None else min_chars
+        self.max_chars = config.TTS_MAX_CHUNK_CHARS if max_chars is None else max_chars
+        self.code_summary = config.TTS_CODE_BLOCK_SUMMARY if code_summary is None else code_summary
+        self.eager_first = eager_first
+        self.units_emitted = 0
+        if standalone is None:
+            standalone = list(config.TTS_STOCK_PHRASES) + [self.code_summary] if config.TTS_AUDIO_CACHE else []
+        self.standalone = {phrase.casefold() for phrase in standalone if phrase}
+
+        self._in_fence = False
+        self._in_inline_code = False
+        self._at_line_start = True
+        self._line_prefix = ""
+        self._skip_line = False
+        self._pending_stop = False
+        self._sentence = []
+        self._recent = ""
+        self._unit = []
+        self._unit_len = 0
+
+    def feed(self, text):
+        """Process the next piece of the text."""
+        if "\n" not in text:
+            if self._at_line_start:
+                self._feed_line_start(text)
+            elif not self._skip_line:
+                self._consume(text)
+            return
+        lines = text.split("\n")
+        for i, line in enumerate(lines):
+            if line:
+                if self._at_line_start:
+                    self._feed_line_start(line)
+                else:
+                    self._consume(line)
+            if i < len(lines) - 1:
+                self._end_line()
+
+    def flush(self):
+        """Send everything held so far, e.g. before text that is not spoken interrupts the stream."""
+        if self._at_line_start and self._line_prefix:
+            self._classify_line_start()
+        self._end_sentence()
+        self._emit_unit()
+
+    def close(self):
+        """Send what is left at the end of the text and reset for the next one."""
+        self.flush()
+        self._end_line()
+        self._in_fence = False
+
+    def _feed_line_start(self, text):
+        """Hold the start of a line until it is clear whether it opens a code fence, list item or heading."""
+        self._line_prefix += text
+        stripped = self._line_prefix.lstrip()
+        if not stripped:
+            return
+        if len(stripped) < 3 and "```".startswith(stripped):
+            return
+        if not self._in_fence and not _LINE_START.match(self._line_prefix) and len(stripped) < 8:
+            return
+        self._classify_line_start()
+
+    def _classify_line_start(self):
+        prefix = self._line_prefix
+        self._line_prefix = ""
+        self._at_line_start = False
+
+        if prefix.lstrip().startswith("```"):
+            self._skip_line = True
+            self._in_fence = not self._in_fence
+            if self._in_fence:
+                self._end_sentence()
+                if self.code_summary:
+                    self._add_sentence(self.code_summary)
+            return
+        if self._in_fence:
+            self._skip_line = True
+            return
+
+        marker = _LIST_OR_HEADING.match(prefix)
+        if marker:
+            prefix = prefix[marker.end():]
+        if prefix:
+            self._consume(prefix)
+
+    def _end_line(self):
+        if self._at_line_start and self._line_prefix:
+            self._classify_line_start()
+        if not self._skip_line:
+            self._end_sentence()
+        self._at_line_start = True
+        self._line_prefix = ""
+        self._skip_line = False
+        self._in_inline_code = False
+
+    def _consume(self, text):
+        """Add text from the middle of a line, ending sentences where it has them."""
+        if self._skip_line:
+            return
+        pos = 0
+        if self._pending_stop:
+            self._pending_stop = False
+            if text[0].isspace():
+                self._end_sentence()
+
+        for match in _TRIGGER.finditer(text):
+            i = match.start()
+            if match.group() == "`":
+                self._in_inline_code = not self._in_inline_code
+                continue
+            if self._in_inline_code:
+                continue
+            if i + 1 < len(text) and not text[i + 1].isspace():
+                continue  # Decimals, versions, file names and URLs
+            if not self._ends_sentence(text[pos:i], match.group()):
+                continue
+            self._append(text[pos:i + 1])
+            pos = i + 1
+            if pos < len(text):
+                self._end_sentence()
+            else:
+                # The next character decides, it may be in the next piece
+                self._pending_stop = True
+        self._append(text[pos:])
+
+    def _ends_sentence(self, before, stop):
+        """Whether a full stop, after the given text, ends the sentence."""
+        if stop != ".":
+            return True
+        word = _LAST_WORD.search(self._recent + before)
+        if word is None:
+            return True
+        word = word.group(1)
+        return not (word.lower() in ABBREVIATIONS or _INITIALISM.fullmatch(word))
+
+    def _append(self, text):
+        if text:
+            self._sentence.append(text)
+            self._recent = (self._recent + text)[-16:]
+
+    def _end_sentence(self):
+        self._pending_stop = False
+        sentence = "".join(self._sentence).strip()
+        self._sentence = []
+        self._recent = ""
+        if sentence:
+            self._add_sentence(sentence)
+
+    def _add_sentence(self, sentence):
+        """Merge a sentence into the unit being built, sending the unit once it is long enough."""
+        sentence = _URL.sub(r"\1", _LINK.sub(r"\1", sentence))
+        if not _SPEAKABLE.search(sentence):
+            return  # Rules, stray symbols and the like
+        if not sentence.endswith((".", "!", "?", ":", ";")):
+            sentence += "."  # So merged list items and lines still get a pause
+
+        if sentence.casefold() in self.standalone:
+            self._emit_unit()
+            self._unit = [sentence]
+            self._emit_unit()
+            return
+        if self._unit and self._unit_len + len(sentence) + 1 > self.max_chars:
+            self._emit_unit()
+        self._unit.append(sentence)
+        self._unit_len += len(sentence) + 1
+        if self._unit_len >= self.min_chars or (self.eager_first and self.units_emitted == 0):
+            self._emit_unit()
+
+    def _emit_unit(self):
+        if not self._unit:
+            return
+        unit = " ".join(self._unit)
+        self._unit = []
+        self._unit_len = 0
+        self.units_emitted += 1
+        self.callback(unit)
+
+
+def segment_text(text, **kwargs):
+    """
+    Split a complete piece of text into units of speech.
+
+    Args:
+        text (str): The text to split.
+        **kwargs: Passed on to SpeechSegmenter.
+
+    Returns:
+        list: The units of text to speak.
+    """
+    units = []
+    segmenter = SpeechSegmenter(units.append, **kwargs)
+    segmenter.feed(text)
+    segmenter.close()
+    return units
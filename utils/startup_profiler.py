@@ -0,0 +1,84 @@
+import builtins
+import sys
+import threading
+import time
+
+class StartupProfiler:
+    """
+    Measures where AlwaysReddy's startup time goes, for the --profile-startup flag.
+
+    It wraps the import statement to time each module the first time it is imported (both including
+    and excluding the modules it imports in turn), and records named phases of startup.
+    """
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.imports = {}  # module name -> (inclusive seconds, self seconds)
+        self.phases = []
+        self._last_mark = self.start_time
+        self._local = threading.local()
+        self._original_import = None
+
+    def start(self):
+        """Start timing imports."""
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def stop(self):
+        """Stop timing imports."""
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def mark(self, phase):
+        """Record the time since the previous mark as a named phase."""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last_mark))
+        self._last_mark = now
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        # Each thread keeps its own stack of child import time so background loaders don't interfere
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0.0)
+        start_time = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start_time
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            if name not in self.imports:
+                self.imports[name] = (elapsed, elapsed - children)
+
+    def report(self, top=20, background_loaders=()):
+        """
+        Print the startup breakdown.
+
+        Args:
+            top (int): How many of the slowest imports to list.
+            background_loaders (list): BackgroundLoader instances to report on.
+        """
+        total = time.perf_counter() - self.start_time
+        print("\n===== Startup profile =====")
+        print(f"Total time until ready: {total:.3f}s\n")
+
+        print("Phases:")
+        for phase, elapsed in self.phases:
+            print(f"  {elapsed:8.3f}s  {phase}")
+
+        print("\nSlowest imports (self time, including children):")
+        slowest = sorted(self.imports.items(), key=lambda item: item[1][1], reverse=True)[:top]
+        for name, (inclusive, own) in slowest:
+            print(f"  {own:8.3f}s  {inclusive:8.3f}s  {name}")
+
+        if background_loaders:
+            print("\nBackground loading (runs while hotkeys are live):")
+            for loader in background_loaders:
+                status = f"{loader.elapsed:8.3f}s" if loader.done else "  loading"
+                print(f"  {status}  {loader.name}")
+        print("===========================\n")
@@ -0,0 +1,113 @@
+import re
+from utils.speech_segmenter import SpeechSegmenter
+
+class TextStreamProcessor:
+    """
+    Pulls text between markers out of a stream of text chunks and hands the rest to a SpeechSegmenter.
+
+    Each chunk is scanned once: only the few characters at the end of a chunk that could be the start
+    of a marker split across chunks are carried over and looked at again, so the cost stays linear
+    however the response is chunked. Marked text is collected in a list and joined once.
+    """
+    def __init__(self, tts_callback=None, marker_tuples=None, segmenter=None):
+        """
+        Initialize the TextStreamProcessor.
+
+        Args:
+            tts_callback (callable, optional): Called with each unit of speech outside of markers.
+            marker_tuples (list, optional): Tuples of (start_marker, end_marker, callback_function).
+                Text between the markers is passed to the callback instead of the tts_callback.
+            segmenter (SpeechSegmenter, optional): Splits the spoken text into units, one is created for tts_callback if not given.
+        """
+        self.markers = [marker for marker in (marker_tuples or []) if marker[0] and marker[1]]
+        if segmenter is None and tts_callback is not None:
+            segmenter = SpeechSegmenter(tts_callback)
+        self.segmenter = segmenter
+
+        self._pattern = None
+        if self.markers:
+            self._pattern = re.compile("|".join(f"(?P<m{i}>{re.escape(start)})" for i, (start, _, _) in enumerate(self.markers)))
+            # Keep back enough characters to catch a start marker split across chunks, starting at the
+            # first character that could begin one
+            self._holdback = max(len(start) - 1 for start, _, _ in self.markers)
+            first_chars = sorted({start[0] for start, _, _ in self.markers})
+            self._trigger = re.compile("[" + "".join(re.escape(char) for char in first_chars) + "]")
+
+        self._chunks = []
+        self._marked = []
+        self._tail = ""
+        self._active_marker = None
+
+    def feed(self, chunk):
+        """Process the next chunk of the stream."""
+        if not chunk:
+            return
+        self._chunks.append(chunk)
+        if self._pattern is None or (not self._tail and self._active_marker is None and not self._trigger.search(chunk)):
+            # Nothing in this chunk can start a marker
+            self._speak(chunk)
+            return
+        text = self._tail + chunk if self._tail else chunk
+        pos = 0
+
+        while True:
+            if self._active_marker is not None:
+                _, end, callback = self._active_marker
+                index = text.find(end, pos)
+                if index == -1:
+                    # The end marker may be split across chunks, so keep its possible start back
+                    safe = text.find(end[0], max(pos, len(text) - (len(end) - 1)))
+                    if safe == -1:
+                        safe = len(text)
+                    self._marked.append(text[pos:safe])
+                    self._tail = text[safe:]
+                    return
+                self._marked.append(text[pos:index])
+                self._emit_marked_text(callback)
+                self._active_marker = None
+                pos = index + len(end)
+                continue
+
+            match = self._pattern.search(text, pos)
+            if match is None:
+                trigger = self._trigger.search(text, max(pos, len(text) - self._holdback))
+                safe = trigger.start() if trigger else len(text)
+                self._speak(text[pos:safe])
+                self._tail = text[safe:]
+                return
+
+            # Whatever came before the marker is spoken, the marked text goes to the marker's callback
+            self._speak(text[pos:match.start()])
+            if self.segmenter is not None:
+                self.segmenter.flush()
+            self._active_marker = self.markers[int(match.lastgroup[1:])]
+            pos = match.end()
+
+    def close(self):
+        """
+        Flush anything left at the end of the stream.
+
+        Returns:
+            str: The full, unmodified input text.
+        """
+        tail, self._tail = self._tail, ""
+        if self._active_marker is not None:
+            # The model never closed the marker, hand over what it did write
+            self._marked.append(tail)
+            self._emit_marked_text(self._active_marker[2])
+            self._active_marker = None
+        else:
+            self._speak(tail)
+        if self.segmenter is not None:
+            self.segmenter.close()
+        return "".join(self._chunks)
+
+    def _speak(self, text):
+        if text and self.segmenter is not None:
+            self.segmenter.feed(text)
+
+    def _emit_marked_text(self, callback):
+        marked_text = "".join(self._marked)
+        self._marked = []
+        if marked_text.strip() and callback:
+            callback(marked_text)
@@ -1,24 +1,26 @@
 import re
+import threading
+from collections import OrderedDict
 import clipboard
-import tiktoken
-import io
-from PIL import Image, ImageGrab
 import utils.prompt as prompt
-import base64
-import json
-import os
+from utils.model_capabilities import get_capability_registry
 import time
 
 def read_clipboard(model_supports_images=True):
-    """Read text or image from clipboard."""
+    """
+    Read text or image from clipboard.
+
+    Images are resized and encoded on a background worker, so for images the returned
+    content is a Future that resolves to an EncodedImage.
+    """
     # Try to grab an image from the clipboard
     if model_supports_images:
         try:
+            from PIL import Image, ImageGrab
+            from utils.image_pipeline import get_image_pipeline
             image = ImageGrab.grabclipboard()
-            if image:
-                processed_image = process_image(image)
-                if processed_image:
-                    return {'type': 'image', 'content': processed_image}
+            if isinstance(image, Image.Image):
+                return {'type': 'image', 'content': get_image_pipeline().submit(image)}
         except Exception as e:
             print(f"Error processing image from clipboard: {e}")
 
@@ -40,39 +42,112 @@ def to_clipboard(text):
     """
     clipboard.copy(extract_code_if_only_code_block(text))
 
+# Characters dropped before speaking, removed in one pass with str.translate
+_DISALLOWED_CHARS = str.maketrans('', '', '"<>[]{}|\\~`^*!#$()_;')
+_NEEDS_NORMALISING = re.compile(r'[\d$€£¥]')
+
+_SYMBOL_WORDS = {'&': 'and', '%': 'percent', '@': 'at', '=': 'equals', '+': 'plus', '/': 'slash'}
+_SYMBOL_PATTERN = re.compile(r' ([&%@=+/]) ')
+
+_CURRENCIES = {'$': ('dollar', 'dollars', 'cent', 'cents'), '€': ('euro', 'euros', 'cent', 'cents'),
+               '£': ('pound', 'pounds', 'penny', 'pence'), '¥': ('yen', 'yen', None, None)}
+_MAGNITUDES = {'k': 'thousand', 'K': 'thousand', 'm': 'million', 'M': 'million', 'mn': 'million',
+               'b': 'billion', 'B': 'billion', 'bn': 'billion', 'T': 'trillion',
+               'thousand': 'thousand', 'million': 'million', 'billion': 'billion', 'trillion': 'trillion'}
+# Unit: (singular, plural). "us" is left out, "2 us" is far more often the word than microseconds
+_UNITS = {'ns': ('nanosecond', 'nanoseconds'), 'µs': ('microsecond', 'microseconds'),
+          'ms': ('millisecond', 'milliseconds'), 'sec': ('second', 'seconds'), 'secs': ('second', 'seconds'),
+          'min': ('minute', 'minutes'), 'mins': ('minute', 'minutes'), 'hrs': ('hour', 'hours'),
+          'mm': ('millimetre', 'millimetres'), 'cm': ('centimetre', 'centimetres'), 'km': ('kilometre', 'kilometres'),
+          'mg': ('milligram', 'milligrams'), 'kg': ('kilogram', 'kilograms'),
+          'KB': ('kilobyte', 'kilobytes'), 'MB': ('megabyte', 'megabytes'), 'GB': ('gigabyte', 'gigabytes'),
+          'TB': ('terabyte', 'terabytes'), 'Hz': ('hertz', 'hertz'), 'kHz': ('kilohertz', 'kilohertz'),
+          'MHz': ('megahertz', 'megahertz'), 'GHz': ('gigahertz', 'gigahertz'),
+          'kW': ('kilowatt', 'kilowatts'), 'kWh': ('kilowatt hour', 'kilowatt hours'),
+          'mph': ('mile per hour', 'miles per hour'), 'km/h': ('kilometre per hour', 'kilometres per hour'),
+          '°C': ('degree Celsius', 'degrees Celsius'), '°F': ('degree Fahrenheit', 'degrees Fahrenheit'),
+          '%': ('percent', 'percent')}
+_NUMBER = r'\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+)?'
+# One pass over the text handles currencies, numbers with units, ranges and thousands separators.
+# The lookahead lets the scan skip over every position that is not a digit or currency sign cheaply.
+# A range may end a sentence, but not run on into more digits or hyphens, as dates and phone numbers do.
+_NORMALISE_PATTERN = re.compile(
+    r'(?=[\d$€£¥])(?:(?P<currency>[$€£¥])(?P<amount>(?P<decimal_comma>\d+,\d{2})(?![\d,])|' + _NUMBER +
+    r')(?:\s?(?P<magnitude>' +
+    '|'.join(sorted(map(re.escape, _MAGNITUDES), key=len, reverse=True)) + r')\b)?'
+    r'|(?<![\w.])(?P<value>' + _NUMBER + r')\s?(?P<unit>' +
+    '|'.join(sorted(map(re.escape, _UNITS), key=len, reverse=True)) + r')(?![\w/])'
+    r'|(?<![\w.-])(?P<range_start>\d+(?:\.\d+)?)-(?P<range_end>\d+(?:\.\d+)?)(?![\w-]|\.\d)'
+    r'|(?<![\w.,])(?P<grouped>\d{1,3}(?:,\d{3})+)(?!,?\d))'
+)
+
+def _speak_number(number):
+    """Drop thousands separators, which TTS engines tend to read as a pause."""
+    return number.replace(',', '')
+
+def _looks_like_phone_number(start, end):
+    """Whether a digit-hyphen-digit run is more likely a phone number (555-1234, 0800-123456) than a range."""
+    return len(start) >= 3 and (start.startswith('0') or len(end) > len(start))
+
+def _normalise_match(match):
+    if match.group('currency'):
+        singular, plural, minor_singular, minor_plural = _CURRENCIES[match.group('currency')]
+        if match.group('decimal_comma'):
+            amount = match.group('decimal_comma').replace(',', '.')  # e.g. €3,50
+        else:
+            amount = _speak_number(match.group('amount'))
+        magnitude = match.group('magnitude')
+        if magnitude:
+            return f"{amount} {_MAGNITUDES[magnitude]} {plural}"
+        whole, _, fraction = amount.partition('.')
+        spoken = f"{whole} {singular if whole == '1' else plural}"
+        cents = int(fraction[:2].ljust(2, '0')) if fraction and minor_plural else 0
+        if cents:
+            minor = f"{cents} {minor_singular if cents == 1 else minor_plural}"
+            # $0.99 is "99 cents", not "0 dollars 99 cents"
+            spoken = minor if int(whole) == 0 else f"{spoken} {minor}"
+        return spoken
+    if match.group('unit'):
+        value = _speak_number(match.group('value'))
+        singular, plural = _UNITS[match.group('unit')]
+        return f"{value} {singular if value == '1' else plural}"
+    if match.group('range_start'):
+        if _looks_like_phone_number(match.group('range_start'), match.group('range_end')):
+            return match.group(0)
+        return f"{match.group('range_start')} to {match.group('range_end')}"
+    return _speak_number(match.group('grouped'))
+
+def _symbol_to_word(match):
+    return f" {_SYMBOL_WORDS[match.group(1)]} "
+
 def sanitize_text(text):
     """
     Remove disallowed characters from a string and replace certain symbols with their text equivalents.
 
+    Currencies, units, number ranges and thousands separators are spelled out first (e.g. "$1.50" becomes
+    "1 dollar 50 cents" and "200ms" becomes "200 milliseconds"), so they read naturally. Each step is a
+    single precompiled pass over the text.
+
     Args:
         text (str): The text to be sanitized.
 
     Returns:
         str: The sanitized text.
     """
-    disallowed_chars = '"<>[]{}|\\~`^*!#$()_;'
-    symbol_text_pairs = [
-        (' & ', ' and '), 
-        (' % ', ' percent '), 
-        (' @ ', ' at '), 
-        (' = ', ' equals '), 
-        (' + ', ' plus '),
-        (' / ', ' slash '),
-    ]
-
-    sanitized_text = ''.join(filter(lambda x: x not in disallowed_chars, text))
-    for symbol, text_equivalent in symbol_text_pairs:
-        sanitized_text = sanitized_text.replace(symbol, text_equivalent)
-    
-    return sanitized_text
+    sanitized_text = text
+    if _NEEDS_NORMALISING.search(sanitized_text):
+        sanitized_text = _NORMALISE_PATTERN.sub(_normalise_match, sanitized_text)
+    sanitized_text = sanitized_text.translate(_DISALLOWED_CHARS)
+    return _SYMBOL_PATTERN.sub(_symbol_to_word, sanitized_text)
 
-def _trim_messages(messages, max_prompt_tokens):
+def _trim_messages(messages, max_prompt_tokens, model="gpt-3.5-turbo"):
     """
     Trim the messages to fit within the maximum token limit.
 
     Args:
     messages (list): A list of messages to be trimmed.
     max_prompt_tokens (int): The maximum number of tokens allowed.
+    model (str): The model whose tokenizer is used for counting.
 
     Returns:
     list: The trimmed list of messages.
@@ -80,7 +155,7 @@ def _trim_messages(messages, max_prompt_tokens):
     msg_token_count = 0
 
     while True:
-        msg_token_count = _count_tokens(messages)
+        msg_token_count = _count_tokens(messages, model)
         if msg_token_count <= max_prompt_tokens:
             break
         # Remove the oldest non-system message
@@ -97,9 +172,83 @@ def _trim_messages(messages, max_prompt_tokens):
 
     return messages
 
+# Token counts per message, keyed on the tokenizer and the message's content. Messages are counted again on
+# every request, so without this a long conversation would be re-tokenised every turn.
+_TOKEN_CACHE_SIZE = 4096
+_token_cache = OrderedDict()
+_token_cache_lock = threading.Lock()
+
+def _message_cache_key(tokenizer, message):
+    """Build a hashable key for a message, standing in a marker for image data."""
+    parts = []
+    for key, value in message.items():
+        if isinstance(value, list):
+            value = tuple(
+                ('image',) if isinstance(item, dict) and item.get('type') == 'image'
+                else item.get('text', '') if isinstance(item, dict) else item
+                for item in value
+            )
+        parts.append((key, value))
+    return (tokenizer, tuple(parts))
+
+def _tokenizer_name(model):
+    return get_capability_registry().lookup(model).tokenizer
+
+def cache_token_count(message, model, token_count):
+    """
+    Record a known token count for a message, e.g. one saved alongside it in the conversation store.
+
+    Args:
+        message (dict): The message.
+        model (str): The model whose tokenizer the count is for.
+        token_count (int): The number of tokens in the message.
+    """
+    key = _message_cache_key(_tokenizer_name(model), message)
+    with _token_cache_lock:
+        _token_cache[key] = token_count
+        while len(_token_cache) > _TOKEN_CACHE_SIZE:
+            _token_cache.popitem(last=False)
+
+def count_message_tokens(message, model="gpt-3.5-turbo"):
+    """
+    Count the tokens in a single message, using the cached count if it has been counted before.
+
+    Args:
+        message (dict): The message to count.
+        model (str): The model whose tokenizer is used for counting.
+
+    Returns:
+        int: The number of tokens in the message.
+    """
+    tokenizer = _tokenizer_name(model)
+    key = _message_cache_key(tokenizer, message)
+    with _token_cache_lock:
+        if key in _token_cache:
+            _token_cache.move_to_end(key)
+            return _token_cache[key]
+
+    import tiktoken  # Deferred, importing tiktoken is slow and it is only needed once a conversation starts
+    enc = tiktoken.get_encoding(tokenizer)
+    token_count = 0
+    for key_name, value in message.items():
+        if isinstance(value, str):
+            token_count += len(enc.encode(value))
+        elif isinstance(value, list):
+            for item in value:
+                if isinstance(item, dict):
+                    if item.get('type') == 'image':
+                        token_count += 85  # Approximate token count for an image
+                    elif item.get('type') == 'text':
+                        token_count += len(enc.encode(item.get('text', '')))
+                elif isinstance(item, str):
+                    token_count += len(enc.encode(item))
+
+    cache_token_count(message, model, token_count)
+    return token_count
+
 def _count_tokens(messages, model="gpt-3.5-turbo"):
     """
-    Count the tokens in the given messages using the specified model.
+    Count the tokens in the given messages using the specified model's tokenizer family.
 
     Args:
     messages (list): A list of messages to count tokens from.
@@ -108,37 +257,22 @@ def _count_tokens(messages, model="gpt-3.5-turbo"):
     Returns:
     int: The total count of tokens in the messages.
     """
-    enc = tiktoken.encoding_for_model(model)
-    msg_token_count = 0
-    for message in messages:
-        for key, value in message.items():
-            if isinstance(value, str):
-                msg_token_count += len(enc.encode(value))
-            elif isinstance(value, list):
-                for item in value:
-                    if isinstance(item, dict):
-                        if item.get('type') == 'image':
-                            msg_token_count += 85  # Approximate token count for an image
-                        elif item.get('type') == 'text':
-                            msg_token_count += len(enc.encode(item.get('text', '')))
-                    elif isinstance(item, str):
-                        msg_token_count += len(enc.encode(item))
-
-    return msg_token_count
-
-def maintain_token_limit(messages, max_prompt_tokens):
+    return sum(count_message_tokens(message, model) for message in messages)
+
+def maintain_token_limit(messages, max_prompt_tokens, model="gpt-3.5-turbo"):
     """
     Maintain the token limit by trimming messages if the token count exceeds the maximum limit.
 
     Args:
     messages (list): A list of messages to maintain.
     max_prompt_tokens (int): The maximum number of tokens allowed.
+    model (str): The model whose tokenizer is used for counting.
 
     Returns:
     list: The trimmed list of messages.
     """
-    if _count_tokens(messages) > max_prompt_tokens:
-        messages = _trim_messages(messages, max_prompt_tokens)
+    if _count_tokens(messages, model) > max_prompt_tokens:
+        messages = _trim_messages(messages, max_prompt_tokens, model)
     return messages
 
 def extract_code_if_only_code_block(markdown_text):
@@ -170,50 +304,36 @@ def extract_code_if_only_code_block(markdown_text):
 def process_image(image):
     """Resize and encode image for LLM input."""
     try:
-        max_size = (1024, 1024)
-        image.thumbnail(max_size, Image.LANCZOS)
-        
-        # Convert image to RGB if it's not already
-        if image.mode != 'RGB':
-            image = image.convert('RGB')
-        
-        buffered = io.BytesIO()
-        image.save(buffered, format="JPEG", quality=85, subsampling=0, progressive=True)
-        return base64.b64encode(buffered.getvalue()).decode('utf-8')
+        from utils.image_pipeline import get_image_pipeline
+        return get_image_pipeline().encode(image).data
     except Exception as e:
         print(f"Error processing image: {e}")
         return None
 
-def does_model_support_images(model_name: str) -> bool:
-    try:
-        # Get the directory of the current file
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        
-        # Construct the path to the JSON file
-        json_path = os.path.join(current_dir, 'image_supported_models.json')
-        
-        # Read the JSON file
-        with open(json_path, 'r') as file:
-            supported_models = json.load(file)
-        
-        # Check if the model name is in the supported_models list
-        result = model_name in supported_models['supported_models']
-        
-        return result
-    except Exception as e:
-        print(f"Error reading or parsing the supported models file: {e}")
-        return False
+def does_model_support_images(model_name: str, provider: str = None) -> bool:
+    """Check the capability registry for whether the model accepts image input."""
+    return get_capability_registry().supports_images(model_name, provider)
 
 def handle_clipboard_image(AR, message_content):
     """Handle clipboard image and return content if image exists."""
     if hasattr(AR, 'clipboard_image') and AR.clipboard_image:
+        try:
+            # The image has normally finished encoding while the user was still recording
+            encoded_image = AR.clipboard_image.result()
+        except Exception as e:
+            print(f"Error processing image from clipboard: {e}")
+            encoded_image = None
+        AR.clipboard_image = None
+        if encoded_image is None:
+            return None
+
         content = [
             {
                 "type": "image",
                 "source": {
                     "type": "base64",
-                    "media_type": "image/jpeg",  
-                    "data": AR.clipboard_image.replace('\n', '')
+                    "media_type": encoded_image.media_type,
+                    "data": encoded_image.data
                 }
             },
             {
@@ -221,7 +341,6 @@ def handle_clipboard_image(AR, message_content):
                 "text": message_content + "\n\nTHE USER HAS GRANTED YOU ACCESS TO AN IMAGE FROM THEIR CLIPBOARD. ANALYZE AND BRIEFLY DESCRIBE THE IMAGE IF RELEVANT TO THE CONVERSATION."
             }
         ]
-        AR.clipboard_image = None
         return content
     return None
 